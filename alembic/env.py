@@ -28,7 +28,11 @@ target_metadata = Base.metadata
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
-config.set_main_option("sqlalchemy.url", str(secrets.sqlalchemy_url))
+# src.db.session passes the url of the shard being migrated
+config.set_main_option(
+    "sqlalchemy.url",
+    config.attributes.get("sqlalchemy.url", str(secrets.sqlalchemy_url)),
+)
 
 
 def run_migrations_offline() -> None:
@@ -0,0 +1,30 @@
+"""Operations created_at
+
+Revision ID: 9c2f4e1d7a3b
+Revises: 41066b588c0e
+Create Date: 2026-10-19 12:10:41.118352
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2f4e1d7a3b'
+down_revision: Union[str, Sequence[str], None] = '41066b588c0e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('operations', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.create_index('ix_operations_wallet_id_created_at', 'operations', ['wallet_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_operations_wallet_id_created_at', table_name='operations')
+    op.drop_column('operations', 'created_at')
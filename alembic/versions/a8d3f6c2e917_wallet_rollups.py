@@ -0,0 +1,52 @@
+"""Daily and monthly wallet rollups
+
+Revision ID: a8d3f6c2e917
+Revises: f2c7a4e81b90
+Create Date: 2026-10-19 21:36:12.508114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d3f6c2e917'
+down_revision: Union[str, Sequence[str], None] = 'f2c7a4e81b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_daily_totals',
+    sa.Column('wallet_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('deposits', sa.BigInteger(), nullable=False),
+    sa.Column('withdrawals', sa.BigInteger(), nullable=False),
+    sa.Column('deposit_count', sa.Integer(), nullable=False),
+    sa.Column('withdraw_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('wallet_id', 'day')
+    )
+    op.create_table('wallet_monthly_totals',
+    sa.Column('wallet_id', sa.UUID(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('deposits', sa.BigInteger(), nullable=False),
+    sa.Column('withdrawals', sa.BigInteger(), nullable=False),
+    sa.Column('deposit_count', sa.Integer(), nullable=False),
+    sa.Column('withdraw_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('wallet_id', 'month')
+    )
+    op.create_table('rollup_watermark',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('watermark', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rollup_watermark')
+    op.drop_table('wallet_monthly_totals')
+    op.drop_table('wallet_daily_totals')
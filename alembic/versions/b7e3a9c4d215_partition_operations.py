@@ -0,0 +1,91 @@
+"""Partition operations by created_at
+
+Revision ID: b7e3a9c4d215
+Revises: 9c2f4e1d7a3b
+Create Date: 2026-10-19 14:32:07.561203
+
+"""
+from datetime import UTC, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3a9c4d215'
+down_revision: Union[str, Sequence[str], None] = '9c2f4e1d7a3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# monthly partitions created ahead of the current month
+MONTHS_AHEAD = 3
+
+
+def _next_month(month: datetime) -> datetime:
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('ALTER TABLE operations RENAME TO operations_legacy')
+    op.execute('ALTER TABLE operations_legacy RENAME CONSTRAINT operations_pkey TO operations_legacy_pkey')
+    op.execute('ALTER TABLE operations_legacy RENAME CONSTRAINT operations_wallet_id_fkey TO operations_legacy_wallet_id_fkey')
+    op.execute('ALTER INDEX ix_operations_wallet_id_created_at RENAME TO ix_operations_legacy_wallet_id_created_at')
+
+    op.create_table('operations',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('op_type', sa.Enum('deposit', 'withdraw', name='operation_type_enum', native_enum=False), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('wallet_id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id'], ),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)',
+    )
+    op.create_index('ix_operations_wallet_id_created_at', 'operations', ['wallet_id', 'created_at'], unique=False)
+
+    now = datetime.now(UTC)
+    oldest = op.get_bind().execute(sa.text('SELECT min(created_at) FROM operations_legacy')).scalar() or now
+    month = oldest.astimezone(UTC).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        upper = _next_month(month)
+        op.execute(
+            f"CREATE TABLE operations_p{month:%Y_%m} PARTITION OF operations "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+    op.execute(
+        'INSERT INTO operations (id, op_type, amount, wallet_id, created_at) '
+        'SELECT id, op_type, amount, wallet_id, created_at FROM operations_legacy'
+    )
+    op.drop_table('operations_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('ALTER TABLE operations RENAME TO operations_partitioned')
+    op.execute('ALTER TABLE operations_partitioned RENAME CONSTRAINT operations_pkey TO operations_partitioned_pkey')
+    op.execute('ALTER TABLE operations_partitioned RENAME CONSTRAINT operations_wallet_id_fkey TO operations_partitioned_wallet_id_fkey')
+    op.execute('ALTER INDEX ix_operations_wallet_id_created_at RENAME TO ix_operations_partitioned_wallet_id_created_at')
+
+    op.create_table('operations',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('op_type', sa.Enum('deposit', 'withdraw', name='operation_type_enum', native_enum=False), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('wallet_id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_operations_wallet_id_created_at', 'operations', ['wallet_id', 'created_at'], unique=False)
+    op.execute(
+        'INSERT INTO operations (id, op_type, amount, wallet_id, created_at) '
+        'SELECT id, op_type, amount, wallet_id, created_at FROM operations_partitioned'
+    )
+    # drops the attached partitions as well
+    op.drop_table('operations_partitioned')
@@ -0,0 +1,56 @@
+"""Wallet balances per currency
+
+Revision ID: c4e9b7a15d28
+Revises: a8d3f6c2e917
+Create Date: 2026-10-19 22:48:37.152904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e9b7a15d28'
+down_revision: Union[str, Sequence[str], None] = 'a8d3f6c2e917'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# every operation so far was in the currency of wallets.balance
+DEFAULT_CURRENCY = 'RUB'
+
+# primary keys gaining the currency, with the columns around it
+KEYED_TABLES = {
+    'ledger_segments': (['wallet_id'], ['segment_id']),
+    'wallet_daily_totals': (['wallet_id'], ['day']),
+    'wallet_monthly_totals': (['wallet_id'], ['month']),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_balances',
+    sa.Column('wallet_id', sa.UUID(), nullable=False),
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('balance', sa.BigInteger(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id'], ),
+    sa.PrimaryKeyConstraint('wallet_id', 'currency')
+    )
+    # a constant default only touches the catalog, even on the partitions
+    op.add_column('operations', sa.Column('currency', sa.String(length=3), server_default=DEFAULT_CURRENCY, nullable=False))
+    for table, (before, after) in KEYED_TABLES.items():
+        op.add_column(table, sa.Column('currency', sa.String(length=3), server_default=DEFAULT_CURRENCY, nullable=False))
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.create_primary_key(f'{table}_pkey', table, [*before, 'currency', *after])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, (before, after) in KEYED_TABLES.items():
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.drop_column(table, 'currency')
+        op.create_primary_key(f'{table}_pkey', table, [*before, *after])
+    op.drop_column('operations', 'currency')
+    op.drop_table('wallet_balances')
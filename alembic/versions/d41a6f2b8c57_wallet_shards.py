@@ -0,0 +1,32 @@
+"""Wallet shard directory
+
+Revision ID: d41a6f2b8c57
+Revises: b7e3a9c4d215
+Create Date: 2026-10-19 16:40:12.204519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a6f2b8c57'
+down_revision: Union[str, Sequence[str], None] = 'b7e3a9c4d215'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('wallet_shards',
+    sa.Column('wallet_id', sa.UUID(), nullable=False),
+    sa.Column('shard', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('wallet_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('wallet_shards')
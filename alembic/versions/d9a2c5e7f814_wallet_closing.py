@@ -0,0 +1,54 @@
+"""Closed wallets and cascading wallet deletes
+
+Revision ID: d9a2c5e7f814
+Revises: c4e9b7a15d28
+Create Date: 2026-10-20 09:12:44.318027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a2c5e7f814'
+down_revision: Union[str, Sequence[str], None] = 'c4e9b7a15d28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# tables referencing wallets, whose rows go with the wallet
+CASCADED = ('operations', 'wallet_balances')
+
+# foreign keys kept by partitions detached to the archive schema
+ARCHIVE_FKEYS = sa.text(
+    "SELECT c.conrelid::regclass::text, c.conname FROM pg_constraint c "
+    "JOIN pg_namespace n ON n.oid = c.connamespace "
+    "WHERE c.contype = 'f' AND c.confrelid = 'wallets'::regclass "
+    "AND n.nspname = 'archive'"
+)
+
+
+def _replace_fkey(table: str, ondelete: str | None) -> None:
+    op.drop_constraint(f'{table}_wallet_id_fkey', table, type_='foreignkey')
+    # validated against every partition, a partitioned table has no NOT VALID
+    op.create_foreign_key(f'{table}_wallet_id_fkey', table, 'wallets', ['wallet_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('wallets', sa.Column('closed_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_wallets_closed_at', 'wallets', ['closed_at'], unique=False, postgresql_where=sa.text('closed_at IS NOT NULL'))
+    for table in CASCADED:
+        _replace_fkey(table, 'CASCADE')
+    # archived months outlive the wallets, and would block their deletion
+    for table, name in op.get_bind().execute(ARCHIVE_FKEYS).all():
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in CASCADED:
+        _replace_fkey(table, None)
+    op.drop_index('ix_wallets_closed_at', table_name='wallets', postgresql_where=sa.text('closed_at IS NOT NULL'))
+    op.drop_column('wallets', 'closed_at')
@@ -0,0 +1,37 @@
+"""Ledger segments index for archived operations
+
+Revision ID: e5b8c1d9f3a6
+Revises: d41a6f2b8c57
+Create Date: 2026-10-19 18:05:41.631207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8c1d9f3a6'
+down_revision: Union[str, Sequence[str], None] = 'd41a6f2b8c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ledger_segments',
+    sa.Column('wallet_id', sa.UUID(), nullable=False),
+    sa.Column('segment_id', sa.UUID(), nullable=False),
+    sa.Column('path', sa.String(length=255), nullable=False),
+    sa.Column('first_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('operations', sa.Integer(), nullable=False),
+    sa.Column('total', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('wallet_id', 'segment_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('ledger_segments')
@@ -0,0 +1,28 @@
+"""Wallet version
+
+Revision ID: f2c7a4e81b90
+Revises: e5b8c1d9f3a6
+Create Date: 2026-10-19 19:12:08.417326
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7a4e81b90'
+down_revision: Union[str, Sequence[str], None] = 'e5b8c1d9f3a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('wallets', sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('wallets', 'version')
@@ -1,4 +1,6 @@
+from .admin import router as admin_router
 from .health import router as health_router
 from .wallets import router as wallets_router
+from .wallets import wallet_not_found
 
-__all__ = ["wallets_router", "health_router"]
+__all__ = ["wallets_router", "health_router", "admin_router", "wallet_not_found"]
@@ -1,7 +1,58 @@
-from fastapi import Depends
+from collections.abc import AsyncIterator
+from uuid import UUID
+
+from fastapi import Depends, Header, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.session import get_db
+from src.db.ids import uuid7
+from src.db.session import MAIN_SHARD, session_manager
+from src.db.shards import shard_router
+
+# returned after writes, sent back by the client to read its own writes
+LSN_HEADER = "X-LSN"
+MIN_LSN_HEADER = "X-Min-LSN"
+READ_PRIMARY_HEADER = "X-Read-Primary"
+
+_LSN_PATTERN = r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$"
+
+
+def new_wallet_id() -> UUID:
+    """Id for a wallet the request may create, chosen up front so that the
+    request goes to the shard of the new wallet."""
+    return uuid7()
+
+
+async def get_shard(request: Request, wallet_id: UUID = Depends(new_wallet_id)) -> str:
+    """Shard of the wallet in the path, or of the wallet about to be created."""
+    if not shard_router.sharded:
+        return MAIN_SHARD
+
+    path_wallet_id = request.path_params.get("wallet_id")
+    if path_wallet_id is not None:
+        try:
+            wallet_id = UUID(path_wallet_id)
+        except ValueError:
+            # rejected by the path validation of the endpoint
+            return MAIN_SHARD
+    return await shard_router.shard_for(wallet_id)
+
+
+async def get_db(shard: str = Depends(get_shard)) -> AsyncIterator[AsyncSession]:
+    async with session_manager.session(shard=shard) as session:
+        yield session
+
+
+async def get_read_db(
+    shard: str = Depends(get_shard),
+    min_lsn: str | None = Header(
+        default=None, alias=MIN_LSN_HEADER, pattern=_LSN_PATTERN
+    ),
+    read_primary: bool = Header(default=False, alias=READ_PRIMARY_HEADER),
+) -> AsyncIterator[AsyncSession]:
+    async with session_manager.read_session(
+        min_lsn=min_lsn, primary=read_primary, shard=shard
+    ) as session:
+        yield session
 
 
 class RequestContext:
@@ -10,3 +61,21 @@ class RequestContext:
         session: AsyncSession = Depends(get_db),
     ):
         self.session = session
+
+    async def set_lsn(self, response: Response) -> None:
+        """Hand the client the primary WAL position after a write, for
+        ``X-Min-LSN`` on its next read. Only needed with replicas."""
+        if session_manager.has_replicas:
+            lsn = await session_manager.current_lsn(self.session)
+            response.headers[LSN_HEADER] = lsn
+
+
+class ReadContext(RequestContext):
+    """Context of read-only endpoints, served by a replica when one is
+    configured and has caught up with the client's last write."""
+
+    def __init__(
+        self,
+        session: AsyncSession = Depends(get_read_db),
+    ):
+        super().__init__(session=session)
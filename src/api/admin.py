@@ -0,0 +1,153 @@
+import asyncio
+import secrets as _secrets
+from collections import OrderedDict
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+
+from src import profiling
+from src.config import config, secrets
+from src.db import deadline as request_deadline
+from src.db import statements
+from src.db.ids import uuid7
+from src.db.retry import retry_policy
+from src.db.session import session_manager
+from src.jobs import scheduler
+from src.models.dto import JobsReport, MethodStats, RetryStats
+from src.services.hot_wallets import hot_wallets
+
+# snapshots live in the memory of the worker that took them
+MAX_SNAPSHOTS = 16
+_snapshots: OrderedDict[str, statements.Snapshot] = OrderedDict()
+# one capture at a time per worker
+_profiling = asyncio.Lock()
+# seconds a capture leaves of the request deadline to render the samples
+PROFILE_SLACK = 0.5
+
+
+async def require_admin(x_admin_token: str = Header(default="")) -> None:
+    token = secrets.admin_token
+    if token is None or not _secrets.compare_digest(
+        x_admin_token.encode(), token.get_secret_value().encode()
+    ):
+        raise HTTPException(status.HTTP_403_FORBIDDEN, "Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)],
+    default_response_class=ORJSONResponse,
+)
+
+
+async def _snapshot() -> statements.Snapshot:
+    async with session_manager.engine.begin() as conn:
+        await statements.ensure_extension(conn)
+        return await statements.take_snapshot(conn)
+
+
+@router.get(
+    "/statements",
+    summary="Database cost per DAO method since the last reset",
+)
+async def get_statements() -> list[MethodStats]:
+    return statements.report(await _snapshot())
+
+
+@router.post(
+    "/statements/snapshots",
+    summary="Snapshot pg_stat_statements, to diff after a workload",
+)
+async def create_snapshot() -> dict[str, str]:
+    snapshot_id = str(uuid7())
+    _snapshots[snapshot_id] = await _snapshot()
+    while len(_snapshots) > MAX_SNAPSHOTS:
+        _snapshots.popitem(last=False)
+
+    return {"id": snapshot_id}
+
+
+@router.get(
+    "/statements/snapshots/{snapshot_id}/diff",
+    summary="Database cost per DAO method since a snapshot",
+)
+async def diff_snapshot(snapshot_id: str) -> list[MethodStats]:
+    before = _snapshots.get(snapshot_id)
+    if before is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Unknown snapshot")
+
+    return statements.report(statements.diff(before, await _snapshot()))
+
+
+@router.post(
+    "/statements/reset",
+    summary="Reset pg_stat_statements",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def reset_statements() -> None:
+    async with session_manager.engine.begin() as conn:
+        await statements.ensure_extension(conn)
+        await statements.reset(conn)
+    _snapshots.clear()
+
+
+@router.get(
+    "/jobs",
+    summary="Background job timings of the worker serving the request",
+)
+async def get_jobs() -> JobsReport:
+    return JobsReport(leader=scheduler.leader, jobs=scheduler.stats())
+
+
+@router.get(
+    "/hot-wallets",
+    summary="Hot wallet cache counters of the worker serving the request",
+)
+async def get_hot_wallets() -> dict[str, int]:
+    return hot_wallets.stats()
+
+
+@router.get(
+    "/retries",
+    summary="Transaction retries of the worker serving the request",
+)
+async def get_retries() -> RetryStats:
+    return retry_policy.stats()
+
+
+@router.get(
+    "/profile",
+    summary="Collapsed stack samples of the worker serving the request",
+    response_class=PlainTextResponse,
+)
+async def get_profile(
+    seconds: float = Query(default=5, gt=0),
+    idle: bool = False,
+) -> PlainTextResponse:
+    settings = config.profiling
+    if not settings.enabled:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Profiling is disabled")
+    seconds = min(seconds, settings.max_seconds)
+    # the deadline would cut the capture off with a 504
+    remaining = request_deadline.remaining()
+    if remaining is not None and seconds > remaining - PROFILE_SLACK:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_CONTENT,
+            f"A {seconds:g}s capture outlasts the request deadline, "
+            "raise it with X-Request-Timeout-Ms",
+        )
+    if _profiling.locked():
+        raise HTTPException(status.HTTP_409_CONFLICT, "A capture is already running")
+
+    async with _profiling:
+        stacks = await profiling.sample(seconds, settings.interval, idle=idle)
+    return PlainTextResponse(stacks)
+
+
+@router.get(
+    "/loop-stalls",
+    summary="Event loop stalls seen by the worker serving the request",
+)
+async def get_loop_stalls() -> dict[str, float]:
+    return profiling.loop_watchdog.stats()
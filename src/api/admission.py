@@ -0,0 +1,316 @@
+import asyncio
+import ipaddress
+import math
+import re
+import time
+from collections import OrderedDict, defaultdict
+from typing import Protocol
+
+import asyncpg
+import orjson
+from fastapi.responses import ORJSONResponse
+from loguru import logger
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.config import AdmissionConfig, config, secrets
+
+# requests under /wallets are admitted, anything else (docs, health) passes
+_WALLETS_PATH = re.compile(r"/wallets(?:/(?P<wallet_id>[0-9a-fA-F-]{36}))?(?:/|$)")
+
+
+class SharedStore(Protocol):
+    async def exchange(
+        self, namespace: str, consumed: dict[str, float]
+    ) -> dict[str, float]:
+        """Publish the tokens this worker consumed since the last exchange and
+        return the tokens the other workers consumed in the same period."""
+
+    async def close(self) -> None: ...
+
+
+# NOTIFY payloads must stay under 8000 bytes
+_NOTIFY_BYTES = 7000
+
+
+class PostgresStore:
+    """Shares consumption through LISTEN/NOTIFY on the main database: every
+    worker notifies what it consumed, and collects what the others notified
+    until its next exchange. Nothing is stored, a worker that was not
+    listening misses what was consumed meanwhile."""
+
+    CHANNEL = "admission"
+
+    def __init__(self, dsn: str) -> None:
+        self.dsn = dsn
+        self._conn: asyncpg.Connection | None = None
+        self._received: defaultdict[str, defaultdict[str, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+
+    async def _connect(self) -> asyncpg.Connection:
+        if self._conn is None:
+            conn = await asyncpg.connect(self.dsn)
+            await conn.add_listener(self.CHANNEL, self._on_notify)
+            conn.add_termination_listener(self._on_lost)
+            self._conn = conn
+        return self._conn
+
+    def _on_notify(self, conn, pid: int, channel: str, payload: str) -> None:
+        # our own notifications come back too
+        if pid == conn.get_server_pid():
+            return
+        namespace, consumed = orjson.loads(payload)
+        received = self._received[namespace]
+        for key, tokens in consumed.items():
+            received[key] += tokens
+
+    def _on_lost(self, conn) -> None:
+        self._conn = None
+
+    async def exchange(
+        self, namespace: str, consumed: dict[str, float]
+    ) -> dict[str, float]:
+        conn = await self._connect()
+        for payload in _payloads(namespace, consumed):
+            await conn.execute("SELECT pg_notify($1, $2)", self.CHANNEL, payload)
+        return dict(self._received.pop(namespace, {}))
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await conn.close()
+
+
+def _payloads(namespace: str, consumed: dict[str, float]) -> list[str]:
+    """``consumed`` as ``[namespace, {key: tokens}]`` notifications, split
+    to fit in a payload each."""
+    payloads = []
+    chunk: dict[str, float] = {}
+    size = 0
+    for key, tokens in consumed.items():
+        item = len(key) + 32
+        if chunk and size + item > _NOTIFY_BYTES:
+            payloads.append(orjson.dumps([namespace, chunk]).decode())
+            chunk, size = {}, 0
+        chunk[key] = tokens
+        size += item
+    if chunk:
+        payloads.append(orjson.dumps([namespace, chunk]).decode())
+    return payloads
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float) -> None:
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Token buckets per key, capped at ``max_keys`` least recently used."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._consumed: defaultdict[str, float] | None = None
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key: str, now: float | None = None) -> float:
+        """Take a token for ``key``. Returns 0 when admitted, otherwise the
+        seconds until the next token is available."""
+        if now is None:
+            now = time.monotonic()
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(
+                self.burst, bucket.tokens + (now - bucket.updated) * self.rate
+            )
+            bucket.updated = now
+
+        if bucket.tokens < 1:
+            return (1 - bucket.tokens) / self.rate
+
+        bucket.tokens -= 1
+        if self._consumed is not None:
+            self._consumed[key] += 1
+        return 0.0
+
+    async def sync(self, store: SharedStore, namespace: str) -> None:
+        """Charge the local buckets with what the other workers consumed."""
+        consumed = self._consumed or {}
+        self._consumed = defaultdict(float)
+
+        remote = await store.exchange(namespace, dict(consumed))
+        for key, tokens in remote.items():
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.tokens -= tokens
+
+
+class ConcurrencyLimiter:
+    """Bounds requests in flight, so they don't queue on the DB pool."""
+
+    def __init__(self, limit: int, queue_timeout: float) -> None:
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self.limit - self._semaphore._value
+
+    async def acquire(self) -> bool:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return True
+        if self.queue_timeout <= 0:
+            return False
+
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            return False
+        return True
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        settings: AdmissionConfig,
+        max_concurrency: int,
+        store: SharedStore | None = None,
+    ) -> None:
+        self.settings = settings
+        self.clients = RateLimiter(
+            settings.client_rate, settings.client_burst, settings.max_keys
+        )
+        self.wallets = RateLimiter(
+            settings.wallet_rate, settings.wallet_burst, settings.max_keys
+        )
+        self.concurrency = ConcurrencyLimiter(
+            settings.max_concurrency or max_concurrency, settings.queue_timeout
+        )
+        self.trusted_proxies = [
+            ipaddress.ip_network(network, strict=False)
+            for network in settings.trusted_proxies
+        ]
+        self.store = store
+        self._sync_task: asyncio.Task | None = None
+
+    def client_key(self, scope: Scope) -> str:
+        """The peer address, or the X-Client-Id header of a request that
+        came through a trusted proxy: any client could send one."""
+        client = scope.get("client")
+        if not client:
+            return "unknown"
+
+        host = client[0]
+        if self.trusted_proxies and self._trusted(host):
+            for name, value in scope["headers"]:
+                if name == b"x-client-id":
+                    return value.decode("latin-1")
+        return host
+
+    def _trusted(self, host: str) -> bool:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    async def start(self) -> None:
+        if self.store is not None and self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+        if self.store is not None:
+            await self.store.close()
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.sync_interval)
+            try:
+                await self.clients.sync(self.store, "client")
+                await self.wallets.sync(self.store, "wallet")
+            except Exception as e:
+                logger.warning(f"Rate limit sync failed: {e}")
+
+
+admission = AdmissionController(
+    config.admission,
+    max_concurrency=config.database.max_connections,
+    store=(
+        PostgresStore(secrets.asyncpg_dsn)
+        if config.admission.shared_store == "postgres"
+        else None
+    ),
+)
+
+
+def _reject(status_code: int, retry_after: float, detail: str) -> ORJSONResponse:
+    return ORJSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """Rejects requests before they check out a database connection:
+    ``429`` over the per-client or per-wallet rate, ``503`` when every
+    connection is already busy."""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.controller.settings.enabled:
+            return await self.app(scope, receive, send)
+
+        match = _WALLETS_PATH.search(scope["path"])
+        if match is None:
+            return await self.app(scope, receive, send)
+
+        controller = self.controller
+        now = time.monotonic()
+
+        retry_after = controller.clients.acquire(controller.client_key(scope), now)
+        if retry_after:
+            response = _reject(429, retry_after, "Client rate limit exceeded")
+            return await response(scope, receive, send)
+
+        wallet_id = match["wallet_id"]
+        if wallet_id is not None:
+            retry_after = controller.wallets.acquire(wallet_id.lower(), now)
+            if retry_after:
+                response = _reject(429, retry_after, "Wallet rate limit exceeded")
+                return await response(scope, receive, send)
+
+        if not await controller.concurrency.acquire():
+            response = _reject(503, 1, "Server is overloaded")
+            return await response(scope, receive, send)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.concurrency.release()
@@ -0,0 +1,71 @@
+import asyncio
+
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import DeadlineConfig, config
+from src.db.deadline import deadline_scope
+
+# milliseconds the client is willing to wait, capped at deadline.max_timeout
+TIMEOUT_HEADER = b"x-request-timeout-ms"
+
+
+def _timeout(scope: Scope, settings: DeadlineConfig) -> float | None:
+    """Seconds the request may take, None when the header is malformed."""
+    for name, value in scope["headers"]:
+        if name == TIMEOUT_HEADER:
+            try:
+                milliseconds = int(value)
+            except ValueError:
+                return None
+            if milliseconds <= 0:
+                return None
+            return min(milliseconds / 1000, settings.max_timeout)
+    return settings.default_timeout
+
+
+class DeadlineMiddleware:
+    """Runs each request under a deadline: its database transactions get
+    the remaining time as ``statement_timeout`` and ``lock_timeout`` (see
+    ``src.db.deadline``), and the request task is cancelled once it passes,
+    which hands its connection back to the pool. ``504`` when nothing was
+    sent yet."""
+
+    def __init__(self, app: ASGIApp, settings: DeadlineConfig = config.deadline):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.settings.enabled:
+            return await self.app(scope, receive, send)
+
+        timeout = _timeout(scope, self.settings)
+        if timeout is None:
+            response = ORJSONResponse(
+                {"detail": "X-Request-Timeout-Ms must be a positive integer"},
+                status_code=400,
+            )
+            return await response(scope, receive, send)
+
+        started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        timer = asyncio.timeout(timeout)
+        try:
+            with deadline_scope(timeout):
+                async with timer:
+                    await self.app(scope, receive, send_wrapper)
+        except TimeoutError:
+            # too late for a status code once the response has started, the
+            # server drops the connection
+            if not timer.expired() or started:
+                raise
+            response = ORJSONResponse(
+                {"detail": "Request deadline exceeded"}, status_code=504
+            )
+            await response(scope, receive, send)
@@ -1,8 +1,160 @@
+"""Liveness and readiness probes.
+
+Liveness only says the worker answers. Readiness also needs the database
+reachable and the connection pool not saturated, so a load balancer sheds
+traffic from a worker that could not serve it. Probes read what
+``HealthMonitor`` found on its last check, every ``health.interval``
+seconds: however often they come, a worker runs one query per interval.
+"""
+
+import asyncio
+import time
+
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+from loguru import logger
+from sqlalchemy import text
+
+from src.api.admission import admission
+from src.config import HealthConfig, config
+from src.db.session import session_manager
+
+PING = text("SELECT 1")
+
+
+def pool_usage() -> tuple[int, int]:
+    """Connections checked out of the pool serving requests, and its limit."""
+    backend = config.database.dao
+    if backend == "memory":
+        return 0, 0
+    if backend == "asyncpg":
+        pool = session_manager.pool
+        return pool.get_size() - pool.get_idle_size(), pool.get_max_size()
+    return session_manager.engine.pool.checkedout(), config.database.max_connections
+
+
+async def ping() -> None:
+    if config.database.dao == "memory":
+        return
+    async with session_manager.engine.connect() as conn:
+        await conn.execute(PING)
+
+
+class HealthMonitor:
+    def __init__(self, settings: HealthConfig) -> None:
+        self.settings = settings
+        self.reachable = False
+        self.error: str | None = None
+        self.latency = 0.0
+        # monotonic time of the last good check
+        self.checked_at: float | None = None
+        self.pool_in_use = 0
+        self.pool_max = 0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def saturation(self) -> float:
+        return self.pool_in_use / self.pool_max if self.pool_max else 0.0
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        # ready, or not, from the first probe on
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
 
-router = APIRouter()
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
 
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.interval)
+            await self.refresh()
 
-@router.get("/health", tags=["health"])
+    async def refresh(self) -> None:
+        """Sample the pool, then check the database. Never raises."""
+        started = time.monotonic()
+        try:
+            # before the check takes a connection of its own
+            self.pool_in_use, self.pool_max = pool_usage()
+            async with asyncio.timeout(self.settings.timeout):
+                await ping()
+        except Exception as e:
+            # once per outage
+            if self.error is None:
+                logger.warning(f"Database check failed: {e!r}")
+            self.reachable = False
+            self.error = repr(e)
+            return
+
+        now = time.monotonic()
+        self.reachable = True
+        self.error = None
+        self.latency = now - started
+        self.checked_at = now
+
+    def problems(self, now: float | None = None) -> list[str]:
+        """Why the worker is not ready, nothing when it is."""
+        if now is None:
+            now = time.monotonic()
+
+        problems = []
+        if not self.reachable:
+            problems.append("database unreachable")
+        elif now - self.checked_at > self.settings.stale_after:
+            # the refresh loop is stuck, or the event loop is
+            problems.append("database check is stale")
+        if self.saturation >= self.settings.max_pool_saturation:
+            problems.append("connection pool saturated")
+        return problems
+
+    def stats(self, now: float | None = None) -> dict:
+        if now is None:
+            now = time.monotonic()
+
+        return {
+            "database": {
+                "reachable": self.reachable,
+                "latency_ms": round(self.latency * 1000, 3),
+                "checked_s_ago": (
+                    None if self.checked_at is None else round(now - self.checked_at, 3)
+                ),
+                "error": self.error,
+            },
+            "pool": {
+                "in_use": self.pool_in_use,
+                "max": self.pool_max,
+                "saturation": round(self.saturation, 3),
+            },
+            "in_flight": admission.concurrency.in_flight,
+        }
+
+
+health_monitor = HealthMonitor(config.health)
+
+router = APIRouter(tags=["health"], default_response_class=ORJSONResponse)
+
+
+@router.get("/health")
+@router.get("/health/live")
 async def health() -> dict:
+    """Liveness: the worker answers, whatever state the database is in."""
     return {"status": "ok"}
+
+
+@router.get("/health/ready")
+async def ready() -> ORJSONResponse:
+    """Readiness, 503 while the worker should get no traffic."""
+    now = time.monotonic()
+    problems = health_monitor.problems(now)
+    return ORJSONResponse(
+        {
+            "status": "not ready" if problems else "ready",
+            "problems": problems,
+            **health_monitor.stats(now),
+        },
+        status_code=503 if problems else 200,
+    )
@@ -1,13 +1,40 @@
+from datetime import date, datetime
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse
 
-from src.db.models import OperationType
+from src.db.models import DEFAULT_CURRENCY, OperationType, TotalsPeriod
+from src.db.shards import shard_router
+from src.exceptions.wallets import InsufficientFundsError, WalletNotFoundError
+from src.models.dto import (
+    Operation,
+    OperationPage,
+    Transfer,
+    WalletBalance,
+    WalletBalances,
+    WalletCreated,
+    WalletTotals,
+    dump_operation_page,
+)
+from src.services.transfers import TransferService
 from src.services.wallets import WalletService
 
-from ._context import RequestContext
+from ._context import ReadContext, RequestContext, new_wallet_id
+
+router = APIRouter(default_response_class=ORJSONResponse)
 
-router = APIRouter()
+# ISO 4217 code
+CURRENCY_PATTERN = "^[A-Z]{3}$"
+
+
+async def wallet_not_found(
+    request: Request, exc: WalletNotFoundError
+) -> ORJSONResponse:
+    """Handler of the app: unknown and closed wallets are a 404 anywhere."""
+    return ORJSONResponse(
+        {"detail": exc.message}, status_code=status.HTTP_404_NOT_FOUND
+    )
 
 
 @router.post(
@@ -16,10 +43,17 @@ router = APIRouter()
     summary="Create new wallet",
 )
 async def create_wallet(
+    response: Response,
     balance: int = 0,
+    wallet_id: UUID = Depends(new_wallet_id),
     ctx: RequestContext = Depends(),
-) -> UUID:
-    return await WalletService.create_wallet(session=ctx.session, balance=balance)
+) -> WalletCreated:
+    wallet_id = await WalletService.create_wallet(
+        session=ctx.session, balance=balance, wallet_id=wallet_id
+    )
+    await ctx.set_lsn(response)
+
+    return WalletCreated(id=wallet_id)
 
 
 @router.post(
@@ -28,25 +62,153 @@ async def create_wallet(
     summary="Add new operation to wallet",
 )
 async def add_operation(
+    response: Response,
     wallet_id: UUID,
     op_type: OperationType,
     amount: int = 1000,
+    currency: str = Query(default=DEFAULT_CURRENCY, pattern=CURRENCY_PATTERN),
     ctx: RequestContext = Depends(),
-) -> None:
-    await WalletService.process_operation(
-        session=ctx.session, wallet_id=wallet_id, op_type=op_type, amount=amount
+) -> Operation:
+    operation = await WalletService.process_operation(
+        session=ctx.session,
+        wallet_id=wallet_id,
+        op_type=op_type,
+        amount=amount,
+        currency=currency,
     )
+    await ctx.set_lsn(response)
+
+    return operation
+
+
+@router.post(
+    "/wallets/{wallet_id}/transfer",
+    tags=["Wallets"],
+    summary="Transfer from this wallet to another one, atomically",
+)
+async def transfer(
+    response: Response,
+    wallet_id: UUID,
+    to_wallet_id: UUID,
+    amount: int = Query(gt=0),
+    ctx: RequestContext = Depends(),
+) -> Transfer:
+    if to_wallet_id == wallet_id:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_CONTENT, "Transfer to the same wallet"
+        )
+    # both wallets have to be in the transaction of the request's shard
+    if shard_router.sharded and await shard_router.shard_for(
+        to_wallet_id
+    ) != await shard_router.shard_for(wallet_id):
+        raise HTTPException(
+            status.HTTP_409_CONFLICT, "Transfers across shards are not supported"
+        )
+
+    try:
+        transfer = await TransferService.transfer(
+            session=ctx.session,
+            from_wallet_id=wallet_id,
+            to_wallet_id=to_wallet_id,
+            amount=amount,
+        )
+    except InsufficientFundsError as e:
+        raise HTTPException(status.HTTP_409_CONFLICT, e.message) from e
+    await ctx.set_lsn(response)
+
+    return transfer
 
 
 @router.get(
     "/wallets/{wallet_id}",
     tags=["Wallets"],
-    summary="Get the balance of wallet",
+    summary="Get the balance of wallet in the default currency",
 )
 async def get_balance(
+    wallet_id: UUID,
+    ctx: RequestContext = Depends(ReadContext),
+) -> WalletBalance:
+    balance = await WalletService.get_balance(session=ctx.session, wallet_id=wallet_id)
+
+    return WalletBalance(id=wallet_id, balance=balance)
+
+
+@router.delete(
+    "/wallets/{wallet_id}",
+    tags=["Wallets"],
+    summary="Close wallet, its operations are deleted in the background",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def close_wallet(
+    response: Response,
     wallet_id: UUID,
     ctx: RequestContext = Depends(),
 ) -> None:
-    balance = await WalletService.get_balance(session=ctx.session, wallet_id=wallet_id)
+    await WalletService.close_wallet(session=ctx.session, wallet_id=wallet_id)
+    await ctx.set_lsn(response)
+
+
+@router.get(
+    "/wallets/{wallet_id}/balances",
+    tags=["Wallets"],
+    summary="Get the balances of wallet in every currency",
+)
+async def get_balances(
+    wallet_id: UUID,
+    ctx: RequestContext = Depends(ReadContext),
+) -> WalletBalances:
+    balances = await WalletService.get_balances(
+        session=ctx.session, wallet_id=wallet_id
+    )
+
+    return WalletBalances(id=wallet_id, balances=balances)
+
+
+@router.get(
+    "/wallets/{wallet_id}/operations",
+    tags=["Wallets"],
+    summary="Get the operation history of wallet, newest first",
+    response_model=OperationPage,
+)
+async def get_history(
+    wallet_id: UUID,
+    limit: int = Query(default=100, ge=1, le=10_000),
+    before: datetime | None = None,
+    since: datetime | None = None,
+    ctx: RequestContext = Depends(ReadContext),
+) -> Response:
+    # a bounded [since, before) window only touches the matching partitions
+    rows = await WalletService.get_history(
+        session=ctx.session,
+        wallet_id=wallet_id,
+        limit=limit,
+        before=before,
+        since=since,
+    )
+
+    # rows come straight from the database: skip per-row response validation
+    return Response(content=dump_operation_page(rows), media_type="application/json")
+
+
+@router.get(
+    "/wallets/{wallet_id}/totals",
+    tags=["Wallets"],
+    summary="Get the deposit and withdraw totals of wallet per day or month",
+)
+async def get_totals(
+    wallet_id: UUID,
+    period: TotalsPeriod = TotalsPeriod.day,
+    since: date | None = None,
+    until: date | None = None,
+    ctx: RequestContext = Depends(ReadContext),
+) -> WalletTotals:
+    # periods starting in [since, until), a row per period from the rollups
+    totals = await WalletService.get_totals(
+        session=ctx.session,
+        wallet_id=wallet_id,
+        period=period,
+        since=since,
+        until=until,
+    )
 
-    return balance
+    return WalletTotals(id=wallet_id, period=period, totals=totals)
@@ -0,0 +1,105 @@
+"""Latency past saturation with and without admission control.
+
+A wallet endpoint is served in-process against a simulated connection pool
+(a semaphore of ``--pool`` slots, each query holding a slot for
+``--service-ms``). Requests arrive open loop at ``--rps``, above what the
+pool can serve. Without admission they queue on the pool and latency grows
+for everyone; with it the excess is rejected with 429/503 up front and the
+admitted requests keep their latency. Needs no database.
+
+    uv run -m src.benchmarks.admission --rps 2000 --seconds 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from uuid import uuid4
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from src.api.admission import AdmissionController, AdmissionMiddleware
+from src.config import AdmissionConfig
+
+
+def _app(pool: int, service: float, admission: AdmissionConfig | None) -> FastAPI:
+    app = FastAPI()
+    connections = asyncio.Semaphore(pool)
+
+    @app.get("/wallets/{wallet_id}")
+    async def get_balance(wallet_id: str):
+        async with connections:
+            await asyncio.sleep(service)
+        return {"id": wallet_id, "balance": 0}
+
+    if admission is not None:
+        controller = AdmissionController(admission, max_concurrency=pool)
+        app.add_middleware(AdmissionMiddleware, controller=controller)
+    return app
+
+
+async def _load(app: FastAPI, rps: int, seconds: float, wallets: int) -> None:
+    wallet_ids = [uuid4() for _ in range(wallets)]
+    latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+
+        async def send(i: int) -> None:
+            start = time.perf_counter()
+            response = await client.get(f"/wallets/{wallet_ids[i % wallets]}")
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(rps * seconds)):
+            # open loop: arrivals don't wait for earlier responses
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(i)))
+        await asyncio.gather(*tasks)
+
+    ms = sorted(latency * 1000 for latency in latencies)
+    p50 = statistics.median(ms) if ms else 0.0
+    p99 = ms[int(len(ms) * 0.99) - 1] if ms else 0.0
+    rejected = statuses[429] + statuses[503]
+    print(
+        f"{statuses[200]:>8} {rejected:>9} {p50:>10.1f} {p99:>10.1f}"
+        f"  {dict(sorted(statuses.items()))}"
+    )
+
+
+async def run(
+    rps: int, seconds: float, pool: int, service_ms: float, wallets: int
+) -> None:
+    service = service_ms / 1000
+    print(f"capacity ~{pool / service:,.0f} rps, offered {rps:,} rps")
+    print(f"{'mode':<10} {'ok':>8} {'rejected':>9} {'p50 ms':>10} {'p99 ms':>10}")
+
+    print(f"{'off':<10}", end=" ")
+    await _load(_app(pool, service, None), rps, seconds, wallets)
+
+    settings = AdmissionConfig(
+        client_rate=rps * 2, client_burst=rps * 2, wallet_rate=rps, wallet_burst=rps
+    )
+    print(f"{'on':<10}", end=" ")
+    await _load(_app(pool, service, settings), rps, seconds, wallets)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rps", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--pool", type=int, default=15)
+    parser.add_argument("--service-ms", type=float, default=10)
+    parser.add_argument("--wallets", type=int, default=1000)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.rps, args.seconds, args.pool, args.service_ms, args.wallets))
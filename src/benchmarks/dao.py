@@ -0,0 +1,75 @@
+"""Per-call overhead of the DAO backends.
+
+Runs ``add_to_balance`` and ``get_wallet`` against the configured database for
+every DAO backend and reports wall time and client-side CPU time per call.
+The database runs in a separate process, so CPU time is the Python overhead
+(statement construction, compilation, ORM hydration, greenlet bridging).
+
+    uv run -m src.benchmarks.dao --calls 5000
+"""
+
+import argparse
+import asyncio
+import time
+from functools import partial
+
+from src.db.repository import REPOSITORIES
+from src.db.session import session_manager
+
+
+async def _measure(call, calls: int) -> tuple[float, float]:
+    # warm up statement caches and the prepared statement cache of the connection
+    for _ in range(100):
+        await call()
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(calls):
+        await call()
+
+    return (
+        (time.perf_counter() - wall) / calls * 1e6,
+        (time.process_time() - cpu) / calls * 1e6,
+    )
+
+
+async def run(calls: int) -> None:
+    await session_manager.init_db(run_migrations=True)
+    await session_manager.init_pool()
+
+    print(f"{'backend':<10} {'method':<16} {'wall us/call':>14} {'cpu us/call':>14}")
+    try:
+        for backend, repo in REPOSITORIES.items():
+            async with session_manager.session(backend) as session:
+                wallet = await repo.wallets.create_wallet(session=session)
+
+                for name, call in (
+                    (
+                        "add_to_balance",
+                        partial(
+                            repo.wallets.add_to_balance,
+                            session=session,
+                            wallet_id=wallet.id,
+                            amount=1,
+                        ),
+                    ),
+                    (
+                        "get_wallet",
+                        partial(
+                            repo.wallets.get_wallet,
+                            session=session,
+                            wallet_id=wallet.id,
+                        ),
+                    ),
+                ):
+                    wall, cpu = await _measure(call, calls)
+                    print(f"{backend:<10} {name:<16} {wall:>14.1f} {cpu:>14.1f}")
+    finally:
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.calls))
@@ -0,0 +1,82 @@
+"""CPU cost per request of the hot wallet endpoints for every DAO backend.
+
+Requests go through the ASGI app in-process (no network), so the CPU time per
+request covers routing, validation, the DAO and the driver. The database runs
+in a separate process and does not count towards it.
+
+    uv run -m src.benchmarks.endpoints --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+from functools import partial
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from src.api import wallets_router
+from src.config import config
+from src.db.repository import REPOSITORIES
+from src.db.session import session_manager
+
+
+async def _measure(send, requests: int) -> tuple[float, float]:
+    for _ in range(100):
+        await send()
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(requests):
+        await send()
+
+    return (
+        (time.perf_counter() - wall) / requests * 1e6,
+        (time.process_time() - cpu) / requests * 1e6,
+    )
+
+
+async def run(requests: int) -> None:
+    await session_manager.init_db(run_migrations=True)
+    await session_manager.init_pool()
+
+    app = FastAPI()
+    app.include_router(wallets_router)
+
+    print(f"{'backend':<10} {'endpoint':<16} {'wall us/req':>14} {'cpu us/req':>14}")
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            for backend in REPOSITORIES:
+                config.database.dao = backend
+
+                response = await client.post("/wallets", params={"balance": 0})
+                wallet_id = response.json()["id"]
+
+                for name, send in (
+                    (
+                        "create_wallet",
+                        partial(client.post, "/wallets", params={"balance": 0}),
+                    ),
+                    (
+                        "add_operation",
+                        partial(
+                            client.post,
+                            f"/wallets/{wallet_id}/operation",
+                            params={"op_type": "DEPOSIT", "amount": 1},
+                        ),
+                    ),
+                    ("get_balance", partial(client.get, f"/wallets/{wallet_id}")),
+                ):
+                    wall, cpu = await _measure(send, requests)
+                    print(f"{backend:<10} {name:<16} {wall:>14.1f} {cpu:>14.1f}")
+    finally:
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests))
@@ -0,0 +1,104 @@
+"""Memory per cached wallet.
+
+Compares the array-backed ``HotWalletCache`` with the alternatives it
+replaces, measured with tracemalloc:
+
+* ``hot_cache``: ``HotWalletCache`` filled to ``--entries``;
+* ``slots_lru``: an ``OrderedDict`` of ``UUID`` -> ``__slots__`` objects;
+* ``orm``: ``DBWallet`` instances, persistent in a session identity map.
+  Measured on ``--orm-entries`` only and extrapolated to 1M.
+
+No database is needed, wallets are synthetic.
+
+    uv run -m src.benchmarks.hot_wallets --entries 1000000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from src.db.models import DBWallet
+from src.services.hot_wallets import HotWalletCache
+
+
+class SlotsWallet:
+    __slots__ = ("balance", "version")
+
+    def __init__(self, balance: int, version: int) -> None:
+        self.balance = balance
+        self.version = version
+
+
+def hot_cache(ids: list[uuid.UUID]) -> object:
+    cache = HotWalletCache(capacity=len(ids))
+    for i, wallet_id in enumerate(ids):
+        cache.store(wallet_id, i, 1)
+    return cache
+
+
+def slots_lru(ids: list[uuid.UUID]) -> object:
+    cache: OrderedDict[uuid.UUID, SlotsWallet] = OrderedDict()
+    for i, wallet_id in enumerate(ids):
+        cache[wallet_id] = SlotsWallet(i, 1)
+    return cache
+
+
+def orm(ids: list[uuid.UUID]) -> object:
+    # the identity map only holds weak references, a cache would hold the
+    # instances themselves
+    session = Session()
+    wallets = []
+    for i, wallet_id in enumerate(ids):
+        wallet = DBWallet(id=wallet_id, balance=i, version=1)
+        make_transient_to_detached(wallet)
+        session.add(wallet)
+        wallets.append(wallet)
+    return session, wallets
+
+
+def measure(build, ids: list[uuid.UUID]) -> tuple[float, float]:
+    """Bytes per entry, not counting the ids the caller holds anyway (the
+    array cache keys on ``UUID.int``, so its int keys are counted), and
+    build time in seconds."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    structure = build(ids)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del structure
+    return size / len(ids), elapsed
+
+
+def run(entries: int, orm_entries: int) -> None:
+    ids = [uuid.uuid4() for _ in range(entries)]
+
+    print(
+        f"{'structure':<12} {'entries':>10} {'bytes/entry':>12} {'MB @1M':>10} {'s':>8}"
+    )
+    for name, build, count in (
+        ("hot_cache", hot_cache, entries),
+        ("slots_lru", slots_lru, entries),
+        ("orm", orm, min(orm_entries, entries)),
+    ):
+        per_entry, elapsed = measure(build, ids[:count])
+        print(
+            f"{name:<12} {count:>10} {per_entry:>12.1f}"
+            f" {per_entry * 1_000_000 / 2**20:>10.1f} {elapsed:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory per cached wallet")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--orm-entries", type=int, default=100_000)
+    args = parser.parse_args()
+
+    run(args.entries, args.orm_entries)
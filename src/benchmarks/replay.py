@@ -0,0 +1,386 @@
+"""Replay a stream of operations through ``WalletService.process_operation``.
+
+A stream is NDJSON, one operation per line::
+
+    {"at": 0.25, "wallet": "w1", "op_type": "DEPOSIT", "amount": 100, "currency": "EUR"}
+
+``wallet`` is a key of the stream, not a wallet id: every key gets a fresh
+wallet holding ``--initial-balance``, so a replay never touches existing
+wallets. ``at`` (seconds from the start) and ``currency`` are optional.
+``record`` writes the operations of a time range of the database as such a
+stream, ``generate`` a synthetic one with a Zipf-like wallet skew (0 is
+uniform, 1 and above piles the load onto a few hot wallets).
+
+``run`` sends the stream with at most ``--concurrency`` operations in
+flight: as fast as possible, at ``--rate`` operations per second, or at the
+recorded ``at`` times sped up ``--speed`` times. Paced runs measure latency
+from the time an operation was due, so a backlog shows up in the numbers
+instead of slowing the load down. The report has throughput, latency
+percentiles, failures, retries, lock waits sampled from ``pg_stat_activity``
+and the check of every final balance against the replayed amounts. The
+replay wallets are closed afterwards (``--keep`` leaves them), for the purge
+job to delete.
+
+    uv run -m src.benchmarks.replay generate -n 100000 --wallets 1000 --skew 1.2 > ops.ndjson
+    uv run -m src.benchmarks.replay record --since 2026-10-01 --until 2026-10-02 > day.ndjson
+    uv run -m src.benchmarks.replay run ops.ndjson --backend asyncpg --concurrency 64
+    uv run -m src.benchmarks.replay run day.ndjson --speed 10
+    uv run -m src.benchmarks.replay run ops.ndjson --backend memory
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime
+from typing import NamedTuple
+from uuid import UUID
+
+import orjson
+from sqlalchemy import text
+
+from src.config import config
+from src.db.models import DEFAULT_CURRENCY, OperationType
+from src.db.repository import REPOSITORIES
+from src.db.retry import retry_policy
+from src.db.session import session_manager
+from src.exceptions.wallets import WalletNotFoundError
+from src.services.wallets import WalletService
+
+SELECT_OPERATIONS = text(
+    "SELECT wallet_id, op_type, amount, currency, created_at FROM operations "
+    "WHERE created_at >= :since AND created_at < :until ORDER BY created_at"
+)
+
+LOCK_WAITERS = text(
+    "SELECT count(*) FROM pg_stat_activity "
+    "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+)
+
+
+class Op(NamedTuple):
+    at: float | None
+    wallet: str
+    op_type: OperationType
+    amount: int
+    currency: str
+
+
+def parse(line: bytes) -> Op:
+    record = orjson.loads(line)
+    return Op(
+        at=record.get("at"),
+        wallet=str(record["wallet"]),
+        op_type=OperationType(record["op_type"]),
+        amount=int(record["amount"]),
+        currency=record.get("currency") or DEFAULT_CURRENCY,
+    )
+
+
+def read_stream(path: str) -> list[Op]:
+    with open(path, "rb") if path != "-" else sys.stdin.buffer as f:
+        return [parse(line) for line in f if line.strip()]
+
+
+def dump(op: Op) -> bytes:
+    record = {
+        "wallet": op.wallet,
+        "op_type": op.op_type.value,
+        "amount": op.amount,
+        "currency": op.currency,
+    }
+    if op.at is not None:
+        record = {"at": op.at, **record}
+    return orjson.dumps(record)
+
+
+def generate(
+    count: int, wallets: int, skew: float, rate: float | None, seed: int
+) -> list[Op]:
+    rng = random.Random(seed)
+    keys = [f"w{rank}" for rank in range(wallets)]
+    weights = [1 / (rank + 1) ** skew for rank in range(wallets)]
+    return [
+        Op(
+            at=None if rate is None else round(i / rate, 6),
+            wallet=key,
+            op_type=rng.choice(list(OperationType)),
+            amount=rng.randint(1, 100),
+            currency=DEFAULT_CURRENCY,
+        )
+        for i, key in enumerate(rng.choices(keys, weights=weights, k=count))
+    ]
+
+
+async def record(since: datetime, until: datetime) -> None:
+    """Write the operations created in [since, until) as a stream."""
+    first = None
+    async with session_manager.engine.connect() as conn:
+        result = await conn.stream(SELECT_OPERATIONS, {"since": since, "until": until})
+        async for wallet_id, op_type, amount, currency, created_at in result:
+            first = first or created_at
+            op = Op(
+                at=(created_at - first).total_seconds(),
+                wallet=str(wallet_id),
+                # stored as the enum name
+                op_type=OperationType[op_type],
+                amount=amount,
+                currency=currency,
+            )
+            sys.stdout.buffer.write(dump(op) + b"\n")
+
+
+@dataclass
+class LockWaits:
+    samples: list[int] = field(default_factory=list)
+
+    @property
+    def ratio(self) -> float:
+        return sum(1 for waiters in self.samples if waiters) / max(len(self.samples), 1)
+
+    async def sample(self, stop: asyncio.Event, interval: float = 0.02) -> None:
+        async with session_manager.engine.connect() as conn:
+            while not stop.is_set():
+                self.samples.append(await conn.scalar(LOCK_WAITERS))
+                await conn.commit()
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=interval)
+                except TimeoutError:
+                    pass
+
+
+@dataclass
+class Replay:
+    ops: list[Op]
+    concurrency: int
+    # seconds per recorded second, None sends as fast as possible
+    pace: float | None
+    initial_balance: int
+    wallets: dict[str, UUID] = field(default_factory=dict)
+    latencies: list[float] = field(default_factory=list)
+    failures: Counter[str] = field(default_factory=Counter)
+    # operations that went through, per wallet key and currency
+    applied: defaultdict[tuple[str, str], int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    max_lag: float = 0.0
+    elapsed: float = 0.0
+
+    async def create_wallets(self) -> None:
+        async with session_manager.session() as session:
+            for op in self.ops:
+                if op.wallet not in self.wallets:
+                    self.wallets[op.wallet] = await WalletService.create_wallet(
+                        session=session, balance=self.initial_balance
+                    )
+
+    async def _send(self, op: Op, due: float) -> None:
+        try:
+            async with session_manager.session() as session:
+                await WalletService.process_operation(
+                    session=session,
+                    wallet_id=self.wallets[op.wallet],
+                    op_type=op.op_type,
+                    amount=op.amount,
+                    currency=op.currency,
+                )
+        except Exception as e:
+            self.failures[type(e).__name__] += 1
+            return
+        self.latencies.append(time.perf_counter() - due)
+        signed = -op.amount if op.op_type == OperationType.withdraw else op.amount
+        self.applied[op.wallet, op.currency] += signed
+
+    async def run(self) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        async def send(op: Op, due: float) -> None:
+            try:
+                await self._send(op, due)
+            finally:
+                semaphore.release()
+
+        start = time.perf_counter()
+        for i, op in enumerate(self.ops):
+            if self.pace is None:
+                await semaphore.acquire()
+                due = time.perf_counter()
+            else:
+                due = start + (op.at if op.at is not None else i) * self.pace
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await semaphore.acquire()
+                self.max_lag = max(self.max_lag, time.perf_counter() - due)
+            task = asyncio.create_task(send(op, due))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        self.elapsed = time.perf_counter() - start
+
+    async def verify(self) -> list[str]:
+        """Final balances off the initial balance plus the replayed amounts."""
+        mismatches = []
+        async with session_manager.session() as session:
+            for key, wallet_id in self.wallets.items():
+                balances = await WalletService.get_balances(
+                    session=session, wallet_id=wallet_id
+                )
+                currencies = {
+                    currency for wallet, currency in self.applied if wallet == key
+                }
+                for currency in currencies | balances.keys():
+                    expected = self.applied.get((key, currency), 0)
+                    if currency == DEFAULT_CURRENCY:
+                        expected += self.initial_balance
+                    if balances.get(currency, 0) != expected:
+                        mismatches.append(
+                            f"{key} ({wallet_id}) {currency}: "
+                            f"balance {balances.get(currency, 0)}, expected {expected}"
+                        )
+        return mismatches
+
+    async def close_wallets(self) -> None:
+        async with session_manager.session() as session:
+            for wallet_id in self.wallets.values():
+                try:
+                    await WalletService.close_wallet(
+                        session=session, wallet_id=wallet_id
+                    )
+                except WalletNotFoundError:
+                    pass
+
+
+def _percentile(ms: list[float], p: float) -> float:
+    return ms[max(int(len(ms) * p) - 1, 0)] if ms else 0.0
+
+
+def report(
+    replay: Replay, locks: LockWaits, mismatches: list[str], backend: str
+) -> dict:
+    ms = sorted(latency * 1000 for latency in replay.latencies)
+    retries = retry_policy.stats()
+    return {
+        "backend": backend,
+        "operations": len(replay.ops),
+        "wallets": len(replay.wallets),
+        "concurrency": replay.concurrency,
+        "seconds": round(replay.elapsed, 3),
+        "ops_per_second": round(len(ms) / replay.elapsed, 1) if replay.elapsed else 0,
+        "latency_ms": {
+            "p50": round(statistics.median(ms), 3) if ms else 0.0,
+            "p90": round(_percentile(ms, 0.9), 3),
+            "p99": round(_percentile(ms, 0.99), 3),
+            "max": round(ms[-1], 3) if ms else 0.0,
+        },
+        "max_schedule_lag_ms": round(replay.max_lag * 1000, 3),
+        "failures": dict(replay.failures),
+        "retries": retries.retries,
+        "retries_by_sqlstate": retries.by_sqlstate,
+        "lock_wait_sample_ratio": round(locks.ratio, 3),
+        "max_lock_waiters": max(locks.samples, default=0),
+        "balance_mismatches": len(mismatches),
+    }
+
+
+async def run(args: argparse.Namespace, ops: list[Op]) -> int:
+    if args.limit is not None:
+        ops = ops[: args.limit]
+
+    pace = None
+    if args.rate is not None:
+        pace = 1 / args.rate
+        ops = [op._replace(at=None) for op in ops]
+    elif args.speed is not None:
+        pace = 1 / args.speed
+
+    config.database.dao = args.backend
+    # the in-memory backend needs no database, and has no locks to sample
+    in_memory = args.backend == "memory"
+    if not in_memory:
+        await session_manager.init_db()
+        await session_manager.init_pool()
+    try:
+        replay = Replay(ops, args.concurrency, pace, args.initial_balance)
+        await replay.create_wallets()
+        retry_policy.reset()
+
+        locks = LockWaits()
+        stop = asyncio.Event()
+        sampler = None if in_memory else asyncio.create_task(locks.sample(stop))
+        try:
+            await replay.run()
+        finally:
+            stop.set()
+            if sampler is not None:
+                await sampler
+
+        mismatches = await replay.verify()
+        for mismatch in mismatches:
+            print(f"mismatch: {mismatch}", file=sys.stderr)
+        print(orjson.dumps(report(replay, locks, mismatches, args.backend)).decode())
+
+        if not args.keep:
+            await replay.close_wallets()
+    finally:
+        await session_manager.close()
+
+    return 1 if mismatches else 0
+
+
+async def record_range(args: argparse.Namespace) -> None:
+    await session_manager.init_db()
+    try:
+        await record(
+            datetime.combine(args.since, datetime.min.time(), UTC),
+            datetime.combine(args.until, datetime.min.time(), UTC),
+        )
+    finally:
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="replay a stream")
+    run_parser.add_argument("stream", help="NDJSON file, - for stdin")
+    run_parser.add_argument(
+        "--backend", choices=list(REPOSITORIES), default=config.database.dao
+    )
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    pacing = run_parser.add_mutually_exclusive_group()
+    pacing.add_argument("--rate", type=float, help="operations per second")
+    pacing.add_argument("--speed", type=float, help="times the recorded pace")
+    run_parser.add_argument("--initial-balance", type=int, default=1_000_000)
+    run_parser.add_argument("--limit", type=int, default=None)
+    run_parser.add_argument("--keep", action="store_true", help="keep the wallets")
+
+    generate_parser = commands.add_parser("generate", help="write a synthetic stream")
+    generate_parser.add_argument("-n", "--operations", type=int, default=10_000)
+    generate_parser.add_argument("--wallets", type=int, default=100)
+    generate_parser.add_argument("--skew", type=float, default=1.0)
+    generate_parser.add_argument(
+        "--rate", type=float, default=None, help="stamp `at` for this many ops/s"
+    )
+    generate_parser.add_argument("--seed", type=int, default=0)
+
+    record_parser = commands.add_parser("record", help="write operations of the db")
+    record_parser.add_argument("--since", type=date.fromisoformat, required=True)
+    record_parser.add_argument("--until", type=date.fromisoformat, required=True)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(asyncio.run(run(args, read_stream(args.stream))))
+    elif args.command == "generate":
+        for op in generate(
+            args.operations, args.wallets, args.skew, args.rate, args.seed
+        ):
+            sys.stdout.buffer.write(dump(op) + b"\n")
+    else:
+        asyncio.run(record_range(args))
@@ -0,0 +1,84 @@
+"""Serialization cost of a wallet history page.
+
+Compares three ways of turning DB rows into the ``OperationPage`` JSON body:
+
+* ``validated``: build ``Operation`` models with validation and let pydantic
+  serialize the page, which is what FastAPI does for a ``response_model``;
+* ``constructed``: ``Operation.model_construct`` (no validation) + pydantic
+  dump. Pure-python construction turns out slower than pydantic-core
+  validation, which is why ``Operation.from_db`` keeps validating;
+* ``orjson``: ``dump_operation_page`` straight from the rows.
+
+No database is needed, rows are synthetic.
+
+    uv run -m src.benchmarks.serialization --rows 10000
+"""
+
+import argparse
+import time
+import uuid
+from datetime import UTC, datetime
+
+from src.db.models import OperationType
+from src.models.dto import Operation, OperationPage, OperationRow, dump_operation_page
+
+
+def _rows(count: int) -> list[OperationRow]:
+    wallet_id = uuid.uuid4()
+    now = datetime.now(UTC)
+    return [
+        OperationRow(uuid.uuid4(), wallet_id, OperationType.deposit, i, now)
+        for i in range(count)
+    ]
+
+
+def validated(rows: list[OperationRow]) -> bytes:
+    operations = [Operation.from_db(row) for row in rows]
+    return OperationPage(operations=operations).model_dump_json().encode()
+
+
+def constructed(rows: list[OperationRow]) -> bytes:
+    operations = [
+        Operation.model_construct(
+            id=row.id,
+            wallet_id=row.wallet_id,
+            op_type=row.op_type,
+            amount=row.amount,
+            created_at=row.created_at,
+        )
+        for row in rows
+    ]
+    return (
+        OperationPage.model_construct(operations=operations).model_dump_json().encode()
+    )
+
+
+def run(rows: int, repeat: int) -> None:
+    page = _rows(rows)
+
+    print(f"{'path':<12} {'ms/page':>10} {'us/row':>10} {'bytes':>10}")
+    for name, serialize in (
+        ("validated", validated),
+        ("constructed", constructed),
+        ("orjson", dump_operation_page),
+    ):
+        body = serialize(page)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            serialize(page)
+        elapsed = (time.perf_counter() - start) / repeat
+
+        print(
+            f"{name:<12} {elapsed * 1e3:>10.2f} {elapsed / rows * 1e6:>10.3f}"
+            f" {len(body):>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    run(args.rows, args.repeat)
@@ -0,0 +1,151 @@
+"""Throughput and latency of the wallet endpoints per serving profile.
+
+Each profile starts the app in a uvicorn process of its own (one worker,
+admission control and jobs off) and is driven over real HTTP by
+``--concurrency`` keep-alive connections for ``--seconds`` per endpoint:
+
+* ``baseline``: asyncio loop, h11 parser, access log and CORS middleware;
+* ``uvloop``: uvloop and httptools, otherwise the same;
+* ``lean``: uvloop and httptools without access log and CORS middleware.
+
+The load generator is a Python process too: past a few thousand requests
+per second it is the bottleneck, so compare the profiles rather than read
+the absolute numbers. Needs the database from ``.env``.
+
+    uv run -m src.benchmarks.serving --seconds 10 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from src.config import config
+from src.server import serve
+
+PROFILES = {
+    "baseline": {"loop": "asyncio", "http": "h11", "access_log": True, "cors": True},
+    "uvloop": {"loop": "uvloop", "http": "httptools", "access_log": True, "cors": True},
+    "lean": {"loop": "uvloop", "http": "httptools", "access_log": False, "cors": False},
+}
+
+
+def _serve(port: int, profile: dict) -> None:
+    # runs in a fresh process: src.main is imported by uvicorn after this.
+    # The access log is still formatted and written, just not to the terminal
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    config.cors_allow_origins = ["*"] if profile["cors"] else []
+    config.admission.enabled = False
+    config.jobs.enabled = False
+    settings = config.uvicorn.model_copy(
+        update={
+            "host": "127.0.0.1",
+            "port": port,
+            "workers": 1,
+            "reload": False,
+            "process_manager": "uvicorn",
+            "loop": profile["loop"],
+            "http": profile["http"],
+            "access_log": profile["access_log"],
+        }
+    )
+    serve(settings)
+
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.get("/openapi.json")
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def _load(send, concurrency: int, seconds: float) -> tuple[float, float, float]:
+    """Requests per second, p50 and p99 latency in ms."""
+    latencies: list[float] = []
+    stop = time.perf_counter() + seconds
+
+    async def worker() -> None:
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            response = await send()
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ms = sorted(latency * 1000 for latency in latencies)
+    return (
+        len(ms) / elapsed,
+        statistics.median(ms),
+        ms[max(int(len(ms) * 0.99) - 1, 0)],
+    )
+
+
+async def _bench(port: int, concurrency: int, seconds: float, name: str) -> None:
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}/api/v1", limits=limits, timeout=30
+    ) as client:
+        await _wait_ready(client)
+        response = await client.post("/wallets", params={"balance": 0})
+        wallet_id = response.json()["id"]
+
+        def get_balance():
+            return client.get(f"/wallets/{wallet_id}")
+
+        def add_operation():
+            return client.post(
+                f"/wallets/{wallet_id}/operation",
+                params={"op_type": "DEPOSIT", "amount": 1},
+            )
+
+        for endpoint, send in (
+            ("get_balance", get_balance),
+            ("add_operation", add_operation),
+        ):
+            # warm up connections and caches
+            await _load(send, concurrency, min(seconds, 1))
+            rps, p50, p99 = await _load(send, concurrency, seconds)
+            print(f"{name:<10} {endpoint:<14} {rps:>10.0f} {p50:>10.2f} {p99:>10.2f}")
+
+
+def run(port: int, concurrency: int, seconds: float, profiles: list[str]) -> None:
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{'profile':<10} {'endpoint':<14} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}"
+    )
+    for name in profiles:
+        server = context.Process(target=_serve, args=(port, PROFILES[name]))
+        server.start()
+        try:
+            asyncio.run(_bench(port, concurrency, seconds, name))
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument(
+        "--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES)
+    )
+    args = parser.parse_args()
+
+    run(args.port, args.concurrency, args.seconds, args.profiles)
@@ -0,0 +1,82 @@
+"""Insert throughput, WAL volume and primary key size for v4 vs v7 UUID keys.
+
+Loads the same number of rows into two scratch tables shaped like
+``operations`` (UUID primary key, a couple of payload columns), one keyed
+with ``uuid.uuid4`` and one with ``uuid7``, and reports rows/s, WAL bytes
+written and the size of the primary key index. Needs a running database;
+the scratch tables are dropped afterwards.
+
+    uv run -m src.benchmarks.uuid_keys --rows 10000000
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from collections.abc import Callable
+
+import asyncpg
+
+from src.config import secrets
+from src.db.ids import uuid7
+
+
+async def _load(
+    conn: asyncpg.Connection,
+    table: str,
+    make_id: Callable[[], uuid.UUID],
+    rows: int,
+    batch: int,
+) -> None:
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(
+        f"CREATE TABLE {table} (id uuid PRIMARY KEY, wallet_id uuid, amount int)"
+    )
+    wallet_id = uuid.uuid4()
+
+    wal_start = await conn.fetchval("SELECT pg_current_wal_insert_lsn()::text")
+    start = time.perf_counter()
+    for offset in range(0, rows, batch):
+        records = [
+            (make_id(), wallet_id, i) for i in range(offset, min(offset + batch, rows))
+        ]
+        # one statement per batch, as a busy ledger commits many small batches
+        await conn.executemany(
+            f"INSERT INTO {table} (id, wallet_id, amount) VALUES ($1, $2, $3)", records
+        )
+    elapsed = time.perf_counter() - start
+
+    wal_bytes = await conn.fetchval(
+        "SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), $1::pg_lsn)", wal_start
+    )
+    index_bytes = await conn.fetchval(f"SELECT pg_relation_size('{table}_pkey')")
+
+    print(
+        f"{table:<16} {rows / elapsed:>12,.0f} {wal_bytes / 2**20:>12,.1f}"
+        f" {index_bytes / 2**20:>12,.1f}"
+    )
+
+
+async def run(rows: int, batch: int, keep: bool) -> None:
+    conn = await asyncpg.connect(secrets.asyncpg_dsn)
+    tables = {"bench_uuid_v4": uuid.uuid4, "bench_uuid_v7": uuid7}
+
+    print(f"{'table':<16} {'rows/s':>12} {'WAL MiB':>12} {'pkey MiB':>12}")
+    try:
+        for table, make_id in tables.items():
+            await _load(conn, table, make_id, rows, batch)
+    finally:
+        if not keep:
+            for table in tables:
+                await conn.execute(f"DROP TABLE IF EXISTS {table}")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch", type=int, default=1_000)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch tables")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.rows, args.batch, args.keep))
@@ -4,7 +4,7 @@ from zoneinfo import ZoneInfo
 
 import yaml  # type: ignore
 from loguru import logger
-from pydantic import BaseModel, SecretStr, computed_field
+from pydantic import BaseModel, SecretStr, computed_field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 BASE_DIR = Path(__file__).parent.parent
@@ -21,6 +21,12 @@ class Secrets(BaseSettings):
     postgres_user: SecretStr
     postgres_password: SecretStr
     postgres_port: SecretStr
+    # read replicas as "host:port", e.g. POSTGRES_REPLICA_HOSTS='["replica:5432"]'
+    postgres_replica_hosts: list[str] = []
+    # extra wallet shards by name, e.g. POSTGRES_SHARD_HOSTS='{"s1": "shard1:5432"}'
+    postgres_shard_hosts: dict[str, str] = {}
+    # the /admin endpoints are mounted only when set, and require it in X-Admin-Token
+    admin_token: SecretStr | None = None
 
     def is_dev(self) -> bool:
         return self.app_env == "dev"
@@ -30,18 +36,215 @@ class Secrets(BaseSettings):
         host = "localhost" if self.is_dev() else "postgres"
         return f"postgresql+asyncpg://{self.postgres_user.get_secret_value()}:{self.postgres_password.get_secret_value()}@{host}:{int(self.postgres_port.get_secret_value())}/{self.postgres_db.get_secret_value()}"
 
+    def _sqlalchemy_url_for(self, host: str) -> str:
+        credentials = f"{self.postgres_user.get_secret_value()}:{self.postgres_password.get_secret_value()}"
+        return f"postgresql+asyncpg://{credentials}@{host}/{self.postgres_db.get_secret_value()}"
+
+    @computed_field
+    def replica_sqlalchemy_urls(self) -> list[str]:
+        return [self._sqlalchemy_url_for(host) for host in self.postgres_replica_hosts]
+
+    @computed_field
+    def shard_sqlalchemy_urls(self) -> dict[str, str]:
+        return {
+            name: self._sqlalchemy_url_for(host)
+            for name, host in self.postgres_shard_hosts.items()
+        }
+
+    @computed_field
+    def asyncpg_dsn(self) -> str:
+        return str(self.sqlalchemy_url).replace(
+            "postgresql+asyncpg://", "postgresql://", 1
+        )
+
 
 class UvicornConfig(BaseModel):
     host: str
     port: int
     workers: int
     reload: bool
+    # "auto" picks uvloop and httptools when installed
+    loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    http: Literal["auto", "h11", "httptools"] = "auto"
+    # connections the kernel queues until a worker accepts them
+    backlog: int = 2048
+    # seconds an idle keep-alive connection stays open
+    timeout_keep_alive: int = 5
+    # connections per worker before new ones get a 503, unbounded when null
+    limit_concurrency: int | None = None
+    access_log: bool = True
+    # see src.server; the settings below apply to gunicorn only
+    process_manager: Literal["uvicorn", "gunicorn"] = "uvicorn"
+    # requests before a worker is recycled, 0 never, spread by the jitter
+    max_requests: int = 0
+    max_requests_jitter: int = 0
+    # seconds workers get to finish requests on restart or shutdown
+    graceful_timeout: int = 30
+
+
+# "memory" keeps everything in the process, see src.db.memory
+DaoBackend = Literal["orm", "compiled", "asyncpg", "memory"]
+
+
+class DatabaseConfig(BaseModel):
+    dao: DaoBackend = "orm"
+    # monthly operations partitions kept ahead of the current month
+    partition_months_ahead: int = 3
+    pool_size: int = 5
+    max_overflow: int = 10
+    # prefix SQL with the DAO method, for pg_stat_statements reports
+    tag_statements: bool = True
+
+    @property
+    def max_connections(self) -> int:
+        return self.pool_size + self.max_overflow
+
+
+class AdmissionConfig(BaseModel):
+    enabled: bool = True
+    # token buckets: sustained requests per second and burst size
+    client_rate: float = 100.0
+    client_burst: int = 200
+    wallet_rate: float = 50.0
+    wallet_burst: int = 100
+    # requests in flight; defaults to the database connection limit
+    max_concurrency: int | None = None
+    # how long a request may wait for a free slot before a 503
+    queue_timeout: float = 0.05
+    # buckets kept in memory, least recently used are dropped first
+    max_keys: int = 100_000
+    # charge the buckets of every worker with what the others consumed,
+    # through the main database; each worker limits on its own without
+    shared_store: Literal["postgres"] | None = None
+    # seconds between exchanges with the shared store, when one is set
+    sync_interval: float = 1.0
+    # addresses or networks of the proxies (e.g. "10.0.0.0/8") whose
+    # X-Client-Id header names the client; everyone else is limited per
+    # address, whatever the header says
+    trusted_proxies: list[str] = []
+
+
+class ArchiveConfig(BaseModel):
+    # Parquet segments of archived operations
+    directory: str = "./archive"
+    # operations older than this are moved out of the database
+    horizon_days: int = 365
+    # operations per batch, each batch is written to one segment
+    batch_size: int = 50_000
+    compression: str = "zstd"
+
+
+class HotWalletsConfig(BaseModel):
+    # serve balances of recently used wallets from process memory
+    enabled: bool = False
+    max_memory_mb: float = 64.0
+
+
+class JobsConfig(BaseModel):
+    enabled: bool = True
+    max_concurrency: int = 2
+    # runs are spread by up to this fraction of their interval
+    jitter: float = 0.1
+    # seconds between attempts to take over leadership
+    election_interval: float = 10.0
+    # seconds running jobs get to finish on shutdown
+    shutdown_timeout: float = 10.0
+    # seconds between runs, null disables a job
+    partitions_interval: float | None = 3600.0
+    archive_interval: float | None = None
+    archive_timeout: float | None = 3600.0
+    reconcile_interval: float | None = 3600.0
+    rollups_interval: float | None = 60.0
+    purge_interval: float | None = 300.0
+
+
+class RollupsConfig(BaseModel):
+    # operations younger than this many seconds are left for the next run,
+    # so that transactions still in flight commit first: keep it above the
+    # longest a transaction can run (deadline.max_timeout)
+    lag: float = 120.0
+    # seconds of operations folded per transaction
+    batch_window: float = 3600.0
+    # wallet chunks of a rebuild and how many run at once
+    rebuild_chunks: int = 16
+    rebuild_parallel: int = 4
+
+
+class PurgeConfig(BaseModel):
+    # operations of a closed wallet deleted per transaction
+    batch_size: int = 10_000
+
+
+class RetryConfig(BaseModel):
+    # retry transactions aborted by serialization failures, deadlocks and
+    # lock timeouts
+    enabled: bool = True
+    max_attempts: int = 5
+    # backoff before retry n is random in [0, min(max_delay, base_delay * 2**(n-1))]
+    base_delay: float = 0.01
+    max_delay: float = 0.2
+    # seconds from the first attempt after which no retry is started, or the
+    # request deadline when that is sooner
+    budget: float = 2.0
+
+
+class DeadlineConfig(BaseModel):
+    # bound requests, and their database work, by a deadline
+    enabled: bool = True
+    # seconds a request may take when the client sends no X-Request-Timeout-Ms
+    default_timeout: float = 10.0
+    # upper bound for X-Request-Timeout-Ms, in seconds
+    max_timeout: float = 60.0
+
+
+class HealthConfig(BaseModel):
+    # seconds between database checks, the probes only read the last result
+    interval: float = 2.0
+    # a check taking longer counts as the database being unreachable
+    timeout: float = 1.0
+    # not ready when the last good check is older than this many seconds
+    stale_after: float = 10.0
+    # not ready once this share of the pool connections is checked out
+    max_pool_saturation: float = 0.9
+
+
+class ProfilingConfig(BaseModel):
+    # GET /admin/profile: stack samples of a live worker, off unless asked for
+    enabled: bool = False
+    # seconds between stack samples, and the longest capture
+    interval: float = 0.005
+    max_seconds: float = 60.0
+    # log event loop stalls longer than slow_callback seconds, with the stack
+    watchdog: bool = True
+    slow_callback: float = 0.1
 
 
 class Config(BaseModel):
-    cors_allow_origins: list[str]
+    # no CORS middleware when empty
+    cors_allow_origins: list[str] = []
 
     uvicorn: UvicornConfig
+    database: DatabaseConfig = DatabaseConfig()
+    admission: AdmissionConfig = AdmissionConfig()
+    archive: ArchiveConfig = ArchiveConfig()
+    jobs: JobsConfig = JobsConfig()
+    hot_wallets: HotWalletsConfig = HotWalletsConfig()
+    rollups: RollupsConfig = RollupsConfig()
+    purge: PurgeConfig = PurgeConfig()
+    retry: RetryConfig = RetryConfig()
+    deadline: DeadlineConfig = DeadlineConfig()
+    health: HealthConfig = HealthConfig()
+    profiling: ProfilingConfig = ProfilingConfig()
+
+    @model_validator(mode="after")
+    def _hot_wallets_single_worker(self) -> "Config":
+        # writes and closes of the other workers never reach a worker's cache
+        if self.hot_wallets.enabled and self.uvicorn.workers > 1:
+            raise ValueError(
+                "hot_wallets.enabled serves stale balances with several "
+                "workers, it needs uvicorn.workers: 1"
+            )
+        return self
 
 
 def load_config(env: str) -> Config:
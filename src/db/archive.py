@@ -0,0 +1,312 @@
+"""Cold storage for old ledger rows.
+
+Operations older than the horizon (``archive.horizon_days``) are moved out
+of ``operations`` in batches of ``archive.batch_size``. Each batch is
+written to one compressed Parquet file, a segment, under
+``archive.directory``. The segment is then indexed per wallet in
+``ledger_segments``, and its rows are deleted, in a single transaction.
+The segment totals stand in for the archived rows in the balance:
+a wallet balance is the sum of its segment totals plus its rows still
+in ``operations``.
+
+History reads merge the hot rows with the archived ones. The index tells
+them which segments hold rows of the wallet in the requested window, so
+no other file is opened.
+
+uv run -m src.db.archive run [--older-than 2025-01-01] [--batch-size 50000]
+uv run -m src.db.archive segments <wallet_id>
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+from collections.abc import Sequence
+from datetime import UTC, date, datetime, time, timedelta
+from pathlib import Path
+from uuid import UUID
+
+import asyncpg
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.config import config
+from src.db.ids import uuid7
+from src.db.memory import MemoryStore
+from src.db.models import DEFAULT_CURRENCY, DBLedgerSegment, OperationType
+from src.db.session import session_manager
+from src.db.shards import shard_router
+from src.models.dto import OperationRow
+
+SCHEMA = pa.schema(
+    [
+        ("id", pa.binary(16)),
+        ("wallet_id", pa.binary(16)),
+        ("op_type", pa.string()),
+        ("amount", pa.int64()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        # missing from the segments written before currencies
+        ("currency", pa.string()),
+    ]
+)
+# rows are sorted by wallet within a segment, so the row group statistics
+# let a read skip most of a file
+ROW_GROUP_SIZE = 4096
+
+# locked rows belong to a concurrent run, skip them instead of waiting
+SELECT_BATCH = text(
+    "SELECT id, wallet_id, op_type, amount, created_at, currency FROM operations "
+    "WHERE created_at < :older_than "
+    "ORDER BY created_at, id LIMIT :limit FOR UPDATE SKIP LOCKED"
+)
+DELETE_BATCH = text(
+    "DELETE FROM operations WHERE created_at < :older_than AND id = ANY(:ids)"
+)
+
+# segments with rows in [since, before), newest first; a segment has an
+# index row per currency of the wallet
+_SELECT_SEGMENTS = (
+    "SELECT path, max(last_at) AS last_at FROM ledger_segments "
+    "WHERE wallet_id = {} "
+    "AND last_at >= coalesce(CAST({} AS timestamptz), '-infinity') "
+    "AND first_at < coalesce(CAST({} AS timestamptz), 'infinity') "
+    "GROUP BY path ORDER BY last_at DESC"
+)
+SELECT_SEGMENTS = text(_SELECT_SEGMENTS.format(":wallet_id", ":since", ":before"))
+SELECT_SEGMENTS_ASYNCPG = _SELECT_SEGMENTS.format("$1", "$2", "$3")
+
+
+def default_horizon() -> datetime:
+    return datetime.now(UTC) - timedelta(days=config.archive.horizon_days)
+
+
+def _signed(op_type: str, amount: int) -> int:
+    return -amount if op_type == OperationType.withdraw.name else amount
+
+
+def write_segment(
+    directory: Path, segment_id: UUID, rows: Sequence
+) -> tuple[str, list[dict]]:
+    """Write ``rows`` (oldest first) to a new segment file.
+
+    Returns the path relative to ``directory`` and the index rows. The file
+    is synced to disk before returning: once the batch is deleted from the
+    database it is the only copy.
+    """
+    path = f"{rows[0].created_at:%Y/%m}/{segment_id}.parquet"
+    rows = sorted(rows, key=lambda row: (row.wallet_id, row.created_at))
+
+    table = pa.table(
+        {
+            "id": [row.id.bytes for row in rows],
+            "wallet_id": [row.wallet_id.bytes for row in rows],
+            "op_type": [row.op_type for row in rows],
+            "amount": [row.amount for row in rows],
+            "created_at": [row.created_at for row in rows],
+            "currency": [row.currency for row in rows],
+        },
+        schema=SCHEMA,
+    )
+
+    target = directory / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_suffix(".partial")
+    with open(partial, "wb") as f:
+        pq.write_table(
+            table,
+            f,
+            row_group_size=ROW_GROUP_SIZE,
+            compression=config.archive.compression,
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, target)
+    dir_fd = os.open(target.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+    index = []
+    for (wallet_id, currency), group in itertools.groupby(
+        sorted(rows, key=lambda row: (row.wallet_id, row.currency)),
+        key=lambda row: (row.wallet_id, row.currency),
+    ):
+        group = list(group)
+        index.append(
+            {
+                "wallet_id": wallet_id,
+                "segment_id": segment_id,
+                "currency": currency,
+                "path": path,
+                "first_at": group[0].created_at,
+                "last_at": group[-1].created_at,
+                "operations": len(group),
+                "total": sum(_signed(row.op_type, row.amount) for row in group),
+            }
+        )
+    return path, index
+
+
+def read_segment(
+    path: Path,
+    wallet_id: UUID,
+    since: datetime | None = None,
+    before: datetime | None = None,
+) -> list[OperationRow]:
+    """Operations of ``wallet_id`` in a segment, newest first."""
+    filters = [("wallet_id", "==", wallet_id.bytes)]
+    if since is not None:
+        filters.append(("created_at", ">=", since))
+    if before is not None:
+        filters.append(("created_at", "<", before))
+
+    table = pq.read_table(path, filters=filters)
+    return [
+        OperationRow(
+            UUID(bytes=row["id"]),
+            wallet_id,
+            OperationType[row["op_type"]],
+            row["amount"],
+            row["created_at"],
+            row.get("currency") or DEFAULT_CURRENCY,
+        )
+        for row in reversed(table.to_pylist())
+    ]
+
+
+async def _list_segments(
+    session: AsyncSession | asyncpg.Connection,
+    wallet_id: UUID,
+    since: datetime | None,
+    before: datetime | None,
+) -> list[tuple[str, datetime]]:
+    if isinstance(session, AsyncSession):
+        result = await session.execute(
+            SELECT_SEGMENTS,
+            {"wallet_id": wallet_id, "since": since, "before": before},
+        )
+        return [tuple(row) for row in result]
+    records = await session.fetch(SELECT_SEGMENTS_ASYNCPG, wallet_id, since, before)
+    return [tuple(record) for record in records]
+
+
+async def list_archived_operations(
+    session: AsyncSession | asyncpg.Connection | MemoryStore,
+    wallet_id: UUID,
+    limit: int,
+    before: datetime | None = None,
+    since: datetime | None = None,
+) -> list[OperationRow]:
+    """Newest-first page of the archived operations of a wallet."""
+    # nothing is ever archived out of the in-memory backend
+    if isinstance(session, MemoryStore):
+        return []
+
+    directory = Path(config.archive.directory)
+    rows: list[OperationRow] = []
+    for path, last_at in await _list_segments(session, wallet_id, since, before):
+        # the page is full and the rest of the segments are older
+        if len(rows) >= limit and rows[limit - 1].created_at > last_at:
+            break
+        rows.extend(
+            await asyncio.to_thread(
+                read_segment, directory / path, wallet_id, since, before
+            )
+        )
+        rows.sort(key=lambda row: row.created_at, reverse=True)
+    return rows[:limit]
+
+
+async def archive_operations(
+    engine: AsyncEngine,
+    older_than: datetime,
+    batch_size: int | None = None,
+    directory: Path | None = None,
+) -> int:
+    """Move the operations older than ``older_than`` to segments, batch by
+    batch. Returns the number of operations archived.
+
+    A batch that fails to commit leaves its file behind unindexed, the rows
+    stay in the database and go to a new segment on the next run.
+    """
+    batch_size = batch_size or config.archive.batch_size
+    directory = directory or Path(config.archive.directory)
+
+    archived = 0
+    while True:
+        async with engine.begin() as conn:
+            rows = (
+                await conn.execute(
+                    SELECT_BATCH, {"older_than": older_than, "limit": batch_size}
+                )
+            ).all()
+            if not rows:
+                break
+
+            segment_id = uuid7()
+            path, index = await asyncio.to_thread(
+                write_segment, directory, segment_id, rows
+            )
+            await conn.execute(insert(DBLedgerSegment), index)
+            await conn.execute(
+                DELETE_BATCH,
+                {"older_than": older_than, "ids": [row.id for row in rows]},
+            )
+
+        archived += len(rows)
+        logger.info(
+            f"Archived {len(rows)} operations of {len(index)} wallets to {path}"
+        )
+    return archived
+
+
+async def main(args: argparse.Namespace) -> None:
+    await session_manager.init_db()
+    try:
+        if args.command == "run":
+            older_than = (
+                default_horizon()
+                if args.older_than is None
+                else datetime.combine(args.older_than, time(), UTC)
+            )
+            for shard in session_manager.shard_names:
+                archived = await archive_operations(
+                    session_manager.shard_engine(shard),
+                    older_than=older_than,
+                    batch_size=args.batch_size,
+                )
+                print(f"{shard}: {archived} operations archived")
+        elif args.command == "segments":
+            shard = await shard_router.shard_for(args.wallet_id)
+            async with session_manager.session(backend="orm", shard=shard) as session:
+                result = await session.execute(
+                    text(
+                        "SELECT path, currency, first_at, last_at, operations, "
+                        "total FROM ledger_segments WHERE wallet_id = :wallet_id "
+                        "ORDER BY first_at, currency"
+                    ),
+                    {"wallet_id": args.wallet_id},
+                )
+                for row in result:
+                    print(*row)
+    finally:
+        await shard_router.close()
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old operations")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="archive operations past the horizon")
+    run.add_argument("--older-than", type=date.fromisoformat, default=None)
+    run.add_argument("--batch-size", type=int, default=None)
+
+    segments = commands.add_parser("segments", help="list the segments of a wallet")
+    segments.add_argument("wallet_id", type=UUID)
+
+    asyncio.run(main(parser.parse_args()))
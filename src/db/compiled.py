@@ -0,0 +1,367 @@
+from collections.abc import Sequence
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import (
+    BigInteger,
+    String,
+    and_,
+    bindparam,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.ids import uuid7
+from src.db.models import (
+    DEFAULT_CURRENCY,
+    DBOperation,
+    DBWallet,
+    DBWalletBalance,
+    OperationType,
+)
+from src.db.wrap import tagged, transactional
+from src.exceptions.wallets import InsufficientFundsError, WalletNotFoundError
+from src.models.dto import OperationRow, WalletRow
+
+# Statements are built once at import time against the Core tables, so every
+# call skips statement construction and ORM entity hydration. SQLAlchemy
+# memoizes the cache key of these immutable constructs, which makes the
+# compiled-query cache lookup cheap, and the asyncpg dialect keeps the
+# server-side prepared statement per connection.
+_wallets = DBWallet.__table__
+_operations = DBOperation.__table__
+_balances = DBWalletBalance.__table__
+
+_operation_columns = (
+    _operations.c.id,
+    _operations.c.wallet_id,
+    _operations.c.op_type,
+    _operations.c.amount,
+    _operations.c.created_at,
+    _operations.c.currency,
+)
+
+# closed wallets take no operations: then nothing is inserted
+INSERT_OPERATION = (
+    insert(_operations)
+    .from_select(
+        ["id", "op_type", "amount", "currency", "wallet_id"],
+        select(
+            bindparam("id", type_=_operations.c.id.type),
+            bindparam("op_type", type_=_operations.c.op_type.type),
+            bindparam("amount", type_=_operations.c.amount.type),
+            bindparam("currency", type_=_operations.c.currency.type),
+            _wallets.c.id,
+        ).where(
+            _wallets.c.id == bindparam("wallet_id"), _wallets.c.closed_at.is_(None)
+        ),
+    )
+    .returning(*_operation_columns)
+)
+
+INSERT_OPERATIONS = insert(_operations).returning(
+    *_operation_columns, sort_by_parameter_order=True
+)
+
+SELECT_OPERATION = select(*_operation_columns).where(
+    _operations.c.id == bindparam("op_id")
+)
+
+# open bounds fall back to +-infinity: only the set bounds prune partitions, a
+# read with neither scans every partition
+LIST_OPERATIONS = (
+    select(*_operation_columns)
+    .where(
+        _operations.c.wallet_id == bindparam("wallet_id"),
+        _operations.c.created_at
+        >= func.coalesce(
+            bindparam("since", type_=_operations.c.created_at.type),
+            literal_column("'-infinity'::timestamptz"),
+        ),
+        _operations.c.created_at
+        < func.coalesce(
+            bindparam("before", type_=_operations.c.created_at.type),
+            literal_column("'infinity'::timestamptz"),
+        ),
+    )
+    .order_by(_operations.c.created_at.desc())
+    .limit(bindparam("limit"))
+)
+
+INSERT_WALLET = insert(_wallets).returning(
+    _wallets.c.id, _wallets.c.balance, _wallets.c.version
+)
+
+# closed wallets are left to the purge, and look missing meanwhile
+_open_wallet = and_(
+    _wallets.c.id == bindparam("wallet_id"), _wallets.c.closed_at.is_(None)
+)
+
+SELECT_WALLET = select(_wallets.c.id, _wallets.c.balance, _wallets.c.version).where(
+    _open_wallet
+)
+
+ADD_TO_BALANCE = (
+    update(_wallets)
+    .where(_open_wallet)
+    .values(
+        balance=_wallets.c.balance + bindparam("amount"),
+        version=_wallets.c.version + 1,
+    )
+    .returning(_wallets.c.id, _wallets.c.balance, _wallets.c.version)
+)
+
+# the currency row of an existing wallet, created on first use
+_upsert_balance = pg_insert(_balances).from_select(
+    ["wallet_id", "currency", "balance"],
+    select(
+        _wallets.c.id,
+        bindparam("currency", type_=String),
+        bindparam("amount", type_=BigInteger),
+    ).where(_open_wallet),
+)
+ADD_TO_CURRENCY_BALANCE = _upsert_balance.on_conflict_do_update(
+    index_elements=[_balances.c.wallet_id, _balances.c.currency],
+    set_={
+        "balance": _balances.c.balance + _upsert_balance.excluded.balance,
+        "version": _balances.c.version + 1,
+    },
+).returning(_balances.c.wallet_id, _balances.c.balance, _balances.c.version)
+
+SELECT_BALANCES = union_all(
+    select(literal(DEFAULT_CURRENCY), _wallets.c.balance).where(_open_wallet),
+    select(_balances.c.currency, _balances.c.balance).where(
+        _balances.c.wallet_id == bindparam("wallet_id")
+    ),
+)
+
+CLOSE_WALLET = (
+    update(_wallets)
+    .where(_open_wallet)
+    .values(closed_at=func.now())
+    .returning(_wallets.c.id)
+)
+
+# never takes the balance below zero
+DEBIT_BALANCE = ADD_TO_BALANCE.where(_wallets.c.balance + bindparam("amount") >= 0)
+
+LOCK_WALLETS = (
+    select(_wallets.c.id)
+    .where(
+        _wallets.c.id.in_(bindparam("ids", expanding=True)),
+        _wallets.c.closed_at.is_(None),
+    )
+    .order_by(_wallets.c.id)
+    .with_for_update()
+)
+
+
+class CompiledDaoOperation:
+    @classmethod
+    @tagged
+    @transactional
+    async def add_operation(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> OperationRow:
+        return await cls._insert_operation(
+            session, wallet_id, op_type, amount, currency
+        )
+
+    @classmethod
+    async def _insert_operation(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str,
+    ) -> OperationRow:
+        result = await session.execute(
+            INSERT_OPERATION,
+            {
+                "id": uuid7(),
+                "wallet_id": wallet_id,
+                "op_type": op_type,
+                "amount": amount,
+                "currency": currency,
+            },
+        )
+        row = result.first()
+
+        if row is None:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+        return OperationRow._make(row)
+
+    @classmethod
+    @tagged
+    @transactional
+    async def get_operation(
+        cls,
+        session: AsyncSession,
+        op_id: UUID,
+    ) -> OperationRow | None:
+        result = await session.execute(SELECT_OPERATION, {"op_id": op_id})
+        row = result.first()
+
+        return None if row is None else OperationRow._make(row)
+
+    @classmethod
+    @tagged
+    @transactional
+    async def list_operations(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        limit: int,
+        before: datetime | None = None,
+        since: datetime | None = None,
+    ) -> list[OperationRow]:
+        result = await session.execute(
+            LIST_OPERATIONS,
+            {"wallet_id": wallet_id, "limit": limit, "since": since, "before": before},
+        )
+
+        return [OperationRow._make(row) for row in result]
+
+
+class CompiledDaoWallet:
+    @classmethod
+    @tagged
+    @transactional
+    async def create_wallet(
+        cls, session: AsyncSession, balance: int = 0, wallet_id: UUID | None = None
+    ) -> WalletRow:
+        result = await session.execute(
+            INSERT_WALLET, {"id": wallet_id or uuid7(), "balance": balance}
+        )
+
+        return WalletRow._make(result.one())
+
+    @classmethod
+    @tagged
+    @transactional
+    async def get_wallet(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+    ) -> WalletRow | None:
+        result = await session.execute(SELECT_WALLET, {"wallet_id": wallet_id})
+        row = result.first()
+
+        return None if row is None else WalletRow._make(row)
+
+    @classmethod
+    @tagged
+    @transactional
+    async def add_to_balance(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> WalletRow | None:
+        return await cls._add_to_balance(session, wallet_id, amount, currency)
+
+    @classmethod
+    @tagged
+    @transactional
+    async def apply_operation(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> tuple[WalletRow, OperationRow]:
+        delta = -amount if op_type == OperationType.withdraw else amount
+        wallet = await cls._add_to_balance(session, wallet_id, delta, currency)
+        if wallet is None:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+        operation = await CompiledDaoOperation._insert_operation(
+            session, wallet_id, op_type, amount, currency
+        )
+
+        return wallet, operation
+
+    @classmethod
+    async def _add_to_balance(
+        cls, session: AsyncSession, wallet_id: UUID, amount: int, currency: str
+    ) -> WalletRow | None:
+        if currency == DEFAULT_CURRENCY:
+            result = await session.execute(
+                ADD_TO_BALANCE, {"wallet_id": wallet_id, "amount": amount}
+            )
+        else:
+            result = await session.execute(
+                ADD_TO_CURRENCY_BALANCE,
+                {"wallet_id": wallet_id, "amount": amount, "currency": currency},
+            )
+        row = result.first()
+
+        return None if row is None else WalletRow._make(row)
+
+    @classmethod
+    @tagged
+    @transactional
+    async def get_balances(
+        cls, session: AsyncSession, wallet_id: UUID
+    ) -> list[tuple[str, int]]:
+        result = await session.execute(SELECT_BALANCES, {"wallet_id": wallet_id})
+
+        return [tuple(row) for row in result]
+
+    @classmethod
+    @tagged
+    @transactional
+    async def close_wallet(cls, session: AsyncSession, wallet_id: UUID) -> UUID | None:
+        return await session.scalar(CLOSE_WALLET, {"wallet_id": wallet_id})
+
+    @classmethod
+    @tagged
+    @transactional
+    async def transfer(
+        cls,
+        session: AsyncSession,
+        deltas: Sequence[tuple[UUID, int]],
+        legs: Sequence[tuple[UUID, OperationType, int]],
+    ) -> tuple[list[WalletRow], list[OperationRow]]:
+        ids = [wallet_id for wallet_id, _ in deltas]
+        locked = await session.scalars(LOCK_WALLETS, {"ids": ids})
+        missing = set(ids).difference(locked)
+        if missing:
+            raise WalletNotFoundError(wallet_id=min(missing))
+
+        wallets = []
+        for wallet_id, delta in deltas:
+            if delta == 0:
+                continue
+            result = await session.execute(
+                DEBIT_BALANCE if delta < 0 else ADD_TO_BALANCE,
+                {"wallet_id": wallet_id, "amount": delta},
+            )
+            row = result.first()
+            if row is None:
+                raise InsufficientFundsError(wallet_id=wallet_id)
+            wallets.append(WalletRow._make(row))
+
+        result = await session.execute(
+            INSERT_OPERATIONS,
+            [
+                {"wallet_id": wallet_id, "op_type": op_type, "amount": amount}
+                for wallet_id, op_type, amount in legs
+            ],
+        )
+
+        return wallets, [OperationRow._make(row) for row in result]
@@ -1,30 +1,73 @@
+from collections.abc import Sequence
+from datetime import datetime
 from uuid import UUID
 
-from sqlalchemy import update
+from sqlalchemy import Row, func, insert, literal, union_all, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
-from src.db.models import DBOperation, DBWallet, OperationType
-from src.db.wrap import transactional
+from src.db.ids import uuid7
+from src.db.models import (
+    DEFAULT_CURRENCY,
+    DBOperation,
+    DBWallet,
+    DBWalletBalance,
+    OperationType,
+)
+from src.db.wrap import tagged, transactional
+from src.exceptions.wallets import InsufficientFundsError, WalletNotFoundError
 
 
 class DaoOperation:
     @classmethod
+    @tagged
     @transactional
     async def add_operation(
-        cls, session: AsyncSession, wallet_id: UUID, op_type: OperationType, amount: int
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
     ) -> DBOperation:
-        db_op = DBOperation(
-            op_type=op_type,
-            amount=amount,
-            wallet_id=wallet_id,
+        return await cls._insert_operation(
+            session, wallet_id, op_type, amount, currency
         )
-        session.add(db_op)
 
+    @classmethod
+    async def _insert_operation(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str,
+    ) -> DBOperation:
+        # closed wallets take no operations: then nothing is inserted
+        stmt = (
+            insert(DBOperation)
+            .from_select(
+                ["id", "op_type", "amount", "currency", "wallet_id"],
+                select(
+                    literal(uuid7(), DBOperation.id.type),
+                    literal(op_type, DBOperation.op_type.type),
+                    literal(amount, DBOperation.amount.type),
+                    literal(currency, DBOperation.currency.type),
+                    DBWallet.id,
+                ).where(DBWallet.id == wallet_id, DBWallet.closed_at.is_(None)),
+            )
+            .returning(DBOperation)
+        )
+        db_op = await session.scalar(stmt)
+
+        if db_op is None:
+            raise WalletNotFoundError(wallet_id=wallet_id)
         return db_op
 
     @classmethod
+    @tagged
     @transactional
     async def get_operation(
         cls,
@@ -37,19 +80,43 @@ class DaoOperation:
 
         return result.scalars().first()
 
+    @classmethod
+    @tagged
+    @transactional
+    async def list_operations(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        limit: int,
+        before: datetime | None = None,
+        since: datetime | None = None,
+    ) -> list[DBOperation]:
+        stmt = select(DBOperation).filter(DBOperation.wallet_id == wallet_id)
+        if since is not None:
+            stmt = stmt.filter(DBOperation.created_at >= since)
+        if before is not None:
+            stmt = stmt.filter(DBOperation.created_at < before)
+        stmt = stmt.order_by(DBOperation.created_at.desc()).limit(limit)
+
+        result = await session.execute(stmt)
+
+        return list(result.scalars().all())
+
 
 class DaoWallet:
     @classmethod
+    @tagged
     @transactional
     async def create_wallet(
-        cls, session: AsyncSession, balance: int = 0
+        cls, session: AsyncSession, balance: int = 0, wallet_id: UUID | None = None
     ) -> DBWallet | None:
-        db_wallet = DBWallet(balance=balance)
+        db_wallet = DBWallet(id=wallet_id or uuid7(), balance=balance)
         session.add(db_wallet)
 
         return db_wallet
 
     @classmethod
+    @tagged
     @transactional
     async def get_wallet(
         cls,
@@ -58,7 +125,7 @@ class DaoWallet:
     ) -> DBWallet | None:
         stmt = (
             select(DBWallet)
-            .filter(DBWallet.id == wallet_id)
+            .filter(DBWallet.id == wallet_id, DBWallet.closed_at.is_(None))
             .options(
                 selectinload(DBWallet.operations),
             )
@@ -69,16 +136,168 @@ class DaoWallet:
         return result.scalars().first()
 
     @classmethod
+    @tagged
     @transactional
     async def add_to_balance(
-        cls, session: AsyncSession, wallet_id: UUID, amount: int
-    ) -> DBWallet | None:
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> DBWallet | Row | None:
+        return await cls._add_to_balance(session, wallet_id, amount, currency)
+
+    @classmethod
+    @tagged
+    @transactional
+    async def apply_operation(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> tuple[DBWallet | Row, DBOperation]:
+        """Apply the operation to the balance and record it, in one
+        transaction."""
+        delta = -amount if op_type == OperationType.withdraw else amount
+        wallet = await cls._add_to_balance(session, wallet_id, delta, currency)
+        if wallet is None:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+        db_op = await DaoOperation._insert_operation(
+            session, wallet_id, op_type, amount, currency
+        )
+
+        return wallet, db_op
+
+    @classmethod
+    async def _add_to_balance(
+        cls, session: AsyncSession, wallet_id: UUID, amount: int, currency: str
+    ) -> DBWallet | Row | None:
+        if currency != DEFAULT_CURRENCY:
+            return await cls._add_to_currency_balance(
+                session, wallet_id, amount, currency
+            )
+
         stmt = (
             update(DBWallet)
-            .where(DBWallet.id == wallet_id)
-            .values(balance=DBWallet.balance + amount)
+            .where(DBWallet.id == wallet_id, DBWallet.closed_at.is_(None))
+            .values(balance=DBWallet.balance + amount, version=DBWallet.version + 1)
             .returning(DBWallet)
         )
         result = await session.execute(stmt)
 
         return result.scalars().first()
+
+    @classmethod
+    async def _add_to_currency_balance(
+        cls, session: AsyncSession, wallet_id: UUID, amount: int, currency: str
+    ) -> Row | None:
+        # creates the currency row of an existing wallet on first use, and
+        # locks only that row: the wallet row is left alone
+        stmt = pg_insert(DBWalletBalance).from_select(
+            ["wallet_id", "currency", "balance"],
+            select(DBWallet.id, literal(currency), literal(amount)).where(
+                DBWallet.id == wallet_id, DBWallet.closed_at.is_(None)
+            ),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DBWalletBalance.wallet_id, DBWalletBalance.currency],
+            set_={
+                "balance": DBWalletBalance.balance + stmt.excluded.balance,
+                "version": DBWalletBalance.version + 1,
+            },
+        ).returning(
+            DBWalletBalance.wallet_id, DBWalletBalance.balance, DBWalletBalance.version
+        )
+        result = await session.execute(stmt)
+
+        return result.first()
+
+    @classmethod
+    @tagged
+    @transactional
+    async def get_balances(
+        cls, session: AsyncSession, wallet_id: UUID
+    ) -> list[tuple[str, int]]:
+        """Balance per currency, no default currency one for a missing or
+        closed wallet."""
+        stmt = union_all(
+            select(literal(DEFAULT_CURRENCY), DBWallet.balance).where(
+                DBWallet.id == wallet_id, DBWallet.closed_at.is_(None)
+            ),
+            select(DBWalletBalance.currency, DBWalletBalance.balance).where(
+                DBWalletBalance.wallet_id == wallet_id
+            ),
+        )
+        result = await session.execute(stmt)
+
+        return [tuple(row) for row in result]
+
+    @classmethod
+    @tagged
+    @transactional
+    async def close_wallet(cls, session: AsyncSession, wallet_id: UUID) -> UUID | None:
+        """Mark an open wallet closed, which hides it from every other
+        method. Its rows are deleted later, by src.db.purge."""
+        stmt = (
+            update(DBWallet)
+            .where(DBWallet.id == wallet_id, DBWallet.closed_at.is_(None))
+            .values(closed_at=func.now())
+            .returning(DBWallet.id)
+        )
+
+        return await session.scalar(stmt)
+
+    @classmethod
+    @tagged
+    @transactional
+    async def transfer(
+        cls,
+        session: AsyncSession,
+        deltas: Sequence[tuple[UUID, int]],
+        legs: Sequence[tuple[UUID, OperationType, int]],
+    ) -> tuple[list, list[DBOperation]]:
+        """Apply the netted balance changes of a batch of transfers and
+        record their legs, in one transaction.
+
+        The wallet rows are locked in id order first, so transfers running
+        the other way round queue up instead of deadlocking. Debits are
+        conditional and never take a balance below zero.
+        """
+        ids = [wallet_id for wallet_id, _ in deltas]
+        locked = await session.scalars(
+            select(DBWallet.id)
+            .where(DBWallet.id.in_(ids), DBWallet.closed_at.is_(None))
+            .order_by(DBWallet.id)
+            .with_for_update()
+        )
+        missing = set(ids).difference(locked)
+        if missing:
+            raise WalletNotFoundError(wallet_id=min(missing))
+
+        wallets = []
+        for wallet_id, delta in deltas:
+            if delta == 0:
+                continue
+            stmt = (
+                update(DBWallet)
+                .where(DBWallet.id == wallet_id)
+                .values(balance=DBWallet.balance + delta, version=DBWallet.version + 1)
+                .returning(DBWallet.id, DBWallet.balance, DBWallet.version)
+            )
+            if delta < 0:
+                stmt = stmt.where(DBWallet.balance >= -delta)
+            wallet = (await session.execute(stmt)).first()
+            if wallet is None:
+                raise InsufficientFundsError(wallet_id=wallet_id)
+            wallets.append(wallet)
+
+        operations = [
+            DBOperation(wallet_id=wallet_id, op_type=op_type, amount=amount)
+            for wallet_id, op_type, amount in legs
+        ]
+        session.add_all(operations)
+        await session.flush()
+
+        return wallets, operations
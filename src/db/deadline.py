@@ -0,0 +1,69 @@
+"""Request deadlines, passed on to Postgres.
+
+The deadline of the request running in the current task is a monotonic
+time in a context variable, set by ``src.api.deadline.DeadlineMiddleware``.
+Every transaction begun under a deadline gets the remaining time as its
+``statement_timeout`` and ``lock_timeout``, so Postgres gives up on the work
+of a request nobody waits for any more. Without a deadline (jobs, CLIs)
+the server settings apply.
+"""
+
+import contextlib
+import time
+from collections.abc import Iterator
+from contextvars import ContextVar
+
+from sqlalchemy import text
+
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+# for the transaction only
+SET_LOCAL_TIMEOUTS = text(
+    "SELECT set_config('statement_timeout', :timeout, true), "
+    "set_config('lock_timeout', :timeout, true)"
+)
+# for the session of a pooled asyncpg connection, reset on release
+SET_TIMEOUTS = (
+    "SELECT set_config('statement_timeout', $1, false), "
+    "set_config('lock_timeout', $1, false)"
+)
+
+
+def remaining() -> float | None:
+    """Seconds left until the deadline of the current request, or None."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    """Run the block under a deadline ``seconds`` from now, or the one of
+    the enclosing scope when that is sooner."""
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def timeout_setting() -> str | None:
+    """Remaining time as a Postgres timeout setting, e.g. ``"250ms"``."""
+    seconds = remaining()
+    if seconds is None:
+        return None
+    # 0 would disable the timeout
+    return f"{max(int(seconds * 1000), 1)}ms"
+
+
+def apply_deadline(session, transaction, connection) -> None:
+    """``after_begin`` listener: the remaining time of the request bounds
+    the statements and lock waits of the transaction."""
+    setting = timeout_setting()
+    if setting is not None:
+        connection.execute(SET_LOCAL_TIMEOUTS, {"timeout": setting})
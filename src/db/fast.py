@@ -0,0 +1,306 @@
+import contextlib
+from collections.abc import Sequence
+from datetime import datetime
+from uuid import UUID
+
+from asyncpg import Connection, Record
+
+from src.db.ids import uuid7
+from src.db.models import DEFAULT_CURRENCY, OperationType
+from src.db.wrap import tag_sql, tagged
+from src.exceptions.wallets import InsufficientFundsError, WalletNotFoundError
+from src.models.dto import OperationRow, WalletRow
+
+# Fast path for the hot endpoints: plain SQL on an asyncpg connection, with no
+# AsyncSession, greenlet bridge, identity map or unit of work in between.
+# asyncpg prepares each query once per connection and reuses it afterwards.
+# closed wallets take no operations: then nothing is inserted
+INSERT_OPERATION = """
+INSERT INTO operations (id, op_type, amount, wallet_id, currency)
+SELECT $1::uuid, $2::varchar, $3::int, id, $5::varchar FROM wallets
+WHERE id = $4 AND closed_at IS NULL
+RETURNING id, wallet_id, op_type, amount, created_at, currency
+"""
+
+SELECT_OPERATION = """
+SELECT id, wallet_id, op_type, amount, created_at, currency FROM operations
+WHERE id = $1
+"""
+
+# open bounds fall back to +-infinity: only the set bounds prune partitions, a
+# read with neither scans every partition
+LIST_OPERATIONS = """
+SELECT id, wallet_id, op_type, amount, created_at, currency FROM operations
+WHERE wallet_id = $1
+  AND created_at >= coalesce($3::timestamptz, '-infinity')
+  AND created_at < coalesce($4::timestamptz, 'infinity')
+ORDER BY created_at DESC
+LIMIT $2
+"""
+
+INSERT_WALLET = """
+INSERT INTO wallets (id, balance) VALUES ($1, $2) RETURNING id, balance, version
+"""
+
+SELECT_WALLET = """
+SELECT id, balance, version FROM wallets WHERE id = $1 AND closed_at IS NULL
+"""
+
+ADD_TO_BALANCE = """
+UPDATE wallets SET balance = balance + $2, version = version + 1
+WHERE id = $1 AND closed_at IS NULL
+RETURNING id, balance, version
+"""
+
+# the currency row of an existing wallet, created on first use
+ADD_TO_CURRENCY_BALANCE = """
+INSERT INTO wallet_balances (wallet_id, currency, balance)
+SELECT id, $3::varchar, $2::bigint FROM wallets WHERE id = $1 AND closed_at IS NULL
+ON CONFLICT (wallet_id, currency) DO UPDATE
+SET balance = wallet_balances.balance + excluded.balance,
+    version = wallet_balances.version + 1
+RETURNING wallet_id, balance, version
+"""
+
+SELECT_BALANCES = f"""
+SELECT '{DEFAULT_CURRENCY}', balance FROM wallets WHERE id = $1 AND closed_at IS NULL
+UNION ALL
+SELECT currency, balance FROM wallet_balances WHERE wallet_id = $1
+"""
+
+LOCK_WALLETS = """
+SELECT id FROM wallets WHERE id = ANY($1::uuid[]) AND closed_at IS NULL
+ORDER BY id FOR UPDATE
+"""
+
+CLOSE_WALLET = """
+UPDATE wallets SET closed_at = now() WHERE id = $1 AND closed_at IS NULL
+RETURNING id
+"""
+
+# debits never take a balance below zero
+APPLY_DELTAS = """
+UPDATE wallets SET balance = wallets.balance + d.delta, version = wallets.version + 1
+FROM unnest($1::uuid[], $2::bigint[]) AS d(id, delta)
+WHERE wallets.id = d.id AND (d.delta >= 0 OR wallets.balance + d.delta >= 0)
+RETURNING wallets.id, wallets.balance, wallets.version
+"""
+
+INSERT_OPERATIONS = """
+INSERT INTO operations (id, op_type, amount, wallet_id)
+SELECT * FROM unnest($1::uuid[], $2::varchar[], $3::int[], $4::uuid[])
+RETURNING id, wallet_id, op_type, amount, created_at, currency
+"""
+
+
+def _atomic(conn: Connection):
+    """Run a statement in a savepoint when the caller already opened a
+    transaction, so a failure does not abort it. Otherwise the statement
+    autocommits on its own, as the ORM DAOs commit after every call."""
+    if conn.is_in_transaction():
+        return conn.transaction()
+    return contextlib.nullcontext()
+
+
+def _operation_row(record: Record) -> OperationRow:
+    # op_type is stored as the enum name by the non-native SQLAlchemy Enum
+    return OperationRow(
+        record[0], record[1], OperationType[record[2]], record[3], record[4], record[5]
+    )
+
+
+class FastDaoOperation:
+    @classmethod
+    @tagged
+    async def add_operation(
+        cls,
+        session: Connection,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> OperationRow:
+        async with _atomic(session):
+            return await cls._insert_operation(
+                session, wallet_id, op_type, amount, currency
+            )
+
+    @classmethod
+    async def _insert_operation(
+        cls,
+        session: Connection,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str,
+    ) -> OperationRow:
+        record = await session.fetchrow(
+            tag_sql(INSERT_OPERATION),
+            uuid7(),
+            op_type.name,
+            amount,
+            wallet_id,
+            currency,
+        )
+
+        if record is None:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+        return _operation_row(record)
+
+    @classmethod
+    @tagged
+    async def get_operation(
+        cls,
+        session: Connection,
+        op_id: UUID,
+    ) -> OperationRow | None:
+        record = await session.fetchrow(tag_sql(SELECT_OPERATION), op_id)
+
+        return None if record is None else _operation_row(record)
+
+    @classmethod
+    @tagged
+    async def list_operations(
+        cls,
+        session: Connection,
+        wallet_id: UUID,
+        limit: int,
+        before: datetime | None = None,
+        since: datetime | None = None,
+    ) -> list[OperationRow]:
+        records = await session.fetch(
+            tag_sql(LIST_OPERATIONS), wallet_id, limit, since, before
+        )
+
+        return [_operation_row(record) for record in records]
+
+
+class FastDaoWallet:
+    @classmethod
+    @tagged
+    async def create_wallet(
+        cls, session: Connection, balance: int = 0, wallet_id: UUID | None = None
+    ) -> WalletRow:
+        async with _atomic(session):
+            record = await session.fetchrow(
+                tag_sql(INSERT_WALLET), wallet_id or uuid7(), balance
+            )
+
+        return WalletRow(record[0], record[1], record[2])
+
+    @classmethod
+    @tagged
+    async def get_wallet(
+        cls,
+        session: Connection,
+        wallet_id: UUID,
+    ) -> WalletRow | None:
+        record = await session.fetchrow(tag_sql(SELECT_WALLET), wallet_id)
+
+        return None if record is None else WalletRow(record[0], record[1], record[2])
+
+    @classmethod
+    @tagged
+    async def add_to_balance(
+        cls,
+        session: Connection,
+        wallet_id: UUID,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> WalletRow | None:
+        async with _atomic(session):
+            return await cls._add_to_balance(session, wallet_id, amount, currency)
+
+    @classmethod
+    @tagged
+    async def apply_operation(
+        cls,
+        session: Connection,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> tuple[WalletRow, OperationRow]:
+        delta = -amount if op_type == OperationType.withdraw else amount
+        # a savepoint inside a caller's transaction, otherwise a transaction
+        async with session.transaction():
+            wallet = await cls._add_to_balance(session, wallet_id, delta, currency)
+            if wallet is None:
+                raise WalletNotFoundError(wallet_id=wallet_id)
+            operation = await FastDaoOperation._insert_operation(
+                session, wallet_id, op_type, amount, currency
+            )
+
+        return wallet, operation
+
+    @classmethod
+    async def _add_to_balance(
+        cls, session: Connection, wallet_id: UUID, amount: int, currency: str
+    ) -> WalletRow | None:
+        if currency == DEFAULT_CURRENCY:
+            record = await session.fetchrow(tag_sql(ADD_TO_BALANCE), wallet_id, amount)
+        else:
+            record = await session.fetchrow(
+                tag_sql(ADD_TO_CURRENCY_BALANCE), wallet_id, amount, currency
+            )
+
+        return None if record is None else WalletRow(record[0], record[1], record[2])
+
+    @classmethod
+    @tagged
+    async def get_balances(
+        cls, session: Connection, wallet_id: UUID
+    ) -> list[tuple[str, int]]:
+        records = await session.fetch(tag_sql(SELECT_BALANCES), wallet_id)
+
+        return [(record[0], record[1]) for record in records]
+
+    @classmethod
+    @tagged
+    async def close_wallet(cls, session: Connection, wallet_id: UUID) -> UUID | None:
+        async with _atomic(session):
+            return await session.fetchval(tag_sql(CLOSE_WALLET), wallet_id)
+
+    @classmethod
+    @tagged
+    async def transfer(
+        cls,
+        session: Connection,
+        deltas: Sequence[tuple[UUID, int]],
+        legs: Sequence[tuple[UUID, OperationType, int]],
+    ) -> tuple[list[WalletRow], list[OperationRow]]:
+        ids = [wallet_id for wallet_id, delta in deltas if delta != 0]
+        # a savepoint inside a caller's transaction, otherwise a transaction
+        async with session.transaction():
+            locked = await session.fetch(
+                tag_sql(LOCK_WALLETS), [wallet_id for wallet_id, _ in deltas]
+            )
+            missing = {wallet_id for wallet_id, _ in deltas}.difference(
+                record[0] for record in locked
+            )
+            if missing:
+                raise WalletNotFoundError(wallet_id=min(missing))
+
+            records = await session.fetch(
+                tag_sql(APPLY_DELTAS),
+                ids,
+                [delta for _, delta in deltas if delta != 0],
+            )
+            if len(records) < len(ids):
+                debited = {record[0] for record in records}
+                raise InsufficientFundsError(
+                    wallet_id=min(set(ids).difference(debited))
+                )
+
+            op_ids = [uuid7() for _ in legs]
+            inserted = await session.fetch(
+                tag_sql(INSERT_OPERATIONS),
+                op_ids,
+                [op_type.name for _, op_type, _ in legs],
+                [amount for _, _, amount in legs],
+                [wallet_id for wallet_id, _, _ in legs],
+            )
+
+        wallets = [WalletRow(record[0], record[1], record[2]) for record in records]
+        operations = {record[0]: _operation_row(record) for record in inserted}
+        return wallets, [operations[op_id] for op_id in op_ids]
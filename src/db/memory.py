@@ -0,0 +1,283 @@
+"""In-process DAO backend, for tests and benchmarks that need no database.
+
+``MemoryStore`` stands in for the session: it holds the tables the other
+backends keep in Postgres, and nothing outlives the process. The semantics
+are those of the SQL backends: versions count updates, closed wallets look
+missing, also to operations, and transfers apply all their deltas or none.
+
+Each method yields to the event loop once, where the SQL backends wait on a
+round trip, then reads and writes the store without awaiting: concurrent
+tasks interleave between calls, never inside one, which makes every call
+atomic as a statement or a transaction is.
+"""
+
+import asyncio
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Sequence
+from datetime import UTC, date, datetime, timedelta
+from operator import attrgetter
+from uuid import UUID
+
+from src.config import timezone
+from src.db.ids import uuid7
+from src.db.models import DEFAULT_CURRENCY, OperationType, TotalsPeriod
+from src.db.wrap import tagged
+from src.exceptions.wallets import InsufficientFundsError, WalletNotFoundError
+from src.models.dto import OperationRow, WalletRow
+
+_created_at = attrgetter("created_at")
+
+
+class MemoryIntegrityError(Exception):
+    """Constraint violation of the in-memory backend, like IntegrityError."""
+
+
+class MemoryStore:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop everything, like a fresh database."""
+        self.wallets: dict[UUID, WalletRow] = {}
+        self.closed_at: dict[UUID, datetime] = {}
+        # balances in other currencies than DEFAULT_CURRENCY
+        self.balances: dict[tuple[UUID, str], WalletRow] = {}
+        self.operations: dict[UUID, OperationRow] = {}
+        # operations of each wallet, oldest first
+        self.ledgers: defaultdict[UUID, list[OperationRow]] = defaultdict(list)
+        self._last_at = datetime.min.replace(tzinfo=UTC)
+
+    def now(self) -> datetime:
+        # strictly increasing, so ledgers stay sorted and pages never tie
+        self._last_at = max(
+            datetime.now(UTC), self._last_at + timedelta(microseconds=1)
+        )
+        return self._last_at
+
+    def open_wallet(self, wallet_id: UUID) -> WalletRow | None:
+        if wallet_id in self.closed_at:
+            return None
+        return self.wallets.get(wallet_id)
+
+    def insert_operation(
+        self, wallet_id: UUID, op_type: OperationType, amount: int, currency: str
+    ) -> OperationRow:
+        if self.open_wallet(wallet_id) is None:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+        row = OperationRow(uuid7(), wallet_id, op_type, amount, self.now(), currency)
+        self.operations[row.id] = row
+        self.ledgers[wallet_id].append(row)
+        return row
+
+    def add_to_balance(
+        self, wallet_id: UUID, amount: int, currency: str
+    ) -> WalletRow | None:
+        wallet = self.open_wallet(wallet_id)
+        if wallet is None:
+            return None
+        if currency == DEFAULT_CURRENCY:
+            row = self.wallets[wallet_id] = WalletRow(
+                wallet_id, wallet.balance + amount, wallet.version + 1
+            )
+            return row
+
+        current = self.balances.get((wallet_id, currency))
+        if current is None:
+            row = WalletRow(wallet_id, amount, 0)
+        else:
+            row = WalletRow(wallet_id, current.balance + amount, current.version + 1)
+        self.balances[wallet_id, currency] = row
+        return row
+
+    def totals(
+        self,
+        wallet_id: UUID,
+        period: TotalsPeriod,
+        since: date | None = None,
+        until: date | None = None,
+    ) -> list[tuple[date, str, int, int, int, int]]:
+        """Rows of ``src.db.rollups.list_totals``, from the ledger."""
+        sums: defaultdict[tuple[date, str], list[int]] = defaultdict(
+            lambda: [0, 0, 0, 0]
+        )
+        for row in self.ledgers.get(wallet_id, ()):
+            day = row.created_at.astimezone(timezone).date()
+            start = day if period == TotalsPeriod.day else day.replace(day=1)
+            if (since is not None and start < since) or (
+                until is not None and start >= until
+            ):
+                continue
+            column = 0 if row.op_type == OperationType.deposit else 1
+            values = sums[start, row.currency]
+            values[column] += row.amount
+            values[column + 2] += 1
+        return [(*key, *sums[key]) for key in sorted(sums)]
+
+
+# the store of session_manager.session() for the "memory" backend
+memory_store = MemoryStore()
+
+
+class MemoryDaoOperation:
+    @classmethod
+    @tagged
+    async def add_operation(
+        cls,
+        session: MemoryStore,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> OperationRow:
+        await asyncio.sleep(0)
+        return session.insert_operation(wallet_id, op_type, amount, currency)
+
+    @classmethod
+    @tagged
+    async def get_operation(
+        cls,
+        session: MemoryStore,
+        op_id: UUID,
+    ) -> OperationRow | None:
+        await asyncio.sleep(0)
+        return session.operations.get(op_id)
+
+    @classmethod
+    @tagged
+    async def list_operations(
+        cls,
+        session: MemoryStore,
+        wallet_id: UUID,
+        limit: int,
+        before: datetime | None = None,
+        since: datetime | None = None,
+    ) -> list[OperationRow]:
+        await asyncio.sleep(0)
+        ledger = session.ledgers.get(wallet_id, [])
+        low = 0 if since is None else bisect_left(ledger, since, key=_created_at)
+        high = (
+            len(ledger)
+            if before is None
+            else bisect_left(ledger, before, key=_created_at)
+        )
+        return ledger[max(low, high - limit) : high][::-1]
+
+
+class MemoryDaoWallet:
+    @classmethod
+    @tagged
+    async def create_wallet(
+        cls, session: MemoryStore, balance: int = 0, wallet_id: UUID | None = None
+    ) -> WalletRow:
+        await asyncio.sleep(0)
+        wallet_id = wallet_id or uuid7()
+        if wallet_id in session.wallets:
+            raise MemoryIntegrityError(f"Wallet {wallet_id} already exists")
+        row = session.wallets[wallet_id] = WalletRow(wallet_id, balance, 0)
+        return row
+
+    @classmethod
+    @tagged
+    async def get_wallet(
+        cls,
+        session: MemoryStore,
+        wallet_id: UUID,
+    ) -> WalletRow | None:
+        await asyncio.sleep(0)
+        return session.open_wallet(wallet_id)
+
+    @classmethod
+    @tagged
+    async def add_to_balance(
+        cls,
+        session: MemoryStore,
+        wallet_id: UUID,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> WalletRow | None:
+        await asyncio.sleep(0)
+        return session.add_to_balance(wallet_id, amount, currency)
+
+    @classmethod
+    @tagged
+    async def apply_operation(
+        cls,
+        session: MemoryStore,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
+    ) -> tuple[WalletRow, OperationRow]:
+        await asyncio.sleep(0)
+        delta = -amount if op_type == OperationType.withdraw else amount
+        wallet = session.add_to_balance(wallet_id, delta, currency)
+        if wallet is None:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+        return wallet, session.insert_operation(wallet_id, op_type, amount, currency)
+
+    @classmethod
+    @tagged
+    async def get_balances(
+        cls, session: MemoryStore, wallet_id: UUID
+    ) -> list[tuple[str, int]]:
+        await asyncio.sleep(0)
+        balances = [
+            (currency, row.balance)
+            for (owner, currency), row in session.balances.items()
+            if owner == wallet_id
+        ]
+        wallet = session.open_wallet(wallet_id)
+        if wallet is not None:
+            balances.insert(0, (DEFAULT_CURRENCY, wallet.balance))
+        return balances
+
+    @classmethod
+    @tagged
+    async def close_wallet(cls, session: MemoryStore, wallet_id: UUID) -> UUID | None:
+        await asyncio.sleep(0)
+        if session.open_wallet(wallet_id) is None:
+            return None
+        session.closed_at[wallet_id] = session.now()
+        return wallet_id
+
+    @classmethod
+    @tagged
+    async def transfer(
+        cls,
+        session: MemoryStore,
+        deltas: Sequence[tuple[UUID, int]],
+        legs: Sequence[tuple[UUID, OperationType, int]],
+    ) -> tuple[list[WalletRow], list[OperationRow]]:
+        await asyncio.sleep(0)
+        missing = {
+            wallet_id
+            for wallet_id, _ in deltas
+            if session.open_wallet(wallet_id) is None
+        }
+        if missing:
+            raise WalletNotFoundError(wallet_id=min(missing))
+
+        overdrawn = [
+            wallet_id
+            for wallet_id, delta in deltas
+            if delta < 0 and session.wallets[wallet_id].balance + delta < 0
+        ]
+        if overdrawn:
+            raise InsufficientFundsError(wallet_id=min(overdrawn))
+
+        wallets = []
+        for wallet_id, delta in deltas:
+            if delta == 0:
+                continue
+            wallet = session.wallets[wallet_id]
+            wallets.append(
+                WalletRow(wallet_id, wallet.balance + delta, wallet.version + 1)
+            )
+        session.wallets.update((row.id, row) for row in wallets)
+
+        operations = [
+            session.insert_operation(wallet_id, op_type, amount, DEFAULT_CURRENCY)
+            for wallet_id, op_type, amount in legs
+        ]
+        return wallets, operations
@@ -2,17 +2,40 @@ from __future__ import annotations
 
 import enum
 import uuid
-
-from sqlalchemy import Enum, ForeignKey, Integer
+from datetime import date, datetime
+
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    func,
+    text,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+from src.db.ids import uuid7
+
+# currency of wallets.balance, and of the operations recorded before wallets
+# could hold other currencies
+DEFAULT_CURRENCY = "RUB"
+
 
 class OperationType(str, enum.Enum):
     deposit = "DEPOSIT"
     withdraw = "WITHDRAW"
 
 
+class TotalsPeriod(str, enum.Enum):
+    day = "day"
+    month = "month"
+
+
 class Base(DeclarativeBase):
     __abstract__ = True
 
@@ -22,9 +45,17 @@ class Base(DeclarativeBase):
 
 class DBOperation(Base):
     __tablename__ = "operations"
+    # Monthly range partitions, maintained by src.db.partitions. The partition
+    # key has to be part of the primary key.
+    __table_args__ = (
+        Index("ix_operations_wallet_id_created_at", "wallet_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    # load created_at through RETURNING, the async session can't lazy load it
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        UUID(as_uuid=True), primary_key=True, default=uuid7
     )
 
     op_type: Mapped[OperationType] = mapped_column(
@@ -32,23 +63,152 @@ class DBOperation(Base):
         nullable=False,
     )
     amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    # ISO 4217 code
+    currency: Mapped[str] = mapped_column(
+        String(3),
+        nullable=False,
+        default=DEFAULT_CURRENCY,
+        server_default=DEFAULT_CURRENCY,
+    )
 
     wallet_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("wallets.id"), nullable=False
+        UUID(as_uuid=True), ForeignKey("wallets.id", ondelete="CASCADE"), nullable=False
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+        nullable=False,
+        server_default=func.now(),
     )
 
 
 class DBWallet(Base):
     __tablename__ = "wallets"
+    __table_args__ = (
+        Index(
+            "ix_wallets_closed_at",
+            "closed_at",
+            postgresql_where=text("closed_at IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+        UUID(as_uuid=True), primary_key=True, default=uuid7
     )
 
+    # in DEFAULT_CURRENCY, the other currencies have a DBWalletBalance each
     balance: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # bumped by every balance update, checked by the hot wallet cache
+    version: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
+    # a closed wallet is gone for the API, and waits for src.db.purge to
+    # delete it with its operations in batches
+    closed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
+    # deleting a wallet leaves the operations to ON DELETE CASCADE instead of
+    # loading them all for per-row DELETEs
     operations: Mapped[list["DBOperation"]] = relationship(
         "DBOperation",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         lazy="selectin",
     )
+
+
+class DBWalletBalance(Base):
+    """Balance of a wallet in a currency other than ``DEFAULT_CURRENCY``.
+
+    A row per currency, so operations in different currencies of one wallet
+    lock different rows. Created by the first operation in the currency.
+    """
+
+    __tablename__ = "wallet_balances"
+
+    wallet_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("wallets.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    currency: Mapped[str] = mapped_column(String(3), primary_key=True)
+
+    balance: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    version: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
+
+
+class DBWalletShard(Base):
+    """Shard directory: wallets that live off the shard the hash ring maps
+    them to, see src.db.shards. Kept in the main database only."""
+
+    __tablename__ = "wallet_shards"
+
+    wallet_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    shard: Mapped[str] = mapped_column(String(64), nullable=False)
+
+
+class DBLedgerSegment(Base):
+    """Per-wallet index of the archived operations, see src.db.archive.
+
+    A segment is one Parquet file holding the operations of many wallets;
+    there is a row for every wallet and currency in it. ``total`` is what
+    the archived rows added to the balance in the currency, so a balance is
+    the sum of the wallet's segment totals plus its rows still in
+    ``operations``.
+    """
+
+    __tablename__ = "ledger_segments"
+
+    wallet_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    segment_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    currency: Mapped[str] = mapped_column(
+        String(3), primary_key=True, server_default=DEFAULT_CURRENCY
+    )
+    # relative to config.archive.directory
+    path: Mapped[str] = mapped_column(String(255), nullable=False)
+
+    first_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    operations: Mapped[int] = mapped_column(Integer, nullable=False)
+    total: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class _PeriodTotals:
+    wallet_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    currency: Mapped[str] = mapped_column(
+        String(3), primary_key=True, server_default=DEFAULT_CURRENCY
+    )
+
+    deposits: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    withdrawals: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    deposit_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    withdraw_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class DBWalletDailyTotals(_PeriodTotals, Base):
+    """Deposits and withdrawals of a wallet per currency and day, in the
+    service time zone, folded from ``operations`` by src.db.rollups."""
+
+    __tablename__ = "wallet_daily_totals"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+
+class DBWalletMonthlyTotals(_PeriodTotals, Base):
+    """Same as ``DBWalletDailyTotals`` per month, keyed by its first day."""
+
+    __tablename__ = "wallet_monthly_totals"
+
+    month: Mapped[date] = mapped_column(Date, primary_key=True)
+
+
+class DBRollupWatermark(Base):
+    """Operations created up to ``watermark`` are in the rollups, the ones
+    after it are not yet."""
+
+    __tablename__ = "rollup_watermark"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    watermark: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
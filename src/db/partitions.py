@@ -0,0 +1,200 @@
+"""Maintenance of the monthly ``operations`` partitions.
+
+uv run -m src.db.partitions create [--ahead 3]
+uv run -m src.db.partitions detach --older-than 2026-01-01
+uv run -m src.db.partitions list
+"""
+
+import argparse
+import asyncio
+import re
+from datetime import UTC, date, datetime, time
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.config import config
+from src.db.session import session_manager
+
+PARENT = "operations"
+ARCHIVE_SCHEMA = "archive"
+
+_NAME = re.compile(rf"^{PARENT}_p(\d{{4}})_(\d{{2}})$")
+
+# foreign keys of a table to wallets
+WALLET_FKEYS = text(
+    "SELECT conname FROM pg_constraint WHERE contype = 'f' "
+    "AND conrelid = CAST(:table AS regclass) AND confrelid = 'wallets'::regclass"
+)
+
+# tables of a schema, detached partitions among them
+SCHEMA_TABLES = text(
+    "SELECT c.relname FROM pg_class c "
+    "JOIN pg_namespace n ON n.oid = c.relnamespace "
+    "WHERE n.nspname = :schema AND c.relkind = 'r' ORDER BY c.relname"
+)
+
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return month.replace(
+        year=month.year + month.month // 12, month=month.month % 12 + 1
+    )
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y_%m}"
+
+
+def partition_month(name: str) -> date | None:
+    match = _NAME.match(name)
+    if match is None:
+        return None
+    return date(int(match[1]), int(match[2]), 1)
+
+
+async def list_partitions(conn: AsyncConnection) -> list[str]:
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass) "
+            "ORDER BY c.relname"
+        ),
+        {"parent": PARENT},
+    )
+    return list(result.scalars())
+
+
+async def list_detached(
+    conn: AsyncConnection, archive_schema: str = ARCHIVE_SCHEMA
+) -> list[str]:
+    """Partitions moved to ``archive_schema`` by ``detach_partitions``,
+    oldest first."""
+    names = await conn.scalars(SCHEMA_TABLES, {"schema": archive_schema})
+    return [name for name in names if partition_month(name) is not None]
+
+
+async def detached_until(
+    conn: AsyncConnection, archive_schema: str = ARCHIVE_SCHEMA
+) -> datetime | None:
+    """Upper bound of the operations detached from the live table, None when
+    no partition was detached."""
+    detached = await list_detached(conn, archive_schema)
+    if not detached:
+        return None
+    return datetime.combine(next_month(partition_month(detached[-1])), time.min, UTC)
+
+
+async def create_partitions(
+    conn: AsyncConnection, months_ahead: int | None = None, today: date | None = None
+) -> list[str]:
+    """Create the partitions from the current month up to ``months_ahead``
+    months ahead. Existing partitions are left untouched."""
+    if months_ahead is None:
+        months_ahead = config.database.partition_months_ahead
+
+    existing = set(await list_partitions(conn))
+    month = month_start(today or datetime.now(UTC).date())
+
+    created = []
+    for _ in range(months_ahead + 1):
+        name = partition_name(month)
+        if name not in existing:
+            upper = next_month(month)
+            await conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} "
+                    f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                    f"TO ('{upper.isoformat()} 00:00:00+00')"
+                )
+            )
+            created.append(name)
+        month = next_month(month)
+
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+    return created
+
+
+async def check_partitions(conn: AsyncConnection, today: date | None = None) -> None:
+    """Raise when the current or the next month has no partition: there is
+    no default partition, so operations of that month could not be inserted."""
+    existing = set(await list_partitions(conn))
+    month = month_start(today or datetime.now(UTC).date())
+    missing = [
+        name
+        for name in (partition_name(month), partition_name(next_month(month)))
+        if name not in existing
+    ]
+    if missing:
+        raise RuntimeError(f"Missing {PARENT} partitions: {', '.join(missing)}")
+
+
+async def detach_partitions(
+    conn: AsyncConnection, older_than: date, archive_schema: str = ARCHIVE_SCHEMA
+) -> list[str]:
+    """Detach the partitions holding only rows older than ``older_than`` and
+    move them to ``archive_schema``, out of the way of the live table.
+
+    Detaching runs ``CONCURRENTLY``, so ``conn`` must be in autocommit mode.
+    """
+    await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+
+    detached = []
+    for name in await list_partitions(conn):
+        month = partition_month(name)
+        if month is None or next_month(month) > older_than:
+            continue
+
+        await conn.execute(
+            text(f"ALTER TABLE {PARENT} DETACH PARTITION {name} CONCURRENTLY")
+        )
+        await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+        # archived months outlive their wallets, see src.db.purge
+        for fkey in await conn.scalars(
+            WALLET_FKEYS, {"table": f"{archive_schema}.{name}"}
+        ):
+            await conn.execute(
+                text(f"ALTER TABLE {archive_schema}.{name} DROP CONSTRAINT {fkey}")
+            )
+        detached.append(name)
+
+    if detached:
+        logger.info(f"Detached partitions to {archive_schema}: {', '.join(detached)}")
+    return detached
+
+
+async def main(args: argparse.Namespace) -> None:
+    await session_manager.init_db()
+    try:
+        async with session_manager.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if args.command == "create":
+                await create_partitions(conn, months_ahead=args.ahead)
+            elif args.command == "detach":
+                await detach_partitions(conn, older_than=args.older_than)
+
+            for name in await list_partitions(conn):
+                print(name)
+    finally:
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage operations partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser("create", help="create upcoming monthly partitions")
+    create.add_argument("--ahead", type=int, default=None)
+
+    detach = commands.add_parser("detach", help="detach and archive old partitions")
+    detach.add_argument("--older-than", type=date.fromisoformat, required=True)
+
+    commands.add_parser("list", help="list attached partitions")
+
+    asyncio.run(main(parser.parse_args()))
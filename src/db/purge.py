@@ -0,0 +1,138 @@
+"""Deletion of closed wallets, in bounded batches.
+
+Closing a wallet only stamps ``wallets.closed_at``: from then on the DAOs
+treat it as missing. The ``purge`` job deletes the operations of closed
+wallets ``purge.batch_size`` rows per transaction, so a wallet with
+millions of operations never holds its locks, or the WAL of one huge
+transaction, for longer than a batch, and no row is loaded into the app.
+Once its operations are gone, the wallet row is deleted together with its
+balances in other currencies, rollups and ledger segment index; ON DELETE
+CASCADE takes the operations recorded in the meantime along.
+
+Archived operations are left alone: Parquet segments and detached
+partitions hold the rows of many wallets, and outlive them.
+
+uv run -m src.db.purge run [--batch-size 10000]
+uv run -m src.db.purge pending
+"""
+
+import argparse
+import asyncio
+from uuid import UUID
+
+from loguru import logger
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.config import config
+from src.db.models import DBLedgerSegment, DBWalletDailyTotals, DBWalletMonthlyTotals
+from src.db.rollups import lock_watermark
+from src.db.session import session_manager
+from src.db.shards import shard_router
+
+# closed wallets taken per round, oldest first
+CLOSED_BATCH = 100
+
+SELECT_CLOSED = text(
+    "SELECT id FROM wallets WHERE closed_at IS NOT NULL ORDER BY closed_at LIMIT :limit"
+)
+
+COUNT_CLOSED = text("SELECT count(*) FROM wallets WHERE closed_at IS NOT NULL")
+
+# a batch found through ix_operations_wallet_id_created_at, oldest first
+DELETE_OPERATIONS = text(
+    "DELETE FROM operations WHERE (id, created_at) IN ("
+    "SELECT id, created_at FROM operations WHERE wallet_id = :wallet_id "
+    "ORDER BY created_at LIMIT :limit)"
+)
+
+DELETE_WALLET = text(
+    "DELETE FROM wallets WHERE id = :wallet_id AND closed_at IS NOT NULL"
+)
+
+# keyed by wallet, with no foreign key to it
+_wallet_tables = (
+    DBLedgerSegment.__table__,
+    DBWalletDailyTotals.__table__,
+    DBWalletMonthlyTotals.__table__,
+)
+
+
+async def purge_wallet(
+    engine: AsyncEngine, wallet_id: UUID, batch_size: int | None = None
+) -> int:
+    """Delete a closed wallet and everything it owns. Returns the number of
+    operations deleted."""
+    batch_size = batch_size or config.purge.batch_size
+
+    deleted = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                DELETE_OPERATIONS, {"wallet_id": wallet_id, "limit": batch_size}
+            )
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+
+    async with engine.begin() as conn:
+        # a fold running now could write the rollups of the wallet back
+        await lock_watermark(conn, "SHARE")
+        for table in _wallet_tables:
+            await conn.execute(delete(table).where(table.c.wallet_id == wallet_id))
+        await conn.execute(DELETE_WALLET, {"wallet_id": wallet_id})
+
+    return deleted
+
+
+async def purge_closed_wallets(
+    engine: AsyncEngine, batch_size: int | None = None
+) -> int:
+    """Purge every closed wallet of a database. Returns the number of
+    wallets deleted.
+
+    Runs started twice at once delete the same rows and wait on each other,
+    which is harmless.
+    """
+    purged = 0
+    while True:
+        async with engine.connect() as conn:
+            wallet_ids = list(
+                await conn.scalars(SELECT_CLOSED, {"limit": CLOSED_BATCH})
+            )
+        if not wallet_ids:
+            return purged
+
+        for wallet_id in wallet_ids:
+            operations = await purge_wallet(engine, wallet_id, batch_size)
+            logger.info(f"Purged wallet {wallet_id} with {operations} operations")
+        await shard_router.forget(wallet_ids)
+        purged += len(wallet_ids)
+
+
+async def main(args: argparse.Namespace) -> None:
+    await session_manager.init_db()
+    try:
+        for shard in session_manager.shard_names:
+            engine = session_manager.shard_engine(shard)
+            if args.command == "run":
+                purged = await purge_closed_wallets(engine, args.batch_size)
+                print(f"{shard}: {purged} wallets purged")
+            elif args.command == "pending":
+                async with engine.connect() as conn:
+                    pending = await conn.scalar(COUNT_CLOSED)
+                print(f"{shard}: {pending} closed wallets")
+    finally:
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete closed wallets")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="delete the closed wallets now")
+    run.add_argument("--batch-size", type=int, default=None)
+
+    commands.add_parser("pending", help="count the closed wallets left")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,35 @@
+from typing import NamedTuple
+
+from asyncpg import IntegrityConstraintViolationError
+from sqlalchemy.exc import IntegrityError
+
+from src.config import DaoBackend, config
+from src.db.compiled import CompiledDaoOperation, CompiledDaoWallet
+from src.db.dao import DaoOperation, DaoWallet
+from src.db.fast import FastDaoOperation, FastDaoWallet
+from src.db.memory import MemoryDaoOperation, MemoryDaoWallet, MemoryIntegrityError
+
+# Constraint violations raised by any of the backends
+INTEGRITY_ERRORS = (
+    IntegrityError,
+    IntegrityConstraintViolationError,
+    MemoryIntegrityError,
+)
+
+
+class Repository(NamedTuple):
+    wallets: type
+    operations: type
+
+
+REPOSITORIES: dict[DaoBackend, Repository] = {
+    "orm": Repository(wallets=DaoWallet, operations=DaoOperation),
+    "compiled": Repository(wallets=CompiledDaoWallet, operations=CompiledDaoOperation),
+    "asyncpg": Repository(wallets=FastDaoWallet, operations=FastDaoOperation),
+    "memory": Repository(wallets=MemoryDaoWallet, operations=MemoryDaoOperation),
+}
+
+
+def get_repository(backend: DaoBackend | None = None) -> Repository:
+    """Return the DAO classes for ``backend`` (defaults to the configured one)."""
+    return REPOSITORIES[backend or config.database.dao]
@@ -0,0 +1,128 @@
+"""Retries of service-level transactions that lost a race.
+
+Under contention Postgres aborts a transaction with a serialization failure,
+a deadlock or a lock timeout (``lock_timeout``). Nothing of it was
+committed, so running the whole transaction again is safe and usually
+succeeds. Only transactions that are a single unit may be wrapped: every
+attempt starts from scratch on the same session, which ``transactional``
+(or the asyncpg transaction) has rolled back.
+
+Attempts are spaced by exponential backoff with full jitter and stop once
+the next one could not start within the budget, or before the deadline of
+the request (see ``src.db.deadline``). Counters are per worker,
+served at ``GET /api/v1/admin/retries``.
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from functools import wraps
+
+from loguru import logger
+from sqlalchemy.exc import DBAPIError
+
+from src.config import RetryConfig, config
+from src.db import deadline as request_deadline
+from src.models.dto import RetryStats
+
+RETRYABLE_SQLSTATES = frozenset(
+    {
+        "40001",  # serialization_failure
+        "40P01",  # deadlock_detected
+        "55P03",  # lock_not_available: lock_timeout or NOWAIT
+    }
+)
+
+
+def sqlstate(error: BaseException) -> str | None:
+    """SQLSTATE of a database error, raised by asyncpg or wrapped by
+    SQLAlchemy."""
+    if isinstance(error, DBAPIError):
+        error = error.orig
+    return getattr(error, "sqlstate", None)
+
+
+class RetryPolicy:
+    def __init__(self, settings: RetryConfig) -> None:
+        self.settings = settings
+        self.calls = 0
+        self.retries = 0
+        # calls that succeeded after at least one retry
+        self.recovered = 0
+        # calls that failed with a retryable error after the last attempt
+        self.exhausted = 0
+        self.by_sqlstate: Counter[str] = Counter()
+        self.by_method: Counter[str] = Counter()
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before retry number ``attempt``, from 1."""
+        cap = min(
+            self.settings.max_delay, self.settings.base_delay * 2 ** (attempt - 1)
+        )
+        return random.uniform(0, cap)
+
+    def stats(self) -> RetryStats:
+        return RetryStats(
+            calls=self.calls,
+            retries=self.retries,
+            recovered=self.recovered,
+            exhausted=self.exhausted,
+            by_sqlstate=dict(self.by_sqlstate),
+            by_method=dict(self.by_method),
+        )
+
+    def reset(self) -> None:
+        self.__init__(self.settings)
+
+
+retry_policy = RetryPolicy(config.retry)
+
+
+def retrying(func):
+    """Run the wrapped coroutine again when its transaction is aborted with
+    a retryable SQLSTATE."""
+    name = func.__qualname__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        policy = retry_policy
+        settings = policy.settings
+        policy.calls += 1
+        if not settings.enabled:
+            return await func(*args, **kwargs)
+
+        deadline = time.monotonic() + settings.budget
+        remaining = request_deadline.remaining()
+        if remaining is not None:
+            deadline = min(deadline, time.monotonic() + remaining)
+        attempt = 1
+        while True:
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                state = sqlstate(e)
+                if state not in RETRYABLE_SQLSTATES:
+                    raise
+                delay = policy.backoff(attempt)
+                if (
+                    attempt >= settings.max_attempts
+                    or time.monotonic() + delay >= deadline
+                ):
+                    policy.exhausted += 1
+                    logger.warning(
+                        f"{name} failed with {state} after {attempt} attempts"
+                    )
+                    raise
+                policy.retries += 1
+                policy.by_sqlstate[state] += 1
+                policy.by_method[name] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            if attempt > 1:
+                policy.recovered += 1
+            return result
+
+    return wrapper
@@ -0,0 +1,412 @@
+"""Per-wallet deposit and withdraw totals per currency, day and month.
+
+``wallet_daily_totals`` and ``wallet_monthly_totals`` are kept by a
+background job rather than by the write path. Each run folds the
+operations created after the watermark (``rollup_watermark``) into both
+tables and moves the watermark on, a batch of ``rollups.batch_window``
+seconds per transaction. It stays ``rollups.lag`` seconds behind the clock:
+an operation gets its ``created_at`` when its transaction starts, so a
+transaction still running could otherwise commit rows behind the
+watermark. Reads add the few operations after the watermark to the rollups,
+so totals are exact and cost a row per period rather than per operation.
+
+Days and months are in the service time zone. Operations archived before
+the rollups first ran are not in them.
+
+``rebuild`` recomputes the rollups from ``operations`` up to the watermark,
+in chunks of wallets run in parallel, and ``verify`` only counts the rows
+that are off. Periods reaching into the archive of a wallet, or into the
+partitions detached to the archive schema, are left as they are: their
+operations are no longer in ``operations``.
+
+uv run -m src.db.rollups fold
+uv run -m src.db.rollups verify [--chunks 16] [--parallel 4]
+uv run -m src.db.rollups rebuild [--chunks 16] [--parallel 4]
+"""
+
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+from uuid import UUID
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from src.config import config, timezone
+from src.db.memory import MemoryStore
+from src.db.models import TotalsPeriod
+from src.db.partitions import detached_until
+from src.db.session import session_manager
+from src.models.dto import PeriodTotals
+
+_TZ = f"'{timezone.key}'"
+DAY = "CAST({at} AT TIME ZONE " + _TZ + " AS date)"
+MONTH = "CAST(date_trunc('month', {at} AT TIME ZONE " + _TZ + ") AS date)"
+
+# table, period column and bucket of a timestamp
+TABLES = {
+    TotalsPeriod.day: ("wallet_daily_totals", "day", DAY),
+    TotalsPeriod.month: ("wallet_monthly_totals", "month", MONTH),
+}
+COLUMNS = "deposits, withdrawals, deposit_count, withdraw_count"
+_SUMS = (
+    "coalesce(sum(amount) FILTER (WHERE op_type = 'deposit'), 0)",
+    "coalesce(sum(amount) FILTER (WHERE op_type = 'withdraw'), 0)",
+    "count(*) FILTER (WHERE op_type = 'deposit')",
+    "count(*) FILTER (WHERE op_type = 'withdraw')",
+)
+SUMS = ", ".join(
+    f"{expr} AS {column}" for expr, column in zip(_SUMS, COLUMNS.split(", "))
+)
+_ADD = ", ".join(
+    f"{column} = t.{column} + excluded.{column}" for column in COLUMNS.split(", ")
+)
+
+SELECT_WATERMARK = "SELECT watermark FROM rollup_watermark WHERE name = 'rollups'"
+INIT_WATERMARK = text(
+    "INSERT INTO rollup_watermark (name) VALUES ('rollups') ON CONFLICT DO NOTHING"
+)
+SET_WATERMARK = text(
+    "UPDATE rollup_watermark SET watermark = :watermark WHERE name = 'rollups'"
+)
+
+# Folds the operations in (low, high], of one wallet or all, into both tables,
+# times sign: -1 takes them out again. Returns the number of operations.
+FOLD = text(
+    "WITH daily AS ("
+    f"SELECT wallet_id, currency, {DAY.format(at='created_at')} AS day, "
+    + ", ".join(
+        f":sign * {expr} AS {column}"
+        for expr, column in zip(_SUMS, COLUMNS.split(", "))
+    )
+    + " FROM operations "
+    "WHERE created_at > coalesce(CAST(:low AS timestamptz), '-infinity') "
+    "AND created_at <= :high "
+    "AND (CAST(:wallet_id AS uuid) IS NULL OR wallet_id = :wallet_id) "
+    "GROUP BY 1, 2, 3), "
+    "days AS ("
+    f"INSERT INTO wallet_daily_totals AS t (wallet_id, currency, day, {COLUMNS}) "
+    "SELECT * FROM daily "
+    f"ON CONFLICT (wallet_id, currency, day) DO UPDATE SET {_ADD}), "
+    "months AS ("
+    f"INSERT INTO wallet_monthly_totals AS t (wallet_id, currency, month, {COLUMNS}) "
+    "SELECT wallet_id, currency, "
+    "CAST(date_trunc('month', CAST(day AS timestamp)) AS date), "
+    "sum(deposits), sum(withdrawals), sum(deposit_count), sum(withdraw_count) "
+    "FROM daily GROUP BY 1, 2, 3 "
+    f"ON CONFLICT (wallet_id, currency, month) DO UPDATE SET {_ADD}) "
+    "SELECT coalesce(sum(abs(deposit_count) + abs(withdraw_count)), 0) FROM daily"
+)
+DELETE_EMPTY = [
+    text(
+        f"DELETE FROM {table} WHERE wallet_id = :wallet_id "
+        "AND deposit_count = 0 AND withdraw_count = 0"
+    )
+    for table, _, _ in TABLES.values()
+]
+
+# rollups up to the watermark plus the operations after it
+_SELECT_TOTALS = (
+    "SELECT period, currency, "
+    "CAST(sum(deposits) AS bigint), CAST(sum(withdrawals) AS bigint), "
+    "CAST(sum(deposit_count) AS bigint), CAST(sum(withdraw_count) AS bigint) FROM ("
+    "SELECT {column} AS period, currency, " + COLUMNS + " FROM {table} "
+    "WHERE wallet_id = {wallet_id} "
+    "UNION ALL "
+    "SELECT {bucket}, currency, "
+    "CASE WHEN op_type = 'deposit' THEN amount ELSE 0 END, "
+    "CASE WHEN op_type = 'withdraw' THEN amount ELSE 0 END, "
+    "CASE WHEN op_type = 'deposit' THEN 1 ELSE 0 END, "
+    "CASE WHEN op_type = 'withdraw' THEN 1 ELSE 0 END "
+    "FROM operations WHERE wallet_id = {wallet_id} "
+    "AND created_at > coalesce((" + SELECT_WATERMARK + "), '-infinity')"
+    ") t "
+    "WHERE period >= coalesce(CAST({since} AS date), '-infinity') "
+    "AND period < coalesce(CAST({until} AS date), 'infinity') "
+    "GROUP BY period, currency ORDER BY period, currency"
+)
+SELECT_TOTALS = {
+    period: text(
+        _SELECT_TOTALS.format(
+            table=table,
+            column=column,
+            bucket=bucket.format(at="created_at"),
+            wallet_id=":wallet_id",
+            since=":since",
+            until=":until",
+        )
+    )
+    for period, (table, column, bucket) in TABLES.items()
+}
+SELECT_TOTALS_ASYNCPG = {
+    period: _SELECT_TOTALS.format(
+        table=table,
+        column=column,
+        bucket=bucket.format(at="created_at"),
+        wallet_id="$1",
+        since="$2",
+        until="$3",
+    )
+    for period, (table, column, bucket) in TABLES.items()
+}
+
+# wallets are chunked by id: the first id of every chunk
+CHUNK_STARTS = text(
+    "SELECT min(id) FROM (SELECT id, ntile(:chunks) OVER (ORDER BY id) AS chunk "
+    "FROM wallets) t GROUP BY chunk ORDER BY 1"
+)
+
+
+def _in_chunk(alias: str) -> str:
+    return (
+        f"{alias}.wallet_id >= coalesce(CAST(:low AS uuid), "
+        "'00000000-0000-0000-0000-000000000000') "
+        f"AND (CAST(:high AS uuid) IS NULL OR {alias}.wallet_id < :high)"
+    )
+
+
+def _rebuild_statements(period: TotalsPeriod) -> tuple:
+    """Statements comparing, clearing and refilling the rollups of a chunk."""
+    table, column, bucket = TABLES[period]
+    # the periods of each wallet up to its newest archived operation
+    archived = (
+        f"archived AS (SELECT s.wallet_id, {bucket.format(at='max(s.last_at)')} "
+        f"AS period FROM ledger_segments s WHERE {_in_chunk('s')} "
+        "GROUP BY s.wallet_id)"
+    )
+    # periods up to the last detached operation, see src.db.partitions
+    last_detached = bucket.format(
+        at="(CAST(:detached_until AS timestamptz) - INTERVAL '1 microsecond')"
+    )
+    not_archived = (
+        "NOT EXISTS (SELECT FROM archived a WHERE a.wallet_id = r.wallet_id "
+        f"AND r.{column} <= a.period) "
+        f"AND (CAST(:detached_until AS timestamptz) IS NULL "
+        f"OR r.{column} > {last_detached})"
+    )
+    rebuilt = (
+        f"rebuilt AS (SELECT o.wallet_id, o.currency, "
+        f"{bucket.format(at='o.created_at')} AS {column}, {SUMS} "
+        f"FROM operations o WHERE {_in_chunk('o')} "
+        "AND o.created_at <= coalesce(CAST(:watermark AS timestamptz), '-infinity') "
+        "GROUP BY 1, 2, 3), "
+        f"fresh AS (SELECT * FROM rebuilt r WHERE {not_archived})"
+    )
+    compare = text(
+        f"WITH {archived}, {rebuilt}, "
+        f"stored AS (SELECT wallet_id, currency, {column}, {COLUMNS} FROM {table} r "
+        f"WHERE {_in_chunk('r')} AND {not_archived}) "
+        "SELECT count(*) FROM fresh f FULL JOIN stored s "
+        f"USING (wallet_id, currency, {column}) "
+        f"WHERE (f.{COLUMNS.replace(', ', ', f.')}) "
+        f"IS DISTINCT FROM (s.{COLUMNS.replace(', ', ', s.')})"
+    )
+    clear = text(
+        f"WITH {archived} DELETE FROM {table} r "
+        f"WHERE {_in_chunk('r')} AND {not_archived}"
+    )
+    refill = text(
+        f"INSERT INTO {table} (wallet_id, currency, {column}, {COLUMNS}) "
+        f"WITH {archived}, {rebuilt} SELECT * FROM fresh"
+    )
+    return compare, clear, refill
+
+
+REBUILD = {period: _rebuild_statements(period) for period in TABLES}
+
+
+async def lock_watermark(
+    conn: AsyncConnection | AsyncSession, mode: str = "UPDATE"
+) -> datetime | None:
+    """Watermark of the database, locked until the end of the transaction."""
+    return await conn.scalar(text(f"{SELECT_WATERMARK} FOR {mode}"))
+
+
+async def fold_operations(
+    engine: AsyncEngine, lag: float | None = None, window: float | None = None
+) -> int:
+    """Fold the operations older than ``lag`` seconds into the rollups,
+    ``window`` seconds of them per transaction. Returns the number of
+    operations folded.
+
+    Concurrent runs queue up on the watermark row.
+    """
+    lag = config.rollups.lag if lag is None else lag
+    window = timedelta(seconds=window or config.rollups.batch_window)
+
+    folded = 0
+    while True:
+        async with engine.begin() as conn:
+            await conn.execute(INIT_WATERMARK)
+            low = await lock_watermark(conn)
+            now = await conn.scalar(text("SELECT now()"))
+            horizon = now - timedelta(seconds=lag)
+            if low is None:
+                first = await conn.scalar(
+                    text("SELECT min(created_at) FROM operations")
+                )
+                low = (
+                    horizon
+                    if first is None
+                    else min(first - timedelta(microseconds=1), horizon)
+                )
+            if low >= horizon:
+                await conn.execute(SET_WATERMARK, {"watermark": low})
+                break
+
+            high = min(low + window, horizon)
+            folded += await conn.scalar(
+                FOLD, {"low": low, "high": high, "wallet_id": None, "sign": 1}
+            )
+            await conn.execute(SET_WATERMARK, {"watermark": high})
+        if high >= horizon:
+            break
+    return folded
+
+
+async def refold_wallet(
+    conn: AsyncConnection | AsyncSession,
+    wallet_id: UUID,
+    folded_to: datetime | None,
+    watermark: datetime | None,
+) -> None:
+    """Bring rollups of a wallet that hold its operations up to
+    ``folded_to``, e.g. copied from another shard, to the ``watermark`` of
+    this database."""
+    if folded_to == watermark:
+        return
+    if watermark is None or (folded_to is not None and folded_to > watermark):
+        low, high, sign = watermark, folded_to, -1
+    else:
+        low, high, sign = folded_to, watermark, 1
+    await conn.execute(
+        FOLD, {"low": low, "high": high, "wallet_id": wallet_id, "sign": sign}
+    )
+    for statement in DELETE_EMPTY:
+        await conn.execute(statement, {"wallet_id": wallet_id})
+
+
+async def list_totals(
+    session: AsyncSession | asyncpg.Connection | MemoryStore,
+    wallet_id: UUID,
+    period: TotalsPeriod,
+    since: date | None = None,
+    until: date | None = None,
+) -> list[PeriodTotals]:
+    """Totals of a wallet per period starting in [since, until) and
+    currency, oldest first."""
+    if isinstance(session, AsyncSession):
+        rows = await session.execute(
+            SELECT_TOTALS[period],
+            {"wallet_id": wallet_id, "since": since, "until": until},
+        )
+    elif isinstance(session, MemoryStore):
+        # no rollup job runs on the in-memory backend
+        rows = session.totals(wallet_id, period, since, until)
+    else:
+        rows = await session.fetch(
+            SELECT_TOTALS_ASYNCPG[period], wallet_id, since, until
+        )
+    return [
+        PeriodTotals(
+            period=row[0],
+            currency=row[1],
+            deposits=row[2],
+            withdrawals=row[3],
+            deposit_count=row[4],
+            withdraw_count=row[5],
+        )
+        for row in rows
+    ]
+
+
+async def _rebuild_chunk(
+    engine: AsyncEngine,
+    low: UUID | None,
+    high: UUID | None,
+    watermark: datetime | None,
+    detached: datetime | None,
+    check: bool,
+) -> int:
+    params = {
+        "low": low,
+        "high": high,
+        "watermark": watermark,
+        "detached_until": detached,
+    }
+    mismatched = 0
+    async with engine.begin() as conn:
+        for compare, clear, refill in REBUILD.values():
+            mismatched += await conn.scalar(compare, params)
+            if not check:
+                await conn.execute(clear, params)
+                await conn.execute(refill, params)
+    return mismatched
+
+
+async def rebuild_rollups(
+    engine: AsyncEngine,
+    chunks: int | None = None,
+    parallel: int | None = None,
+    check: bool = False,
+) -> int:
+    """Recompute the rollups up to the watermark from ``operations``, or
+    only compare them with ``check``. Returns the number of rollup rows that
+    were off.
+
+    Chunks of wallets run in transactions of their own, ``parallel`` at a
+    time, while the watermark stays locked so that no fold runs meanwhile.
+    """
+    chunks = chunks or config.rollups.rebuild_chunks
+    semaphore = asyncio.Semaphore(parallel or config.rollups.rebuild_parallel)
+
+    async def run(low: UUID | None, high: UUID | None) -> int:
+        async with semaphore:
+            return await _rebuild_chunk(engine, low, high, watermark, detached, check)
+
+    async with engine.begin() as conn:
+        watermark = await lock_watermark(conn)
+        detached = await detached_until(conn)
+        starts = (await conn.scalars(CHUNK_STARTS, {"chunks": chunks})).all()[1:]
+        results = await asyncio.gather(
+            *(run(low, high) for low, high in zip([None, *starts], [*starts, None]))
+        )
+    return sum(results)
+
+
+async def main(args: argparse.Namespace) -> None:
+    await session_manager.init_db()
+    try:
+        for shard in session_manager.shard_names:
+            engine = session_manager.shard_engine(shard)
+            if args.command == "fold":
+                folded = await fold_operations(engine)
+                print(f"{shard}: {folded} operations folded")
+                continue
+
+            mismatched = await rebuild_rollups(
+                engine,
+                chunks=args.chunks,
+                parallel=args.parallel,
+                check=args.command == "verify",
+            )
+            print(f"{shard}: {mismatched} rollup rows off")
+    finally:
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily and monthly wallet totals")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("fold", help="fold new operations into the rollups")
+    for command, description in (
+        ("verify", "count the rollup rows off their operations"),
+        ("rebuild", "recompute the rollups from the operations"),
+    ):
+        subparser = commands.add_parser(command, help=description)
+        subparser.add_argument("--chunks", type=int, default=None)
+        subparser.add_argument("--parallel", type=int, default=None)
+
+    asyncio.run(main(parser.parse_args()))
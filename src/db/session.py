@@ -1,18 +1,31 @@
 import contextlib
 from collections.abc import AsyncIterator
 
+import asyncpg
 from alembic import command
 from alembic.config import Config
 from anyio import to_thread
 from loguru import logger
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.orm import Session
 
-from src.config import secrets
+from src.config import DaoBackend, config, secrets
+from src.db import deadline
+from src.db.memory import MemoryStore, memory_store
+from src.db.wrap import tag_cursor_execute
+
+# every ORM transaction begun under a request deadline is bounded by it
+event.listen(Session, "after_begin", deadline.apply_deadline)
+
+# the database from POSTGRES_* settings: holds the shard directory
+MAIN_SHARD = "main"
 
 
 class NotInitializedError(Exception):
@@ -24,6 +37,12 @@ class DatabaseSessionManager:
     def __init__(self) -> None:
         self._engine: AsyncEngine | None = None
         self._sessionmaker: async_sessionmaker | None = None
+        self._pool: asyncpg.Pool | None = None
+        self._replica_engines: list[AsyncEngine] = []
+        self._replicas: list[async_sessionmaker[AsyncSession]] = []
+        self._next_replica = 0
+        self._shard_engines: dict[str, AsyncEngine] = {}
+        self._shards: dict[str, async_sessionmaker[AsyncSession]] = {}
 
     @property
     def engine(self) -> AsyncEngine:
@@ -37,38 +56,142 @@ class DatabaseSessionManager:
             raise NotInitializedError("Sessionmaker is not initialized.")
         return self._sessionmaker
 
-    async def init_db(self, run_migrations: bool = False) -> None:
-        self._engine = create_async_engine(
-            str(secrets.sqlalchemy_url),
+    @property
+    def pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            raise NotInitializedError("asyncpg pool is not initialized.")
+        return self._pool
+
+    @property
+    def has_replicas(self) -> bool:
+        return bool(self._replicas)
+
+    @property
+    def shard_names(self) -> list[str]:
+        return [MAIN_SHARD, *self._shards]
+
+    def shard_engine(self, shard: str) -> AsyncEngine:
+        if shard == MAIN_SHARD:
+            return self.engine
+        return self._shard_engines[shard]
+
+    @staticmethod
+    def _create_engine(url: str) -> AsyncEngine:
+        engine = create_async_engine(
+            url,
             pool_pre_ping=True,
+            pool_size=config.database.pool_size,
+            max_overflow=config.database.max_overflow,
         )
-        self._sessionmaker = async_sessionmaker(
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            tag_cursor_execute,
+            retval=True,
+        )
+        return engine
+
+    @staticmethod
+    def _create_sessionmaker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+        return async_sessionmaker(
             autocommit=False,
             autoflush=False,
-            bind=self.engine,
+            bind=engine,
             expire_on_commit=False,
             class_=AsyncSession,
         )
 
+    async def init_db(self, run_migrations: bool = False) -> None:
+        self._engine = self._create_engine(str(secrets.sqlalchemy_url))
+        self._sessionmaker = self._create_sessionmaker(self._engine)
+        self.init_replicas(secrets.replica_sqlalchemy_urls)
+        self.init_shards(secrets.shard_sqlalchemy_urls)
+
         if run_migrations:
-            await to_thread.run_sync(self._run_migrations)
+            await to_thread.run_sync(self._run_migrations, str(secrets.sqlalchemy_url))
+            for url in secrets.shard_sqlalchemy_urls.values():
+                await to_thread.run_sync(self._run_migrations, url)
 
             logger.debug("Migration end")
 
-    def _run_migrations(self) -> None:
+        if config.database.dao == "asyncpg":
+            await self.init_pool()
+
+    async def init_pool(self) -> None:
+        """Create the asyncpg pool used by the fast path DAO backend."""
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(
+                secrets.asyncpg_dsn,
+                min_size=config.database.pool_size,
+                max_size=config.database.max_connections,
+            )
+
+    def init_replicas(self, urls: list[str]) -> None:
+        """Add read replica engines, used by ``read_session``."""
+        for url in urls:
+            engine = self._create_engine(url)
+            self._replica_engines.append(engine)
+            self._replicas.append(self._create_sessionmaker(engine))
+
+    def init_shards(self, urls: dict[str, str]) -> None:
+        """Add wallet shard engines by name, see ``src.db.shards``."""
+        if urls and config.database.dao == "asyncpg":
+            raise ValueError("Wallet shards need the orm or compiled DAO backend")
+        for name, url in urls.items():
+            engine = self._create_engine(url)
+            self._shard_engines[name] = engine
+            self._shards[name] = self._create_sessionmaker(engine)
+
+    def _run_migrations(self, url: str) -> None:
         alembic_cfg = Config("alembic.ini")
-        alembic_cfg.set_main_option("sqlalchemy.url", str(secrets.sqlalchemy_url))
+        # read by alembic/env.py, one run per shard
+        alembic_cfg.attributes["sqlalchemy.url"] = url
         command.upgrade(alembic_cfg, "head")
 
     async def close(self) -> None:
+        for engine in self._replica_engines:
+            await engine.dispose()
+        self._replica_engines = []
+        self._replicas = []
+        for engine in self._shard_engines.values():
+            await engine.dispose()
+        self._shard_engines = {}
+        self._shards = {}
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
         if self._engine is not None:
             await self.engine.dispose()
             self._engine = None
             self._sessionmaker = None
 
     @contextlib.asynccontextmanager
-    async def session(self) -> AsyncIterator[AsyncSession]:
-        session = self.sessionmaker()
+    async def session(
+        self, backend: DaoBackend | None = None, shard: str | None = None
+    ) -> AsyncIterator[AsyncSession | asyncpg.Connection | MemoryStore]:
+        """Yield the handle the DAO backend expects as its ``session``: an
+        AsyncSession, a pooled asyncpg connection for the fast path or the
+        in-memory store. ``shard`` picks the wallet shard, the main database
+        by default."""
+        backend = backend or config.database.dao
+        if backend == "memory":
+            yield memory_store
+            return
+
+        if backend == "asyncpg":
+            async with self.pool.acquire() as conn:
+                # the fast path runs single statements outside transactions:
+                # bound the whole session, the pool resets it on release
+                setting = deadline.timeout_setting()
+                if setting is not None:
+                    await conn.execute(deadline.SET_TIMEOUTS, setting)
+                yield conn
+            return
+
+        if shard is None or shard == MAIN_SHARD:
+            session = self.sessionmaker()
+        else:
+            session = self._shards[shard]()
         try:
             yield session
         except Exception as e:
@@ -78,10 +201,82 @@ class DatabaseSessionManager:
         finally:
             await session.close()
 
+    async def _pick_replica(self, min_lsn: str | None) -> AsyncSession | None:
+        """Next replica, round robin, that has replayed the WAL up to
+        ``min_lsn``. None when every replica is behind or unreachable."""
+        for _ in range(len(self._replicas)):
+            self._next_replica = (self._next_replica + 1) % len(self._replicas)
+            session = self._replicas[self._next_replica]()
+            if min_lsn is None:
+                return session
+
+            try:
+                # the read that follows goes to the same replica, and replay
+                # only moves forward
+                replayed = await session.scalar(REPLAYED_LSN, {"lsn": min_lsn})
+            except (DBAPIError, OSError) as e:
+                logger.warning(f"Replica unavailable: {e}")
+                replayed = False
+            if replayed:
+                return session
+            await session.close()
+        return None
+
+    @contextlib.asynccontextmanager
+    async def read_session(
+        self,
+        min_lsn: str | None = None,
+        primary: bool = False,
+        backend: DaoBackend | None = None,
+        shard: str | None = None,
+    ) -> AsyncIterator[AsyncSession | asyncpg.Connection | MemoryStore]:
+        """Like ``session``, but for reads that may be served by a replica.
+
+        ``min_lsn`` is the primary WAL position a client has seen after its
+        last write (see ``current_lsn``). Only a replica that has replayed it
+        is used, otherwise the read falls back to the primary, so the client
+        reads its own writes. ``primary`` skips the replicas altogether.
+        Replicas are of the main database, other shards read from themselves.
+        """
+        session = None
+        if (
+            self._replicas
+            and not primary
+            and shard in (None, MAIN_SHARD)
+            and (backend or config.database.dao) in ("orm", "compiled")
+        ):
+            session = await self._pick_replica(min_lsn)
+
+        if session is None:
+            async with self.session(backend, shard) as session:
+                yield session
+            return
+
+        try:
+            yield session
+        except Exception as e:
+            logger.exception(str(e))
+            await session.rollback()
+            raise e
+        finally:
+            await session.close()
+
+    async def current_lsn(self, session: AsyncSession | asyncpg.Connection) -> str:
+        """WAL position of the primary, past the last commit of ``session``."""
+        if isinstance(session, AsyncSession):
+            return await session.scalar(CURRENT_LSN)
+        return await session.fetchval(CURRENT_LSN.text)
+
+
+REPLAYED_LSN = text(
+    "SELECT CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() "
+    "ELSE pg_current_wal_lsn() END >= CAST(:lsn AS pg_lsn)"
+)
+CURRENT_LSN = text("SELECT pg_current_wal_lsn()::text")
 
 session_manager = DatabaseSessionManager()
 
 
-async def get_db() -> AsyncIterator[AsyncSession]:
+async def get_db() -> AsyncIterator[AsyncSession | asyncpg.Connection]:
     async with session_manager.session() as session:
         yield session
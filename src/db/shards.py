@@ -0,0 +1,503 @@
+"""Horizontal sharding of wallets across databases.
+
+A wallet and its operations live on a single shard, so single wallet
+operations never span databases. A wallet lives on the shard a consistent
+hash ring of the shard names maps it to, unless the shard directory
+(``wallet_shards`` in the main database) lists it elsewhere. The directory
+only holds the wallets off their ring shard, e.g. while a new shard fills up.
+
+Adding a shard online:
+
+1. add it to ``POSTGRES_SHARD_HOSTS`` for this tool and run ``pin``: every
+   wallet the new ring maps elsewhere is listed where it lives now
+2. roll the new ``POSTGRES_SHARD_HOSTS`` out to the app
+3. run ``pin`` once more, for the wallets created during the rollout, then
+   ``rebalance`` to move the listed wallets to their ring shard
+
+A move interrupted after the directory switched leaves a stale copy on the
+source shard: ``pin`` skips it, running the same ``move`` again deletes it.
+
+uv run -m src.db.shards status
+uv run -m src.db.shards pin
+uv run -m src.db.shards rebalance [--limit 1000]
+uv run -m src.db.shards move <wallet_id> <shard>
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import AsyncIterator, Iterable
+from uuid import UUID
+
+import asyncpg
+from loguru import logger
+from sqlalchemy import delete, func, insert, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.models import (
+    DBLedgerSegment,
+    DBOperation,
+    DBWallet,
+    DBWalletBalance,
+    DBWalletDailyTotals,
+    DBWalletMonthlyTotals,
+    DBWalletShard,
+)
+from src.db.partitions import create_partitions, month_start
+from src.db.rollups import lock_watermark, refold_wallet
+from src.db.session import MAIN_SHARD, DatabaseSessionManager, session_manager
+
+VNODES = 64
+# operations copied per statement by a move
+MOVE_BATCH = 10_000
+# wallet placements cached per process, least recently used are dropped
+DIRECTORY_CACHE = 100_000
+# seconds before subscribing to directory changes is tried again
+LISTEN_RETRY = 5.0
+
+# sent in the transaction of every directory change: the wallet id, or
+# nothing when many changed
+DIRECTORY_CHANNEL = "wallet_shards"
+NOTIFY_DIRECTORY = text(f"SELECT pg_notify('{DIRECTORY_CHANNEL}', :payload)")
+
+_wallets = DBWallet.__table__
+_operations = DBOperation.__table__
+_segments = DBLedgerSegment.__table__
+_directory = DBWalletShard.__table__
+# copied with the wallet as they are
+_wallet_rows = (
+    DBWalletBalance.__table__,
+    DBWalletDailyTotals.__table__,
+    DBWalletMonthlyTotals.__table__,
+)
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest())
+
+
+class HashRing:
+    def __init__(self, shards: Iterable[str], vnodes: int = VNODES) -> None:
+        self.shards = list(shards)
+        points = sorted(
+            (_hash(f"{shard}#{i}".encode()), shard)
+            for shard in self.shards
+            for i in range(vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, wallet_id: UUID) -> str:
+        # uuid7 ids start with a timestamp: hash them, the raw bits would
+        # put all wallets created around the same time on one shard
+        i = bisect.bisect(self._points, _hash(wallet_id.bytes))
+        return self._owners[i % len(self._owners)]
+
+
+async def _delete_copy(session: AsyncSession, wallet_id: UUID) -> None:
+    """Delete a wallet and everything moved with it from one shard."""
+    await session.execute(
+        delete(_operations).where(_operations.c.wallet_id == wallet_id)
+    )
+    await session.execute(delete(_segments).where(_segments.c.wallet_id == wallet_id))
+    for table in _wallet_rows:
+        await session.execute(delete(table).where(table.c.wallet_id == wallet_id))
+    await session.execute(delete(_wallets).where(_wallets.c.id == wallet_id))
+
+
+class ShardRouter:
+    """Routes wallets to shards.
+
+    Placements are cached while a connection to the main database listens
+    to the directory changes, every one of which notifies the processes in
+    its transaction. Without that connection every lookup reads the
+    directory.
+    """
+
+    def __init__(self, manager: DatabaseSessionManager = session_manager) -> None:
+        self.manager = manager
+        self._ring: HashRing | None = None
+        self._placements: OrderedDict[UUID, str] = OrderedDict()
+        # bumped by every invalidation: a lookup racing one is not cached
+        self._generation = 0
+        self._listener: asyncpg.Connection | None = None
+        self._listen_lock = asyncio.Lock()
+        self._listen_retry_at = 0.0
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.manager.shard_names) > 1
+
+    @property
+    def ring(self) -> HashRing:
+        shards = self.manager.shard_names
+        if self._ring is None or self._ring.shards != shards:
+            self._ring = HashRing(shards)
+            self._invalidate()
+        return self._ring
+
+    def _invalidate(self, wallet_id: UUID | None = None) -> None:
+        if wallet_id is None:
+            self._placements.clear()
+        else:
+            self._placements.pop(wallet_id, None)
+        self._generation += 1
+
+    def _on_directory_change(self, conn, pid, channel, payload: str) -> None:
+        self._invalidate(UUID(payload) if payload else None)
+
+    def _on_listener_lost(self, conn) -> None:
+        self._listener = None
+        self._invalidate()
+
+    async def _listen(self) -> bool:
+        """Subscribe to directory changes, unless already subscribed. False
+        while that fails: the cache must not be used then."""
+        if self._listener is not None:
+            return True
+        if time.monotonic() < self._listen_retry_at:
+            return False
+
+        async with self._listen_lock:
+            if self._listener is not None:
+                return True
+            url = self.manager.engine.url.set(drivername="postgresql")
+            try:
+                conn = await asyncpg.connect(url.render_as_string(hide_password=False))
+                await conn.add_listener(DIRECTORY_CHANNEL, self._on_directory_change)
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning(f"Shard directory cache disabled: {e}")
+                self._listen_retry_at = time.monotonic() + LISTEN_RETRY
+                return False
+            conn.add_termination_listener(self._on_listener_lost)
+            # changes made before the subscription went unheard
+            self._invalidate()
+            self._listener = conn
+        return True
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            await listener.close()
+        self._invalidate()
+
+    async def shard_for(self, wallet_id: UUID) -> str:
+        if not self.sharded:
+            return MAIN_SHARD
+
+        shard = self._placements.get(wallet_id)
+        if shard is not None:
+            self._placements.move_to_end(wallet_id)
+            return shard
+
+        cache = await self._listen()
+        generation = self._generation
+        async with self.manager.session(backend="orm") as session:
+            listed = await session.scalar(
+                select(_directory.c.shard).where(_directory.c.wallet_id == wallet_id)
+            )
+        shard = listed or self.ring.shard_for(wallet_id)
+
+        if cache and generation == self._generation:
+            self._placements[wallet_id] = shard
+            if len(self._placements) > DIRECTORY_CACHE:
+                self._placements.popitem(last=False)
+        return shard
+
+    async def _notify(self, session: AsyncSession, wallet_id: UUID | None) -> None:
+        await session.execute(
+            NOTIFY_DIRECTORY, {"payload": "" if wallet_id is None else str(wallet_id)}
+        )
+
+    async def _set_directory(self, wallet_id: UUID, shard: str) -> None:
+        async with self.manager.session(backend="orm") as session:
+            if shard == self.ring.shard_for(wallet_id):
+                await session.execute(
+                    delete(_directory).where(_directory.c.wallet_id == wallet_id)
+                )
+            else:
+                stmt = pg_insert(_directory).values(wallet_id=wallet_id, shard=shard)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[_directory.c.wallet_id],
+                        set_={"shard": stmt.excluded.shard},
+                    )
+                )
+            await self._notify(session, wallet_id)
+            await session.commit()
+        self._invalidate(wallet_id)
+
+    async def forget(self, wallet_ids: list[UUID]) -> None:
+        """Drop the directory entries of deleted wallets."""
+        if not self.sharded:
+            return
+        async with self.manager.session(backend="orm") as session:
+            await session.execute(
+                delete(_directory).where(_directory.c.wallet_id.in_(wallet_ids))
+            )
+            await self._notify(session, None)
+            await session.commit()
+        self._invalidate()
+
+    async def _drop_stale_copies(self, wallet_id: UUID, shard: str) -> None:
+        """Delete the copies of a wallet off ``shard``, where it lives, left
+        behind by an interrupted move."""
+        for other in self.manager.shard_names:
+            if other == shard:
+                continue
+            async with self.manager.session(backend="orm", shard=other) as session:
+                stale = await session.scalar(
+                    select(_wallets.c.id).where(_wallets.c.id == wallet_id)
+                )
+                if stale is None:
+                    continue
+                await _delete_copy(session, wallet_id)
+                await session.commit()
+            logger.info(f"Deleted the stale copy of wallet {wallet_id} on {other}")
+
+    async def move_wallet(self, wallet_id: UUID, target: str) -> bool:
+        """Move a wallet with its operations, its balances in other
+        currencies, the index of its archived operations and its rollups to
+        ``target``; segment files are shared by the shards. The rollups are
+        refolded to the target watermark.
+
+        The wallet row stays locked on the source shard until the copy is
+        committed on the target and the directory points there, so writes
+        racing the move wait and then fail with "wallet not found" rather
+        than land on the old copy. An interrupted move can be run again.
+        """
+        source = await self.shard_for(wallet_id)
+        if source == target:
+            # run again after the directory switched: the source is left
+            await self._drop_stale_copies(wallet_id, target)
+            return False
+
+        async with self.manager.session(backend="orm", shard=source) as src:
+            wallet = (
+                await src.execute(
+                    select(_wallets).where(_wallets.c.id == wallet_id).with_for_update()
+                )
+            ).first()
+            if wallet is None:
+                return False
+            segments = (
+                await src.execute(
+                    select(_segments).where(_segments.c.wallet_id == wallet_id)
+                )
+            ).mappings()
+            segments = [dict(segment) for segment in segments]
+            # no fold may run on either side until the move is committed
+            folded_to = await lock_watermark(src, "SHARE")
+            # balances in other currencies are updated without locking the
+            # wallet row
+            wallet_rows = []
+            for table in _wallet_rows:
+                rows = await src.execute(
+                    select(table)
+                    .where(table.c.wallet_id == wallet_id)
+                    .with_for_update()
+                )
+                wallet_rows.append([dict(row) for row in rows.mappings()])
+
+            async with self.manager.session(backend="orm", shard=target) as dst:
+                # left over by an interrupted move
+                await _delete_copy(dst, wallet_id)
+                await dst.execute(insert(_wallets).values(dict(wallet._mapping)))
+                await self._copy_operations(src, dst, wallet_id)
+                if segments:
+                    await dst.execute(insert(_segments), segments)
+                for table, rows in zip(_wallet_rows, wallet_rows, strict=True):
+                    if rows:
+                        await dst.execute(insert(table), rows)
+                await refold_wallet(
+                    dst, wallet_id, folded_to, await lock_watermark(dst, "SHARE")
+                )
+                await dst.commit()
+
+            await self._set_directory(wallet_id, target)
+
+            await _delete_copy(src, wallet_id)
+            await src.commit()
+
+        logger.info(f"Moved wallet {wallet_id} from {source} to {target}")
+        return True
+
+    @staticmethod
+    async def _copy_operations(
+        src: AsyncSession, dst: AsyncSession, wallet_id: UUID
+    ) -> None:
+        """Copy the ledger of a wallet ``MOVE_BATCH`` operations at a time,
+        oldest first, so that no more of it is held in memory."""
+        conn = await dst.connection()
+        months = set()
+        last = None
+        while True:
+            stmt = (
+                select(_operations)
+                .where(_operations.c.wallet_id == wallet_id)
+                .order_by(_operations.c.created_at, _operations.c.id)
+                .limit(MOVE_BATCH)
+            )
+            if last is not None:
+                stmt = stmt.where(
+                    tuple_(_operations.c.created_at, _operations.c.id) > last
+                )
+            operations = [dict(row) for row in (await src.execute(stmt)).mappings()]
+            if not operations:
+                return
+
+            for month in {month_start(op["created_at"].date()) for op in operations}:
+                if month not in months:
+                    await create_partitions(conn, months_ahead=0, today=month)
+                    months.add(month)
+            await dst.execute(insert(_operations), operations)
+            last = (operations[-1]["created_at"], operations[-1]["id"])
+
+    async def _wallet_ids(self, shard: str, batch: int) -> AsyncIterator[list[UUID]]:
+        last = None
+        while True:
+            stmt = select(_wallets.c.id).order_by(_wallets.c.id).limit(batch)
+            if last is not None:
+                stmt = stmt.where(_wallets.c.id > last)
+            async with self.manager.session(backend="orm", shard=shard) as session:
+                ids = list(await session.scalars(stmt))
+            if not ids:
+                return
+            yield ids
+            last = ids[-1]
+
+    async def _placed_elsewhere(self, shard: str, wallet_ids: list[UUID]) -> set[UUID]:
+        """Those of ``wallet_ids``, found on ``shard``, that the directory or
+        the ring place on another shard which has them too: stale copies of
+        an interrupted move."""
+        async with self.manager.session(backend="orm") as session:
+            listed = dict(
+                (
+                    await session.execute(
+                        select(_directory.c.wallet_id, _directory.c.shard).where(
+                            _directory.c.wallet_id.in_(wallet_ids)
+                        )
+                    )
+                ).all()
+            )
+
+        elsewhere = defaultdict(list)
+        for wallet_id in wallet_ids:
+            placed = listed.get(wallet_id) or self.ring.shard_for(wallet_id)
+            if placed != shard:
+                elsewhere[placed].append(wallet_id)
+
+        stale = set()
+        for other, ids in elsewhere.items():
+            async with self.manager.session(backend="orm", shard=other) as session:
+                stale.update(
+                    await session.scalars(
+                        select(_wallets.c.id).where(_wallets.c.id.in_(ids))
+                    )
+                )
+        return stale
+
+    async def pin(self, batch: int = 1000) -> int:
+        """List every wallet off its ring shard in the directory. Copies
+        left behind by an interrupted move are skipped, ``move`` deletes
+        them."""
+        pinned = 0
+        for shard in self.manager.shard_names:
+            async for ids in self._wallet_ids(shard, batch):
+                off_ring = [i for i in ids if self.ring.shard_for(i) != shard]
+                if not off_ring:
+                    continue
+                stale = await self._placed_elsewhere(shard, off_ring)
+                for wallet_id in stale:
+                    logger.warning(f"Stale copy of wallet {wallet_id} on {shard}")
+                rows = [
+                    {"wallet_id": wallet_id, "shard": shard}
+                    for wallet_id in off_ring
+                    if wallet_id not in stale
+                ]
+                if not rows:
+                    continue
+                async with self.manager.session(backend="orm") as session:
+                    stmt = pg_insert(_directory).values(rows)
+                    await session.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[_directory.c.wallet_id],
+                            set_={"shard": stmt.excluded.shard},
+                        )
+                    )
+                    await self._notify(session, None)
+                    await session.commit()
+                self._invalidate()
+                pinned += len(rows)
+
+        logger.info(f"Pinned {pinned} wallets")
+        return pinned
+
+    async def rebalance(self, limit: int | None = None) -> int:
+        """Move the wallets listed in the directory to their ring shard."""
+        stmt = select(_directory.c.wallet_id, _directory.c.shard)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        async with self.manager.session(backend="orm") as session:
+            listed = (await session.execute(stmt)).all()
+
+        moved = 0
+        for wallet_id, shard in listed:
+            target = self.ring.shard_for(wallet_id)
+            if shard == target:
+                await self._set_directory(wallet_id, target)
+            elif await self.move_wallet(wallet_id, target):
+                moved += 1
+
+        logger.info(f"Moved {moved} wallets")
+        return moved
+
+    async def status(self) -> dict[str, int]:
+        counts = {}
+        for shard in self.manager.shard_names:
+            async with self.manager.session(backend="orm", shard=shard) as session:
+                counts[shard] = await session.scalar(
+                    select(func.count()).select_from(_wallets)
+                )
+        return counts
+
+
+shard_router = ShardRouter()
+
+
+async def main(args: argparse.Namespace) -> None:
+    await session_manager.init_db()
+    try:
+        if args.command == "pin":
+            await shard_router.pin()
+        elif args.command == "rebalance":
+            await shard_router.rebalance(limit=args.limit)
+        elif args.command == "move":
+            await shard_router.move_wallet(args.wallet_id, args.shard)
+
+        for shard, count in (await shard_router.status()).items():
+            print(f"{shard:<16} {count:>12}")
+    finally:
+        await shard_router.close()
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage wallet shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="wallets per shard")
+    commands.add_parser("pin", help="list wallets off their ring shard")
+
+    rebalance = commands.add_parser("rebalance", help="move listed wallets")
+    rebalance.add_argument("--limit", type=int, default=None)
+
+    move = commands.add_parser("move", help="move one wallet")
+    move.add_argument("wallet_id", type=UUID)
+    move.add_argument("shard")
+
+    asyncio.run(main(parser.parse_args()))
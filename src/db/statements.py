@@ -0,0 +1,186 @@
+"""Database cost per DAO method, from pg_stat_statements.
+
+DAO methods prefix their SQL with a ``/* dao:Class.method */`` comment
+(``tagged`` in src.db.wrap). Two snapshots of pg_stat_statements taken
+around a workload are diffed and grouped by that comment. Statements are
+keyed by their normalized text without comments, so SQL shared by two
+methods is reported under the method that ran it first.
+
+uv run -m src.db.statements report
+uv run -m src.db.statements snapshot -o before.json
+uv run -m src.db.statements diff before.json
+uv run -m src.db.statements run -- uv run -m src.benchmarks.endpoints
+uv run -m src.db.statements reset
+"""
+
+import argparse
+import asyncio
+import re
+import subprocess
+from pathlib import Path
+from typing import NamedTuple
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.db.session import session_manager
+from src.db.wrap import TAG_PREFIX
+from src.models.dto import MethodStats
+
+UNTAGGED = "untagged"
+
+_TAG = re.compile(rf"^{re.escape(TAG_PREFIX)}([\w.]+) \*/")
+
+
+class StatementStats(NamedTuple):
+    query: str
+    calls: int
+    total_ms: float
+    rows: int
+
+
+# by pg_stat_statements queryid
+Snapshot = dict[int, StatementStats]
+
+
+async def ensure_extension(conn: AsyncConnection) -> None:
+    """The library is preloaded by the server (see docker/compose.infra.yml),
+    the extension still has to be created once per database."""
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_stat_statements"))
+
+
+async def take_snapshot(conn: AsyncConnection) -> Snapshot:
+    result = await conn.execute(
+        text(
+            "SELECT queryid, query, calls, total_exec_time, rows "
+            "FROM pg_stat_statements "
+            "WHERE dbid = (SELECT oid FROM pg_database "
+            "WHERE datname = current_database()) AND queryid IS NOT NULL"
+        )
+    )
+    snapshot: Snapshot = {}
+    for queryid, query, calls, total_ms, rows in result:
+        # the same statement shows up once per user and top-level flag
+        previous = snapshot.get(queryid)
+        if previous is not None:
+            calls += previous.calls
+            total_ms += previous.total_ms
+            rows += previous.rows
+        snapshot[queryid] = StatementStats(query, calls, total_ms, rows)
+    return snapshot
+
+
+async def reset(conn: AsyncConnection) -> None:
+    await conn.execute(text("SELECT pg_stat_statements_reset()"))
+
+
+def diff(before: Snapshot, after: Snapshot) -> Snapshot:
+    """What ran between two snapshots."""
+    changes: Snapshot = {}
+    for queryid, stats in after.items():
+        previous = before.get(queryid)
+        if previous is not None:
+            stats = StatementStats(
+                stats.query,
+                stats.calls - previous.calls,
+                stats.total_ms - previous.total_ms,
+                stats.rows - previous.rows,
+            )
+        if stats.calls > 0:
+            changes[queryid] = stats
+    return changes
+
+
+def method_of(query: str) -> str:
+    match = _TAG.match(query)
+    return UNTAGGED if match is None else match[1]
+
+
+def report(snapshot: Snapshot) -> list[MethodStats]:
+    """Calls, time and rows per DAO method, costliest first."""
+    totals: dict[str, list] = {}
+    for stats in snapshot.values():
+        total = totals.setdefault(method_of(stats.query), [0, 0.0, 0])
+        total[0] += stats.calls
+        total[1] += stats.total_ms
+        total[2] += stats.rows
+
+    methods = [
+        MethodStats(
+            method=method,
+            calls=calls,
+            total_ms=round(total_ms, 3),
+            mean_ms=round(total_ms / calls, 3),
+            rows=rows,
+        )
+        for method, (calls, total_ms, rows) in totals.items()
+    ]
+    return sorted(methods, key=lambda stats: stats.total_ms, reverse=True)
+
+
+def dump_snapshot(snapshot: Snapshot) -> bytes:
+    return orjson.dumps({str(queryid): stats for queryid, stats in snapshot.items()})
+
+
+def load_snapshot(data: bytes) -> Snapshot:
+    return {
+        int(queryid): StatementStats(*stats)
+        for queryid, stats in orjson.loads(data).items()
+    }
+
+
+def print_report(methods: list[MethodStats]) -> None:
+    print(f"{'method':<40} {'calls':>10} {'total ms':>12} {'mean ms':>10} {'rows':>10}")
+    for stats in methods:
+        print(
+            f"{stats.method:<40} {stats.calls:>10} {stats.total_ms:>12.1f}"
+            f" {stats.mean_ms:>10.3f} {stats.rows:>10}"
+        )
+
+
+async def _snapshot() -> Snapshot:
+    async with session_manager.engine.begin() as conn:
+        await ensure_extension(conn)
+        return await take_snapshot(conn)
+
+
+async def main(args: argparse.Namespace) -> None:
+    await session_manager.init_db()
+    try:
+        if args.command == "reset":
+            async with session_manager.engine.begin() as conn:
+                await ensure_extension(conn)
+                await reset(conn)
+        elif args.command == "report":
+            print_report(report(await _snapshot()))
+        elif args.command == "snapshot":
+            Path(args.output).write_bytes(dump_snapshot(await _snapshot()))
+        elif args.command == "diff":
+            before = load_snapshot(Path(args.snapshot).read_bytes())
+            print_report(report(diff(before, await _snapshot())))
+        elif args.command == "run":
+            before = await _snapshot()
+            await asyncio.to_thread(subprocess.run, args.workload, check=True)
+            print_report(report(diff(before, await _snapshot())))
+    finally:
+        await session_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pg_stat_statements per DAO method")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("report", help="totals since the last reset")
+    commands.add_parser("reset", help="reset pg_stat_statements")
+
+    snapshot = commands.add_parser("snapshot", help="save a snapshot to a file")
+    snapshot.add_argument("-o", "--output", required=True)
+
+    diff_parser = commands.add_parser("diff", help="report changes since a snapshot")
+    diff_parser.add_argument("snapshot")
+
+    run = commands.add_parser("run", help="report what a workload command ran")
+    run.add_argument("workload", nargs=argparse.REMAINDER)
+
+    asyncio.run(main(parser.parse_args()))
@@ -1,8 +1,11 @@
-from functools import wraps
+from contextvars import ContextVar
+from functools import lru_cache, wraps
 
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.config import config
+
 
 def transactional(func):
     @wraps(func)
@@ -17,3 +20,42 @@ def transactional(func):
             raise e
 
     return wrapper
+
+
+# DAO method running in the current task, tagged onto its SQL so that
+# pg_stat_statements can attribute cost per method (see src.db.statements)
+_dao_method: ContextVar[str | None] = ContextVar("dao_method", default=None)
+
+TAG_PREFIX = "/* dao:"
+
+
+def tagged(func):
+    name = func.__qualname__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _dao_method.set(name)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _dao_method.reset(token)
+
+    return wrapper
+
+
+@lru_cache(maxsize=512)
+def _tag(name: str, statement: str) -> str:
+    return f"{TAG_PREFIX}{name} */ {statement}"
+
+
+def tag_sql(statement: str) -> str:
+    """Prefix ``statement`` with the running DAO method as an SQL comment."""
+    name = _dao_method.get()
+    if name is None or not config.database.tag_statements:
+        return statement
+    return _tag(name, statement)
+
+
+def tag_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """``before_cursor_execute`` listener doing ``tag_sql`` for SQLAlchemy."""
+    return tag_sql(statement), parameters
@@ -0,0 +1,27 @@
+from src.config import config
+from src.db.session import session_manager
+
+from .scheduler import LeaderLock, Scheduler
+from .tasks import (
+    archive_ledger,
+    fold_rollups,
+    maintain_partitions,
+    purge_wallets,
+    reconcile_balances,
+)
+
+scheduler = Scheduler(config.jobs, LeaderLock(lambda: session_manager.engine))
+scheduler.add(
+    "partitions", maintain_partitions, interval=config.jobs.partitions_interval
+)
+scheduler.add(
+    "archive",
+    archive_ledger,
+    interval=config.jobs.archive_interval,
+    timeout=config.jobs.archive_timeout,
+)
+scheduler.add("reconcile", reconcile_balances, interval=config.jobs.reconcile_interval)
+scheduler.add("rollups", fold_rollups, interval=config.jobs.rollups_interval)
+scheduler.add("purge", purge_wallets, interval=config.jobs.purge_interval)
+
+__all__ = ["LeaderLock", "Scheduler", "scheduler"]
@@ -0,0 +1,266 @@
+"""In-process scheduler for periodic maintenance jobs.
+
+Every app worker runs a scheduler, only the leader runs jobs. The leader
+holds a session-level Postgres advisory lock on a connection of its own, the
+other workers try to take it over every ``election_interval`` seconds. A
+leader that dies or loses its connection drops the lock with it.
+
+Runs are spread by ``jitter`` (a fraction of the interval), at most
+``max_concurrency`` jobs run at a time and each run can have a timeout. On
+shutdown running jobs get ``shutdown_timeout`` seconds to finish before
+they are cancelled.
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.config import JobsConfig
+from src.models.dto import JobStats
+
+# "jobs" in ASCII, any bigint shared by all the workers would do
+LEADER_LOCK = 0x6A6F6273
+
+
+class LeaderLock:
+    def __init__(self, engine: Callable[[], AsyncEngine], key: int = LEADER_LOCK):
+        # called lazily, the engine is created in the app lifespan
+        self._engine = engine
+        self.key = key
+        self._conn: AsyncConnection | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._conn is not None
+
+    async def try_acquire(self) -> bool:
+        conn = await self._engine().connect()
+        try:
+            acquired = await conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+            )
+            # don't leave the connection idle in a transaction
+            await conn.commit()
+        except BaseException:
+            await conn.close()
+            raise
+
+        if not acquired:
+            await conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    async def check(self) -> bool:
+        """Whether the lock is still held, i.e. its connection is alive."""
+        if self._conn is None:
+            return False
+        try:
+            await self._conn.execute(text("SELECT 1"))
+            await self._conn.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"Leader lock connection lost: {e}")
+            await self._drop()
+            return False
+
+    async def release(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            await self._conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": self.key}
+            )
+            await self._conn.commit()
+        except Exception as e:
+            # the lock goes with the connection anyway
+            logger.warning(f"Leader lock release failed: {e}")
+        await self._drop()
+
+    async def _drop(self) -> None:
+        conn, self._conn = self._conn, None
+        try:
+            await conn.close()
+        except Exception:
+            await conn.invalidate()
+
+
+class Job:
+    __slots__ = (
+        "failures",
+        "func",
+        "interval",
+        "last_error",
+        "last_seconds",
+        "last_started_at",
+        "max_seconds",
+        "name",
+        "running",
+        "runs",
+        "skipped",
+        "timeout",
+        "timeouts",
+        "total_seconds",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[object]],
+        interval: float,
+        timeout: float | None = None,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        # ticks that found the job still running from the previous one
+        self.skipped = 0
+        self.running = False
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds: float | None = None
+        self.last_started_at: float | None = None
+        self.last_error: str | None = None
+
+    def stats(self) -> JobStats:
+        return JobStats(
+            name=self.name,
+            interval=self.interval,
+            runs=self.runs,
+            failures=self.failures,
+            timeouts=self.timeouts,
+            skipped=self.skipped,
+            running=self.running,
+            mean_seconds=round(self.total_seconds / self.runs, 6) if self.runs else 0,
+            max_seconds=round(self.max_seconds, 6),
+            last_seconds=self.last_seconds,
+            last_started_at=self.last_started_at,
+            last_error=self.last_error,
+        )
+
+
+class Scheduler:
+    def __init__(self, settings: JobsConfig, lock: LeaderLock) -> None:
+        self.settings = settings
+        self.lock = lock
+        self.jobs: dict[str, Job] = {}
+        self._slots = asyncio.Semaphore(settings.max_concurrency)
+        self._stopping = asyncio.Event()
+        self._loops: list[asyncio.Task] = []
+        self._runs: set[asyncio.Task] = set()
+
+    @property
+    def leader(self) -> bool:
+        return self.lock.held
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[object]],
+        interval: float | None,
+        timeout: float | None = None,
+    ) -> None:
+        """Register a job; an interval of ``None`` leaves it disabled."""
+        if interval is not None:
+            self.jobs[name] = Job(name, func, interval, timeout)
+
+    def stats(self) -> list[JobStats]:
+        return [job.stats() for job in self.jobs.values()]
+
+    async def start(self) -> None:
+        if self._loops:
+            return
+        self._stopping.clear()
+        self._loops.append(asyncio.create_task(self._election_loop()))
+        for job in self.jobs.values():
+            self._loops.append(asyncio.create_task(self._job_loop(job)))
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        for task in self._loops:
+            task.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops.clear()
+
+        if self._runs:
+            _, pending = await asyncio.wait(
+                self._runs, timeout=self.settings.shutdown_timeout
+            )
+            for task in pending:
+                logger.warning(f"Cancelling job {task.get_name()} on shutdown")
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        await self.lock.release()
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Sleep unless stopping; returns whether the scheduler is stopping."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except TimeoutError:
+            return False
+        return True
+
+    def _jittered(self, interval: float) -> float:
+        spread = interval * self.settings.jitter
+        return max(interval + random.uniform(-spread, spread), 0)
+
+    async def _election_loop(self) -> None:
+        while True:
+            try:
+                if self.lock.held:
+                    await self.lock.check()
+                elif await self.lock.try_acquire():
+                    logger.info("Elected job scheduler leader")
+            except Exception as e:
+                logger.warning(f"Leader election failed: {e}")
+            if await self._sleep(self._jittered(self.settings.election_interval)):
+                return
+
+    async def _job_loop(self, job: Job) -> None:
+        while not await self._sleep(self._jittered(job.interval)):
+            if not self.lock.held:
+                continue
+            if job.running:
+                job.skipped += 1
+                continue
+            # the run is tracked apart from the loop, so stop() can let it
+            # finish while the loop itself is cancelled
+            job.running = True
+            task = asyncio.create_task(self._run(job), name=job.name)
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+
+    async def _run(self, job: Job) -> None:
+        try:
+            async with self._slots:
+                job.last_started_at = time.time()
+                start = time.perf_counter()
+                try:
+                    await asyncio.wait_for(job.func(), timeout=job.timeout)
+                    job.last_error = None
+                except TimeoutError:
+                    job.timeouts += 1
+                    job.last_error = f"timed out after {job.timeout}s"
+                    logger.warning(f"Job {job.name} timed out after {job.timeout}s")
+                except Exception as e:
+                    job.failures += 1
+                    job.last_error = repr(e)
+                    logger.exception(f"Job {job.name} failed: {e}")
+                finally:
+                    elapsed = time.perf_counter() - start
+                    job.runs += 1
+                    job.total_seconds += elapsed
+                    job.max_seconds = max(job.max_seconds, elapsed)
+                    job.last_seconds = round(elapsed, 6)
+        finally:
+            job.running = False
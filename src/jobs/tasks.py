@@ -0,0 +1,140 @@
+"""Maintenance jobs run by the scheduler.
+
+Leadership can change hands in the middle of a run, so every job has to be
+safe to run twice at once.
+"""
+
+from uuid import UUID
+
+from loguru import logger
+from sqlalchemy import TextClause, text
+
+from src.db.archive import archive_operations, default_horizon
+from src.db.models import DEFAULT_CURRENCY
+from src.db.partitions import (
+    ARCHIVE_SCHEMA,
+    check_partitions,
+    create_partitions,
+    list_detached,
+)
+from src.db.purge import purge_closed_wallets
+from src.db.rollups import fold_operations
+from src.db.session import session_manager
+
+RECONCILE_BATCH = 1000
+
+# the operations of a wallet in its currency, in a table of them
+_LEDGER = (
+    "coalesce((SELECT sum(CASE WHEN o.op_type = 'withdraw' "
+    "THEN -o.amount ELSE o.amount END) FROM {table} o "
+    "WHERE o.wallet_id = w.wallet_id AND {currency}), 0)"
+)
+
+# partitions detached to the archive schema with a currency column, those
+# detached before currencies hold operations in the default one
+DETACHED_CURRENCY = text(
+    "SELECT table_name FROM information_schema.columns "
+    "WHERE table_schema = :schema AND column_name = 'currency'"
+)
+
+
+def reconcile_statement(detached: dict[str, bool]) -> TextClause:
+    """Every balance of a batch of wallets, the one on the wallet row and the
+    other currencies, against the archived totals plus the ledger in its
+    currency: the hot one and that of ``detached`` partitions, by name, true
+    for those with a currency column."""
+    ledgers = [_LEDGER.format(table="operations", currency="o.currency = w.currency")]
+    for name, has_currency in detached.items():
+        currency = (
+            "o.currency = w.currency"
+            if has_currency
+            else "w.currency = CAST(:currency AS varchar)"
+        )
+        ledgers.append(
+            _LEDGER.format(table=f"{ARCHIVE_SCHEMA}.{name}", currency=currency)
+        )
+
+    return text(
+        "WITH batch AS (SELECT id, balance FROM wallets "
+        "WHERE id > coalesce(CAST(:after AS uuid), "
+        "'00000000-0000-0000-0000-000000000000') "
+        "ORDER BY id LIMIT :limit), "
+        "balances AS (SELECT id AS wallet_id, CAST(:currency AS varchar) AS currency, "
+        "balance FROM batch "
+        "UNION ALL SELECT b.wallet_id, b.currency, b.balance FROM wallet_balances b "
+        "JOIN batch ON b.wallet_id = batch.id) "
+        "SELECT w.wallet_id, w.currency, w.balance, "
+        "coalesce((SELECT sum(s.total) FROM ledger_segments s "
+        "WHERE s.wallet_id = w.wallet_id AND s.currency = w.currency), 0) "
+        f"+ {' + '.join(ledgers)} AS ledger "
+        "FROM balances w ORDER BY w.wallet_id"
+    )
+
+
+async def maintain_partitions() -> None:
+    for shard in session_manager.shard_names:
+        async with session_manager.shard_engine(shard).begin() as conn:
+            await create_partitions(conn)
+            await check_partitions(conn)
+
+
+async def archive_ledger() -> None:
+    older_than = default_horizon()
+    for shard in session_manager.shard_names:
+        await archive_operations(
+            session_manager.shard_engine(shard), older_than=older_than
+        )
+
+
+async def fold_rollups() -> int:
+    folded = 0
+    for shard in session_manager.shard_names:
+        folded += await fold_operations(session_manager.shard_engine(shard))
+    return folded
+
+
+async def purge_wallets() -> int:
+    purged = 0
+    for shard in session_manager.shard_names:
+        purged += await purge_closed_wallets(session_manager.shard_engine(shard))
+    return purged
+
+
+async def reconcile_balances() -> int:
+    """Log the wallets whose balance is off their ledger, in batches of
+    wallets."""
+    mismatched = 0
+    for shard in session_manager.shard_names:
+        engine = session_manager.shard_engine(shard)
+        async with engine.connect() as conn:
+            with_currency = set(
+                await conn.scalars(DETACHED_CURRENCY, {"schema": ARCHIVE_SCHEMA})
+            )
+            statement = reconcile_statement(
+                {name: name in with_currency for name in await list_detached(conn)}
+            )
+
+        after: UUID | None = None
+        while True:
+            async with engine.connect() as conn:
+                rows = (
+                    await conn.execute(
+                        statement,
+                        {
+                            "after": after,
+                            "limit": RECONCILE_BATCH,
+                            "currency": DEFAULT_CURRENCY,
+                        },
+                    )
+                ).all()
+            if not rows:
+                break
+            for wallet_id, currency, balance, ledger in rows:
+                if balance != ledger:
+                    mismatched += 1
+                    logger.warning(
+                        f"Wallet {wallet_id} on {shard}: "
+                        f"{currency} balance {balance}, ledger {ledger}"
+                    )
+            after = rows[-1][0]
+    return mismatched
@@ -1,42 +1,72 @@
 from contextlib import asynccontextmanager
 from typing import Any
 
-import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
-from src.api import wallets_router
-from src.config import config
+from src.api import admin_router, health_router, wallet_not_found, wallets_router
+from src.api.admission import AdmissionMiddleware, admission
+from src.api.deadline import DeadlineMiddleware
+from src.api.health import health_monitor
+from src.config import config, secrets
+from src.db.partitions import check_partitions, create_partitions
 from src.db.session import session_manager
+from src.db.shards import shard_router
+from src.exceptions.wallets import WalletNotFoundError
+from src.jobs import scheduler
+from src.profiling import loop_watchdog
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> Any:
     await session_manager.init_db(run_migrations=True)
+    for shard in session_manager.shard_names:
+        async with session_manager.shard_engine(shard).begin() as conn:
+            await create_partitions(conn)
+            await check_partitions(conn)
+    await admission.start()
+    await health_monitor.start()
+    if config.jobs.enabled:
+        await scheduler.start()
+    if config.profiling.watchdog:
+        await loop_watchdog.start()
     yield
+    await loop_watchdog.stop()
+    await scheduler.stop()
+    await health_monitor.stop()
+    await admission.stop()
+    await shard_router.close()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_exception_handler(WalletNotFoundError, wallet_not_found)
 
+# added first, so CORS wraps it and rejections still carry CORS headers
+if config.admission.enabled:
+    app.add_middleware(AdmissionMiddleware)
+# wraps admission, so the time a request queues counts against its deadline
+app.add_middleware(DeadlineMiddleware)
+if config.cors_allow_origins:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=config.cors_allow_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=[""],
+    )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=config.cors_allow_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=[""],
-)
 
+# unversioned, for load balancers and the docker healthcheck
+app.include_router(health_router, prefix="/api")
 
 prefix = "/api/v1"
 app.include_router(wallets_router, prefix=prefix)
+if secrets.admin_token is not None:
+    app.include_router(admin_router, prefix=prefix)
 
 
 if __name__ == "__main__":
-    uvicorn.run(
-        app="src.main:app",
-        host=config.uvicorn.host,
-        port=config.uvicorn.port,
-        workers=config.uvicorn.workers,
-        reload=config.uvicorn.reload,
-    )
+    from src.server import serve
+
+    serve(config.uvicorn)
@@ -1,8 +1,12 @@
+from collections.abc import Iterable
+from datetime import date, datetime
+from typing import NamedTuple
 from uuid import UUID
 
+import orjson
 from pydantic import BaseModel
 
-from src.db.models import DBOperation, OperationType
+from src.db.models import DEFAULT_CURRENCY, DBOperation, OperationType, TotalsPeriod
 
 
 class Operation(BaseModel):
@@ -10,17 +14,153 @@ class Operation(BaseModel):
     wallet_id: UUID
     op_type: OperationType
     amount: int
+    currency: str
+    created_at: datetime
 
     @classmethod
-    def from_db(cls, db_op: DBOperation) -> "Operation":
+    def from_db(cls, db_op: "DBOperation | OperationRow") -> "Operation":
         return cls(
             id=db_op.id,
             wallet_id=db_op.wallet_id,
             op_type=db_op.op_type,
             amount=db_op.amount,
+            currency=db_op.currency,
+            created_at=db_op.created_at,
         )
 
 
 class Wallet(BaseModel):
     id: UUID
     operations: list[Operation]
+
+
+class WalletCreated(BaseModel):
+    id: UUID
+
+
+class WalletBalance(BaseModel):
+    id: UUID
+    balance: int
+
+
+class WalletBalances(BaseModel):
+    id: UUID
+    # by currency, the default currency first
+    balances: dict[str, int]
+
+
+class Transfer(BaseModel):
+    debit: Operation
+    credit: Operation
+
+
+class PeriodTotals(BaseModel):
+    # first day of the period, in the service time zone
+    period: date
+    currency: str
+    deposits: int
+    withdrawals: int
+    deposit_count: int
+    withdraw_count: int
+
+
+class WalletTotals(BaseModel):
+    id: UUID
+    period: TotalsPeriod
+    totals: list[PeriodTotals]
+
+
+class OperationPage(BaseModel):
+    operations: list[Operation]
+
+
+class MethodStats(BaseModel):
+    """Database cost of one DAO method, from pg_stat_statements."""
+
+    method: str
+    calls: int
+    total_ms: float
+    mean_ms: float
+    rows: int
+
+
+class JobStats(BaseModel):
+    """Timings of a background job in this worker, see src.jobs."""
+
+    name: str
+    interval: float
+    runs: int
+    failures: int
+    timeouts: int
+    skipped: int
+    running: bool
+    mean_seconds: float
+    max_seconds: float
+    last_seconds: float | None
+    # unix time
+    last_started_at: float | None
+    last_error: str | None
+
+
+class JobsReport(BaseModel):
+    leader: bool
+    jobs: list[JobStats]
+
+
+class RetryStats(BaseModel):
+    """Transaction retries in this worker, see src.db.retry."""
+
+    calls: int
+    retries: int
+    recovered: int
+    exhausted: int
+    by_sqlstate: dict[str, int]
+    by_method: dict[str, int]
+
+
+class WalletRow(NamedTuple):
+    """Plain wallet row returned by the non-ORM DAO backends."""
+
+    id: UUID
+    balance: int
+    version: int
+
+
+class TransferOrder(NamedTuple):
+    from_wallet_id: UUID
+    to_wallet_id: UUID
+    amount: int
+
+
+class OperationRow(NamedTuple):
+    """Plain operation row returned by the non-ORM DAO backends."""
+
+    id: UUID
+    wallet_id: UUID
+    op_type: OperationType
+    amount: int
+    created_at: datetime
+    currency: str = DEFAULT_CURRENCY
+
+
+def dump_operation_page(rows: Iterable["DBOperation | OperationRow"]) -> bytes:
+    """Serialize trusted DB rows straight to ``OperationPage`` JSON.
+
+    Bypasses per-row model construction and response validation; orjson
+    encodes UUID, datetime and str enums natively.
+    """
+    return orjson.dumps(
+        {
+            "operations": [
+                {
+                    "id": row.id,
+                    "wallet_id": row.wallet_id,
+                    "op_type": row.op_type,
+                    "amount": row.amount,
+                    "currency": row.currency,
+                    "created_at": row.created_at,
+                }
+                for row in rows
+            ]
+        }
+    )
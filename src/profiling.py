@@ -0,0 +1,156 @@
+"""Sampling profiler and slow callback detector for live workers.
+
+``sample`` takes stack samples of the event loop thread from a thread of its
+own, every ``interval`` seconds, and returns them in the collapsed format of
+flamegraph.pl and speedscope: one ``root;...;leaf count`` line per distinct
+stack. Samples with the loop waiting for I/O are left out unless asked for,
+so the flame graph shows where the CPU went.
+
+``LoopWatchdog`` notices a loop that stopped running callbacks: a heartbeat
+coroutine ticks every ``interval``, and when a tick is more than
+``threshold`` late a watchdog thread takes the stack of the loop thread,
+which is the code blocking it (sync I/O, a slow log sink, a long
+computation). The stall is logged with that stack once the loop is back.
+Both work with uvloop, whose callbacks asyncio's debug mode cannot time.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from types import CodeType, FrameType
+
+from loguru import logger
+
+from src.config import config
+
+# leaf frames of a loop waiting for I/O: the selector of the asyncio loop, or
+# the Python frame that entered the uvloop loop
+_IDLE_FILES = ("selectors.py", os.path.join("asyncio", "runners.py"))
+
+
+@lru_cache(maxsize=4096)
+def _frame_name(code: CodeType) -> str:
+    filename = code.co_filename
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path + os.sep):
+            filename = filename[len(path) + 1 :]
+            break
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+def _stack(frame: FrameType | None) -> tuple[CodeType, ...]:
+    """Code objects from the innermost frame out."""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return tuple(codes)
+
+
+def _idle(stack: tuple[CodeType, ...]) -> bool:
+    return bool(stack) and stack[0].co_filename.endswith(_IDLE_FILES)
+
+
+def collapse(samples: Counter[tuple[CodeType, ...]]) -> str:
+    lines = [
+        ";".join(_frame_name(code) for code in reversed(stack)) + f" {count}"
+        for stack, count in samples.most_common()
+    ]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+async def sample(seconds: float, interval: float, idle: bool = False) -> str:
+    """Collapsed stacks of the thread running the current event loop."""
+    thread_id = threading.get_ident()
+    samples: Counter[tuple[CodeType, ...]] = Counter()
+    stop = threading.Event()
+
+    def sampler() -> None:
+        while not stop.wait(interval):
+            stack = _stack(sys._current_frames().get(thread_id))
+            if idle or not _idle(stack):
+                samples[stack] += 1
+
+    thread = threading.Thread(target=sampler, name="profiler", daemon=True)
+    thread.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stop.set()
+        await asyncio.to_thread(thread.join)
+
+    return collapse(samples)
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float, interval: float | None = None) -> None:
+        self.threshold = threshold
+        self.interval = interval or threshold / 2
+        self.stalls = 0
+        self.max_stall = 0.0
+        self._beat = 0.0
+        # stack of the loop thread caught during the current stall
+        self._where: str | None = None
+        self._thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "max_stall_ms": round(self.max_stall * 1000, 3),
+        }
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            stall = now - self._beat - self.interval
+            self._beat = now
+            if stall > self.threshold:
+                self._report(stall)
+
+    def _report(self, stall: float) -> None:
+        self.stalls += 1
+        self.max_stall = max(self.max_stall, stall)
+        where, self._where = self._where, None
+        logger.warning(
+            f"Event loop blocked for {stall * 1000:.0f} ms in:\n"
+            f"{where or '  (not caught in the act)'}"
+        )
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            late = time.monotonic() - self._beat - self.interval
+            if late > self.threshold and self._where is None:
+                frame = sys._current_frames().get(self._thread_id)
+                lines = []
+                while frame is not None:
+                    lines.append(f"  {_frame_name(frame.f_code)} line {frame.f_lineno}")
+                    frame = frame.f_back
+                # most recent call last, like a traceback
+                self._where = "\n".join(reversed(lines))
+
+
+loop_watchdog = LoopWatchdog(threshold=config.profiling.slow_callback)
@@ -0,0 +1,81 @@
+"""Serving the app: uvicorn on its own, or uvicorn workers under gunicorn.
+
+``uvicorn`` is the default process manager. ``gunicorn`` runs the same
+workers (``uvicorn-worker``) under the gunicorn arbiter, which restarts
+crashed workers, recycles them after ``max_requests`` and stops them within
+``graceful_timeout``.
+"""
+
+from typing import Any, ClassVar
+
+import uvicorn
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+
+from src.config import UvicornConfig, config
+
+APP = "src.main:app"
+
+
+def uvicorn_kwargs(settings: UvicornConfig) -> dict[str, Any]:
+    """Worker settings shared by both process managers."""
+    return {
+        "loop": settings.loop,
+        "http": settings.http,
+        "backlog": settings.backlog,
+        "timeout_keep_alive": settings.timeout_keep_alive,
+        "limit_concurrency": settings.limit_concurrency,
+        "access_log": settings.access_log,
+    }
+
+
+class Worker(UvicornWorker):
+    # set by GunicornApplication before the workers are forked
+    CONFIG_KWARGS: ClassVar[dict[str, Any]] = {}
+
+
+class GunicornApplication(BaseApplication):
+    def __init__(self, settings: UvicornConfig, app: str = APP) -> None:
+        self.settings = settings
+        self.app = app
+        super().__init__()
+
+    def load_config(self) -> None:
+        settings = self.settings
+        # gunicorn hands the workers bind, backlog and keep-alive itself
+        Worker.CONFIG_KWARGS = {
+            key: value
+            for key, value in uvicorn_kwargs(settings).items()
+            if key not in ("backlog", "timeout_keep_alive")
+        }
+        for key, value in {
+            "bind": f"{settings.host}:{settings.port}",
+            "workers": settings.workers,
+            "worker_class": f"{__name__}.Worker",
+            "backlog": settings.backlog,
+            "keepalive": settings.timeout_keep_alive,
+            "max_requests": settings.max_requests,
+            "max_requests_jitter": settings.max_requests_jitter,
+            "graceful_timeout": settings.graceful_timeout,
+            "reload": settings.reload,
+        }.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Any:
+        module, name = self.app.split(":")
+        return getattr(__import__(module, fromlist=[name]), name)
+
+
+def serve(settings: UvicornConfig = config.uvicorn, app: str = APP) -> None:
+    if settings.process_manager == "gunicorn":
+        GunicornApplication(settings, app).run()
+        return
+
+    uvicorn.run(
+        app=app,
+        host=settings.host,
+        port=settings.port,
+        workers=settings.workers,
+        reload=settings.reload,
+        **uvicorn_kwargs(settings),
+    )
@@ -0,0 +1,177 @@
+"""In-process balance cache for the busiest wallets.
+
+Entries live in flat arrays indexed by a slot number, with the LRU order
+kept as an intrusive doubly linked list of slots: an entry costs a dict
+slot, the int key and a few array cells instead of an ORM ``DBWallet`` with
+its instance state and identity map entry (see src.benchmarks.hot_wallets).
+
+Every balance update returns the new wallet ``version``. An update that
+does not land on the cached version + 1 means someone else wrote to the
+wallet in between, so the cached balance was stale: it is counted and
+replaced. The cache is authoritative only as long as a wallet is written by
+a single process, e.g. with per-wallet routing in front of the workers.
+"""
+
+from array import array
+from uuid import UUID
+
+from src.config import config
+
+# bytes per entry at 1M entries, measured by src.benchmarks.hot_wallets
+ENTRY_BYTES = 104
+
+_NONE = -1
+
+
+class HotWalletCache:
+    __slots__ = (
+        "_balances",
+        "_free",
+        "_head",
+        "_keys",
+        "_next",
+        "_prev",
+        "_slots",
+        "_tail",
+        "_versions",
+        "capacity",
+        "evictions",
+        "hits",
+        "misses",
+        "stale",
+    )
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        # UUID.int -> slot
+        self._slots: dict[int, int] = {}
+        # per slot
+        self._keys: list[int | None] = []
+        self._balances = array("q")
+        self._versions = array("q")
+        self._prev = array("i")
+        self._next = array("i")
+        # most and least recently used slots
+        self._head = _NONE
+        self._tail = _NONE
+        self._free: list[int] = []
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @classmethod
+    def with_memory_cap(cls, megabytes: float) -> "HotWalletCache":
+        return cls(capacity=max(int(megabytes * 2**20 // ENTRY_BYTES), 1))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, wallet_id: UUID) -> bool:
+        return wallet_id.int in self._slots
+
+    def get(self, wallet_id: UUID) -> int | None:
+        """Cached balance of the wallet, or None."""
+        slot = self._slots.get(wallet_id.int)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(slot)
+        return self._balances[slot]
+
+    def version(self, wallet_id: UUID) -> int | None:
+        slot = self._slots.get(wallet_id.int)
+        return None if slot is None else self._versions[slot]
+
+    def store(self, wallet_id: UUID, balance: int, version: int) -> None:
+        """Cache a balance read from the database. A read that raced a newer
+        write never replaces it."""
+        key = wallet_id.int
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._allocate(key)
+        elif version < self._versions[slot]:
+            return
+        else:
+            self._touch(slot)
+        self._balances[slot] = balance
+        self._versions[slot] = version
+
+    def applied(self, wallet_id: UUID, balance: int, version: int) -> None:
+        """Record the balance and version returned by a balance update."""
+        slot = self._slots.get(wallet_id.int)
+        if slot is not None and version != self._versions[slot] + 1:
+            self.stale += 1
+        self.store(wallet_id, balance, version)
+
+    def invalidate(self, wallet_id: UUID) -> None:
+        slot = self._slots.pop(wallet_id.int, None)
+        if slot is not None:
+            self._unlink(slot)
+            self._keys[slot] = None
+            self._free.append(slot)
+
+    def clear(self) -> None:
+        self.__init__(self.capacity)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+        }
+
+    def _allocate(self, key: int) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._keys[slot] = key
+        elif len(self._keys) < self.capacity:
+            slot = len(self._keys)
+            self._keys.append(key)
+            self._balances.append(0)
+            self._versions.append(0)
+            self._prev.append(_NONE)
+            self._next.append(_NONE)
+        else:
+            # reuse the least recently used slot
+            slot = self._tail
+            self._unlink(slot)
+            del self._slots[self._keys[slot]]
+            self._keys[slot] = key
+            self.evictions += 1
+
+        self._slots[key] = slot
+        self._push_front(slot)
+        return slot
+
+    def _touch(self, slot: int) -> None:
+        if slot != self._head:
+            self._unlink(slot)
+            self._push_front(slot)
+
+    def _push_front(self, slot: int) -> None:
+        self._prev[slot] = _NONE
+        self._next[slot] = self._head
+        if self._head != _NONE:
+            self._prev[self._head] = slot
+        self._head = slot
+        if self._tail == _NONE:
+            self._tail = slot
+
+    def _unlink(self, slot: int) -> None:
+        prev, next_ = self._prev[slot], self._next[slot]
+        if prev != _NONE:
+            self._next[prev] = next_
+        else:
+            self._head = next_
+        if next_ != _NONE:
+            self._prev[next_] = prev
+        else:
+            self._tail = prev
+
+
+hot_wallets = HotWalletCache.with_memory_cap(config.hot_wallets.max_memory_mb)
@@ -1,10 +1,9 @@
 from uuid import UUID
 
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.dao import DaoOperation
-from src.db.models import OperationType
+from src.db.models import DEFAULT_CURRENCY, OperationType
+from src.db.repository import INTEGRITY_ERRORS, get_repository
 from src.exceptions.wallets import WalletNotFoundError
 from src.models.dto import Operation
 
@@ -12,13 +11,22 @@ from src.models.dto import Operation
 class OperationService:
     @classmethod
     async def add_operation(
-        cls, session: AsyncSession, wallet_id: UUID, op_type: OperationType, amount: int
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
     ) -> Operation:
         try:
-            db_op = await DaoOperation.add_operation(
-                session=session, wallet_id=wallet_id, op_type=op_type, amount=amount
+            db_op = await get_repository().operations.add_operation(
+                session=session,
+                wallet_id=wallet_id,
+                op_type=op_type,
+                amount=amount,
+                currency=currency,
             )
-        except IntegrityError as e:
+        except INTEGRITY_ERRORS as e:
             raise WalletNotFoundError(wallet_id=wallet_id) from e
 
         return Operation.from_db(db_op)
@@ -0,0 +1,71 @@
+from collections.abc import Sequence
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import config
+from src.db.models import OperationType
+from src.db.repository import get_repository
+from src.db.retry import retrying
+from src.models.dto import Operation, Transfer, TransferOrder
+from src.services.hot_wallets import hot_wallets
+
+
+def net_transfers(
+    transfers: Sequence[TransferOrder],
+) -> tuple[list[tuple[UUID, int]], list[tuple[UUID, OperationType, int]]]:
+    """Net balance change per wallet, in lock order, and the ledger legs:
+    a withdraw from the payer and a deposit to the payee per transfer."""
+    deltas: dict[UUID, int] = {}
+    legs = []
+    for from_wallet_id, to_wallet_id, amount in transfers:
+        if amount <= 0:
+            raise ValueError(f"Transfer amount must be positive, got {amount}")
+        if from_wallet_id == to_wallet_id:
+            raise ValueError(f"Transfer from wallet {from_wallet_id} to itself")
+        deltas[from_wallet_id] = deltas.get(from_wallet_id, 0) - amount
+        deltas[to_wallet_id] = deltas.get(to_wallet_id, 0) + amount
+        legs.append((from_wallet_id, OperationType.withdraw, amount))
+        legs.append((to_wallet_id, OperationType.deposit, amount))
+
+    return sorted(deltas.items()), legs
+
+
+class TransferService:
+    @classmethod
+    async def transfer(
+        cls,
+        session: AsyncSession,
+        from_wallet_id: UUID,
+        to_wallet_id: UUID,
+        amount: int,
+    ) -> Transfer:
+        debit, credit = await cls.transfer_batch(
+            session=session,
+            transfers=[TransferOrder(from_wallet_id, to_wallet_id, amount)],
+        )
+
+        return Transfer(debit=debit, credit=credit)
+
+    @classmethod
+    @retrying
+    async def transfer_batch(
+        cls, session: AsyncSession, transfers: Sequence[TransferOrder]
+    ) -> list[Operation]:
+        """Run transfers all or nothing in one transaction, with one balance
+        update per wallet for the net of its transfers. Every transfer still
+        gets its own two ledger rows, returned debit first.
+
+        Raises ``WalletNotFoundError`` or ``InsufficientFundsError`` for the
+        first offending wallet, when nothing is applied.
+        """
+        deltas, legs = net_transfers(transfers)
+
+        wallets, operations = await get_repository().wallets.transfer(
+            session=session, deltas=deltas, legs=legs
+        )
+
+        if config.hot_wallets.enabled:
+            for wallet in wallets:
+                hot_wallets.applied(wallet.id, wallet.balance, wallet.version)
+        return [Operation.from_db(operation) for operation in operations]
@@ -1,56 +1,195 @@
+from datetime import date, datetime
 from uuid import UUID
 
-from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.db.dao import DaoWallet
-from src.db.models import OperationType
+from src.config import config
+from src.db.archive import list_archived_operations
+from src.db.models import (
+    DEFAULT_CURRENCY,
+    DBOperation,
+    OperationType,
+    TotalsPeriod,
+)
+from src.db.repository import INTEGRITY_ERRORS, get_repository
+from src.db.retry import retrying
+from src.db.rollups import list_totals
 from src.exceptions.wallets import WalletNotFoundError
-from src.models.dto import Operation
-from src.services.operations import OperationService
+from src.models.dto import Operation, OperationRow, PeriodTotals
+from src.services.hot_wallets import hot_wallets
 
 
 class WalletService:
     @classmethod
-    async def create_wallet(cls, session: AsyncSession, balance: int = 0) -> UUID:
-        db_wallet = await DaoWallet.create_wallet(session=session, balance=balance)
+    async def create_wallet(
+        cls, session: AsyncSession, balance: int = 0, wallet_id: UUID | None = None
+    ) -> UUID:
+        db_wallet = await get_repository().wallets.create_wallet(
+            session=session, balance=balance, wallet_id=wallet_id
+        )
 
         return db_wallet.id
 
     @classmethod
     async def get_balance(cls, session: AsyncSession, wallet_id: UUID) -> int:
-        db_wallet = await DaoWallet.get_wallet(session=session, wallet_id=wallet_id)
+        if config.hot_wallets.enabled:
+            balance = hot_wallets.get(wallet_id)
+            if balance is not None:
+                return balance
+
+        db_wallet = await get_repository().wallets.get_wallet(
+            session=session, wallet_id=wallet_id
+        )
 
         if db_wallet is None:
             raise WalletNotFoundError(wallet_id=wallet_id)
 
+        if config.hot_wallets.enabled:
+            hot_wallets.store(wallet_id, db_wallet.balance, db_wallet.version)
         return db_wallet.balance
 
     @classmethod
+    async def get_balances(
+        cls, session: AsyncSession, wallet_id: UUID
+    ) -> dict[str, int]:
+        """Balance per currency the wallet has had operations in, the
+        default currency first."""
+        balances = await get_repository().wallets.get_balances(
+            session=session, wallet_id=wallet_id
+        )
+
+        # an open wallet always has its default currency balance
+        if not any(currency == DEFAULT_CURRENCY for currency, _ in balances):
+            raise WalletNotFoundError(wallet_id=wallet_id)
+
+        return dict(
+            sorted(balances, key=lambda item: (item[0] != DEFAULT_CURRENCY, item[0]))
+        )
+
+    @classmethod
+    @retrying
+    async def close_wallet(cls, session: AsyncSession, wallet_id: UUID) -> None:
+        """Close the wallet: it is gone for every endpoint right away, and
+        the purge job deletes its operations in batches afterwards."""
+        closed = await get_repository().wallets.close_wallet(
+            session=session, wallet_id=wallet_id
+        )
+
+        if config.hot_wallets.enabled:
+            hot_wallets.invalidate(wallet_id)
+        if closed is None:
+            raise WalletNotFoundError(wallet_id=wallet_id)
+
+    @classmethod
+    @retrying
     async def add_to_balance(
-        cls, session: AsyncSession, wallet_id: UUID, amount: int
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
     ) -> None:
         try:
-            db_wallet = await DaoWallet.add_to_balance(
-                session=session, wallet_id=wallet_id, amount=amount
+            db_wallet = await get_repository().wallets.add_to_balance(
+                session=session, wallet_id=wallet_id, amount=amount, currency=currency
             )
-        except IntegrityError as e:
+        except INTEGRITY_ERRORS as e:
             raise WalletNotFoundError(wallet_id=wallet_id) from e
 
         if db_wallet is None:
             raise WalletNotFoundError(wallet_id=wallet_id)
 
+        # the cache holds wallets.balance, in the default currency
+        if config.hot_wallets.enabled and currency == DEFAULT_CURRENCY:
+            hot_wallets.applied(wallet_id, db_wallet.balance, db_wallet.version)
         return db_wallet.balance
 
     @classmethod
+    @retrying
     async def process_operation(
-        cls, session: AsyncSession, wallet_id: UUID, op_type: OperationType, amount: int
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        op_type: OperationType,
+        amount: int,
+        currency: str = DEFAULT_CURRENCY,
     ) -> Operation:
-        await OperationService.add_operation(
-            session=session, wallet_id=wallet_id, op_type=op_type, amount=amount
+        """Apply the operation to the balance and record it in the ledger,
+        in one transaction run again as a whole when it loses a race."""
+        try:
+            db_wallet, db_op = await get_repository().wallets.apply_operation(
+                session=session,
+                wallet_id=wallet_id,
+                op_type=op_type,
+                amount=amount,
+                currency=currency,
+            )
+        except INTEGRITY_ERRORS as e:
+            raise WalletNotFoundError(wallet_id=wallet_id) from e
+
+        if config.hot_wallets.enabled and currency == DEFAULT_CURRENCY:
+            hot_wallets.applied(wallet_id, db_wallet.balance, db_wallet.version)
+        return Operation.from_db(db_op)
+
+    @classmethod
+    async def get_history(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        limit: int = 100,
+        before: datetime | None = None,
+        since: datetime | None = None,
+    ) -> list[DBOperation | OperationRow]:
+        """Newest-first page of wallet operations, as raw DB rows, merged
+        with the archived ones."""
+        rows = await get_repository().operations.list_operations(
+            session=session,
+            wallet_id=wallet_id,
+            limit=limit,
+            before=before,
+            since=since,
+        )
+
+        # archived operations are older than the hot ones: once the page is
+        # full, only a segment reaching past its oldest row could change it
+        archived = await list_archived_operations(
+            session=session,
+            wallet_id=wallet_id,
+            limit=limit,
+            before=before,
+            since=rows[-1].created_at if len(rows) == limit else since,
+        )
+        if archived:
+            rows = sorted(
+                [*rows, *archived], key=lambda row: row.created_at, reverse=True
+            )[:limit]
+
+        # only an empty page needs the extra lookup to tell "no wallet" apart
+        if not rows:
+            await cls.get_balance(session=session, wallet_id=wallet_id)
+
+        return rows
+
+    @classmethod
+    async def get_totals(
+        cls,
+        session: AsyncSession,
+        wallet_id: UUID,
+        period: TotalsPeriod,
+        since: date | None = None,
+        until: date | None = None,
+    ) -> list[PeriodTotals]:
+        """Deposit and withdraw totals per period with operations, oldest
+        first, served from the rollups."""
+        totals = await list_totals(
+            session=session,
+            wallet_id=wallet_id,
+            period=period,
+            since=since,
+            until=until,
         )
 
-        if op_type == OperationType.withdraw:
-            amount = -amount
+        if not totals:
+            await cls.get_balance(session=session, wallet_id=wallet_id)
 
-        await cls.add_to_balance(session=session, wallet_id=wallet_id, amount=amount)
+        return totals
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pydantic import SecretStr
+
+from src.api.admin import router
+from src.api.deadline import DeadlineMiddleware
+from src.config import DeadlineConfig, config, secrets
+
+TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin_client(monkeypatch) -> AsyncClient:
+    monkeypatch.setattr(secrets, "admin_token", SecretStr(TOKEN))
+    app = FastAPI()
+    app.include_router(router)
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_admin_requires_token(admin_client: AsyncClient):
+    async with admin_client as client:
+        response = await client.get("/admin/statements")
+        wrong = await client.get(
+            "/admin/statements", headers={"X-Admin-Token": "wrong"}
+        )
+
+    assert response.status_code == 403
+    assert wrong.status_code == 403
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_statements_snapshot_diff(admin_client: AsyncClient):
+    headers = {"X-Admin-Token": TOKEN}
+    async with admin_client as client:
+        response = await client.post("/admin/statements/snapshots", headers=headers)
+        snapshot_id = response.json()["id"]
+
+        response = await client.get(
+            f"/admin/statements/snapshots/{snapshot_id}/diff", headers=headers
+        )
+        missing = await client.get(
+            "/admin/statements/snapshots/unknown/diff", headers=headers
+        )
+
+    assert response.status_code == 200
+    assert all({"method", "calls", "mean_ms"} <= set(row) for row in response.json())
+    assert missing.status_code == 404
+
+
+def spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_profile_collapsed_stacks(admin_client: AsyncClient, monkeypatch):
+    headers = {"X-Admin-Token": TOKEN}
+
+    async def busy() -> None:
+        for _ in range(20):
+            spin(0.01)
+            await asyncio.sleep(0.001)
+
+    async with admin_client as client:
+        disabled = await client.get("/admin/profile", headers=headers)
+
+        monkeypatch.setattr(config.profiling, "enabled", True)
+        monkeypatch.setattr(config.profiling, "interval", 0.001)
+        task = asyncio.create_task(busy())
+        response = await client.get(
+            "/admin/profile", params={"seconds": 0.3}, headers=headers
+        )
+        await task
+
+    assert disabled.status_code == 404
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert any("spin (" in line for line in lines)
+    # flamegraph.pl format: frames joined by ";", then the sample count
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0
+        assert stack
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_profile_within_deadline(monkeypatch):
+    monkeypatch.setattr(secrets, "admin_token", SecretStr(TOKEN))
+    monkeypatch.setattr(config.profiling, "enabled", True)
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(DeadlineMiddleware, settings=DeadlineConfig(default_timeout=1))
+    headers = {"X-Admin-Token": TOKEN}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        rejected = await client.get(
+            "/admin/profile", params={"seconds": 5}, headers=headers
+        )
+        extended = await client.get(
+            "/admin/profile",
+            params={"seconds": 1},
+            headers={**headers, "X-Request-Timeout-Ms": "2000"},
+        )
+
+    assert rejected.status_code == 422
+    assert "X-Request-Timeout-Ms" in rejected.json()["detail"]
+    assert extended.status_code == 200
@@ -0,0 +1,188 @@
+import asyncio
+from uuid import uuid4
+
+import orjson
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from src.api.admission import (
+    AdmissionController,
+    AdmissionMiddleware,
+    PostgresStore,
+    RateLimiter,
+    _payloads,
+)
+from src.config import AdmissionConfig
+from src.db.session import session_manager
+
+
+def _client(
+    controller: AdmissionController, delay: float = 0, peer: str = "127.0.0.1"
+) -> AsyncClient:
+    app = FastAPI()
+
+    @app.get("/wallets/{wallet_id}")
+    async def get_wallet(wallet_id: str):
+        await asyncio.sleep(delay)
+        return {"id": wallet_id}
+
+    @app.get("/docs-like")
+    async def other():
+        return {}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    return AsyncClient(
+        transport=ASGITransport(app=app, client=(peer, 123)), base_url="http://test"
+    )
+
+
+def test_rate_limiter_refills():
+    limiter = RateLimiter(rate=10, burst=2, max_keys=10)
+
+    assert limiter.acquire("a", now=0) == 0
+    assert limiter.acquire("a", now=0) == 0
+    assert limiter.acquire("a", now=0) == pytest.approx(0.1)
+    assert limiter.acquire("b", now=0) == 0
+    assert limiter.acquire("a", now=0.1) == 0
+
+
+def test_rate_limiter_evicts_least_recent():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+
+    limiter.acquire("a", now=0)
+    limiter.acquire("b", now=0)
+    limiter.acquire("a", now=0)
+    limiter.acquire("c", now=0)
+
+    assert len(limiter) == 2
+    # "b" was dropped, so it starts again with a full bucket
+    assert limiter.acquire("b", now=0) == 0
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_rate_limiter_sync_charges_remote_consumption():
+    class Store:
+        async def exchange(self, namespace, consumed):
+            self.published = consumed
+            return {"a": 5}
+
+    store = Store()
+    limiter = RateLimiter(rate=1, burst=5, max_keys=10)
+    await limiter.sync(store, "client")
+
+    assert limiter.acquire("a", now=0) == 0
+    await limiter.sync(store, "client")
+
+    assert store.published == {"a": 1}
+    assert limiter.acquire("a", now=0) > 0
+
+
+def test_payloads_fit_notify():
+    consumed = {f"10.0.{i // 256}.{i % 256}": 1.0 for i in range(2000)}
+
+    payloads = _payloads("client", consumed)
+
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) < 8000 for payload in payloads)
+    merged = {}
+    for payload in payloads:
+        namespace, chunk = orjson.loads(payload)
+        assert namespace == "client"
+        merged.update(chunk)
+    assert merged == consumed
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_postgres_store_exchanges_between_workers():
+    dsn = session_manager.engine.url.set(drivername="postgresql")
+    a = PostgresStore(dsn.render_as_string(hide_password=False))
+    b = PostgresStore(dsn.render_as_string(hide_password=False))
+    try:
+        # both listen before anything is consumed
+        assert await a.exchange("client", {}) == {}
+        assert await b.exchange("client", {}) == {}
+
+        assert await a.exchange("client", {"x": 3}) == {}
+        received = {}
+        for _ in range(100):
+            received = await b.exchange("client", {})
+            if received:
+                break
+            await asyncio.sleep(0.01)
+
+        assert received == {"x": 3}
+        # nothing comes back to the worker that consumed it
+        assert await a.exchange("client", {}) == {}
+        assert await b.exchange("wallet", {}) == {}
+    finally:
+        await a.close()
+        await b.close()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_wallet_rate_limit_rejects():
+    settings = AdmissionConfig(wallet_rate=1, wallet_burst=2)
+    wallet_id = uuid4()
+
+    async with _client(AdmissionController(settings, max_concurrency=10)) as client:
+        statuses = [
+            (await client.get(f"/wallets/{wallet_id}")).status_code for _ in range(3)
+        ]
+        other = await client.get(f"/wallets/{uuid4()}")
+        unrelated = await client.get("/docs-like")
+
+    assert statuses == [200, 200, 429]
+    assert other.status_code == 200
+    assert unrelated.status_code == 200
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_client_rate_limit_rejects():
+    settings = AdmissionConfig(
+        client_rate=1, client_burst=1, trusted_proxies=["127.0.0.0/8"]
+    )
+
+    async with _client(AdmissionController(settings, max_concurrency=10)) as client:
+        first = await client.get(f"/wallets/{uuid4()}", headers={"X-Client-Id": "a"})
+        second = await client.get(f"/wallets/{uuid4()}", headers={"X-Client-Id": "a"})
+        third = await client.get(f"/wallets/{uuid4()}", headers={"X-Client-Id": "b"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert second.headers["Retry-After"] == "1"
+    assert third.status_code == 200
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_client_id_only_from_trusted_proxies():
+    settings = AdmissionConfig(
+        client_rate=1, client_burst=1, trusted_proxies=["10.0.0.0/8"]
+    )
+    controller = AdmissionController(settings, max_concurrency=10)
+
+    async with _client(controller, peer="192.0.2.1") as client:
+        first = await client.get(f"/wallets/{uuid4()}", headers={"X-Client-Id": "a"})
+        # a new id does not buy a fresh bucket
+        second = await client.get(f"/wallets/{uuid4()}", headers={"X-Client-Id": "b"})
+    async with _client(controller, peer="10.1.2.3") as proxy:
+        third = await proxy.get(f"/wallets/{uuid4()}", headers={"X-Client-Id": "a"})
+
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert third.status_code == 200
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrency_limit_sheds_load():
+    settings = AdmissionConfig(max_concurrency=2, queue_timeout=0.01)
+    controller = AdmissionController(settings, max_concurrency=10)
+
+    async with _client(controller, delay=0.2) as client:
+        responses = await asyncio.gather(
+            *(client.get(f"/wallets/{uuid4()}") for _ in range(4))
+        )
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 503, 503]
+    assert controller.concurrency.in_flight == 0
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import asyncpg
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from src.api.deadline import DeadlineMiddleware
+from src.api.wallets import router
+from src.config import DeadlineConfig, config
+from src.db.deadline import deadline_scope
+from src.db.retry import sqlstate
+from src.db.session import session_manager
+from src.services.wallets import WalletService
+
+SETTINGS = DeadlineConfig(default_timeout=0.2, max_timeout=1.0)
+QUERY_CANCELED = "57014"
+
+
+def deadline_client(app: FastAPI) -> AsyncClient:
+    app.add_middleware(DeadlineMiddleware, settings=SETTINGS)
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_middleware_cancels_late_requests():
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow(seconds: float) -> dict[str, bool]:
+        await asyncio.sleep(seconds)
+        return {"ok": True}
+
+    async with deadline_client(app) as client:
+        fast = await client.get("/slow", params={"seconds": 0})
+        late = await client.get("/slow", params={"seconds": 5})
+        header = await client.get(
+            "/slow", params={"seconds": 0.3}, headers={"X-Request-Timeout-Ms": "500"}
+        )
+        malformed = await client.get(
+            "/slow", params={"seconds": 0}, headers={"X-Request-Timeout-Ms": "soon"}
+        )
+
+    assert fast.status_code == 200
+    assert late.status_code == 504
+    assert header.status_code == 200
+    assert malformed.status_code == 400
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("backend", ["orm", "asyncpg"])
+async def test_deadline_bounds_statements(backend: str):
+    await session_manager.init_pool()
+
+    async with session_manager.session(backend=backend) as session:
+        query = "SELECT pg_sleep(5)"
+        start = time.perf_counter()
+        with (
+            deadline_scope(0.1),
+            pytest.raises((DBAPIError, asyncpg.QueryCanceledError)) as error,
+        ):
+            if backend == "asyncpg":
+                await session.execute(query)
+            else:
+                await session.execute(text(query))
+        elapsed = time.perf_counter() - start
+
+    assert sqlstate(error.value) == QUERY_CANCELED
+    assert elapsed < 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_pool_occupancy_bounded_under_slow_queries(monkeypatch):
+    async def slow_balance(cls, session, wallet_id):
+        await session.execute(text("SELECT pg_sleep(30)"))
+
+    monkeypatch.setattr(config.database, "dao", "orm")
+    monkeypatch.setattr(WalletService, "get_balance", classmethod(slow_balance))
+
+    app = FastAPI()
+    app.include_router(router)
+    pool = session_manager.engine.pool
+    requests = 2 * config.database.max_connections
+
+    occupancy = []
+    stop = asyncio.Event()
+
+    async def sample() -> None:
+        while not stop.is_set():
+            occupancy.append(pool.checkedout())
+            await asyncio.sleep(0.01)
+
+    sampler = asyncio.create_task(sample())
+    async with deadline_client(app) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(
+                client.get("/wallets/0198f1e2-0000-7000-8000-000000000000")
+                for _ in range(requests)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    assert [response.status_code for response in responses] == [504] * requests
+    # every request gave up at its deadline, not when its query would end
+    assert elapsed < 2
+    assert max(occupancy) <= config.database.max_connections
+
+    async def released() -> None:
+        while pool.checkedout():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(released(), timeout=1)
+    async with session_manager.engine.connect() as conn:
+        sleeping = await conn.scalar(
+            text(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE state = 'active' AND query = 'SELECT pg_sleep(30)'"
+            )
+        )
+    assert sleeping == 0
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+
+from src.api import health
+from src.api.health import HealthMonitor
+from src.config import HealthConfig
+from src.db.session import session_manager
+
+
+def _client() -> AsyncClient:
+    app = FastAPI()
+    app.include_router(health.router, prefix="/api")
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_probes_run_no_queries(monkeypatch):
+    monitor = HealthMonitor(HealthConfig())
+    monkeypatch.setattr(health, "health_monitor", monitor)
+    await monitor.refresh()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = session_manager.engine.sync_engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        async with _client() as client:
+            for _ in range(20):
+                response = await client.get("/api/health/ready")
+                assert response.status_code == 200
+            assert (await client.get("/api/health")).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert statements == []
+    body = response.json()
+    assert body["status"] == "ready"
+    assert body["database"]["reachable"] is True
+    assert body["pool"]["max"] > 0
+
+
+@pytest.mark.memory
+@pytest.mark.asyncio(loop_scope="session")
+async def test_saturated_pool_is_not_ready(memory_store, monkeypatch):
+    monitor = HealthMonitor(HealthConfig(max_pool_saturation=0.8))
+    monkeypatch.setattr(health, "health_monitor", monitor)
+    monkeypatch.setattr(health, "pool_usage", lambda: (8, 10))
+    await monitor.refresh()
+
+    async with _client() as client:
+        ready = await client.get("/api/health/ready")
+        live = await client.get("/api/health/live")
+
+    assert ready.status_code == 503
+    assert ready.json()["problems"] == ["connection pool saturated"]
+    assert ready.json()["pool"] == {"in_use": 8, "max": 10, "saturation": 0.8}
+    assert live.status_code == 200
+
+
+@pytest.mark.memory
+@pytest.mark.asyncio(loop_scope="session")
+async def test_unreachable_database(memory_store, monkeypatch):
+    settings = HealthConfig(timeout=0.01, stale_after=10)
+    monitor = HealthMonitor(settings)
+
+    down = True
+
+    async def ping():
+        if down:
+            await asyncio.sleep(1)
+
+    monkeypatch.setattr(health, "ping", ping)
+    await monitor.refresh()
+    assert monitor.problems() == ["database unreachable"]
+    assert "TimeoutError" in monitor.error
+
+    down = False
+    await monitor.refresh()
+    assert monitor.problems() == []
+    # the refresh loop stopped running
+    now = monitor.checked_at + settings.stale_after + 1
+    assert monitor.problems(now) == ["database check is stale"]
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+import pytest
+
+from src.profiling import LoopWatchdog
+
+
+def block(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_watchdog_reports_blocking_code(monkeypatch):
+    warnings = []
+    monkeypatch.setattr("src.profiling.logger.warning", warnings.append)
+    watchdog = LoopWatchdog(threshold=0.02)
+    await watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        block(0.2)
+        await asyncio.sleep(0.05)
+    finally:
+        await watchdog.stop()
+
+    assert watchdog.stalls == 1
+    assert watchdog.stats()["max_stall_ms"] >= 150
+    assert "blocked for" in warnings[0]
+    assert "block (" in warnings[0]
@@ -0,0 +1,32 @@
+from src.config import config
+from src.server import GunicornApplication, Worker, uvicorn_kwargs
+
+
+def test_gunicorn_gets_the_uvicorn_settings():
+    settings = config.uvicorn.model_copy(
+        update={
+            "workers": 4,
+            "loop": "uvloop",
+            "http": "httptools",
+            "backlog": 512,
+            "timeout_keep_alive": 20,
+            "limit_concurrency": 1000,
+            "access_log": False,
+            "max_requests": 10_000,
+        }
+    )
+
+    gunicorn = GunicornApplication(settings)
+
+    assert gunicorn.cfg.workers == 4
+    assert gunicorn.cfg.worker_class is Worker
+    assert gunicorn.cfg.backlog == 512
+    assert gunicorn.cfg.keepalive == 20
+    assert gunicorn.cfg.max_requests == 10_000
+    assert Worker.CONFIG_KWARGS == {
+        "loop": "uvloop",
+        "http": "httptools",
+        "limit_concurrency": 1000,
+        "access_log": False,
+    }
+    assert uvicorn_kwargs(settings)["backlog"] == 512
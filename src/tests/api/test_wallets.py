@@ -14,7 +14,7 @@ async def test_create_wallet(client: AsyncClient, db_conn: AsyncConnection):
     response = await client.post("/wallets", params={"balance": 500})
     assert response.status_code == 200
 
-    wallet_id = UUID(response.json())
+    wallet_id = UUID(response.json()["id"])
     async with open_session(db_conn) as session:
         balance = await WalletService.get_balance(session=session, wallet_id=wallet_id)
     assert balance == 500
@@ -23,7 +23,7 @@ async def test_create_wallet(client: AsyncClient, db_conn: AsyncConnection):
 @pytest.mark.asyncio(loop_scope="session")
 async def test_add_operation(client: AsyncClient, db_conn: AsyncConnection):
     response = await client.post("/wallets", params={"balance": 100})
-    wallet_id = UUID(response.json())
+    wallet_id = UUID(response.json()["id"])
 
     op_data = {"op_type": "DEPOSIT", "amount": 200}
     response = await client.post(f"/wallets/{wallet_id}/operation", params=op_data)
@@ -37,7 +37,7 @@ async def test_add_operation(client: AsyncClient, db_conn: AsyncConnection):
 @pytest.mark.asyncio(loop_scope="session")
 async def test_concurrent_operations(client: AsyncClient, db_conn: AsyncConnection):
     response = await client.post("/wallets", params={"balance": 0})
-    wallet_id = UUID(response.json())
+    wallet_id = UUID(response.json()["id"])
 
     async def add_op(amount: int):
         op_data = {"op_type": "DEPOSIT", "amount": amount}
@@ -55,7 +55,7 @@ async def test_concurrent_operations(client: AsyncClient, db_conn: AsyncConnecti
 @pytest.mark.asyncio(loop_scope="session")
 async def test_withdrawal_operation(client: AsyncClient, db_conn: AsyncConnection):
     response = await client.post("/wallets", params={"balance": 500})
-    wallet_id = UUID(response.json())
+    wallet_id = UUID(response.json()["id"])
 
     op_data = {"op_type": "WITHDRAW", "amount": 200}
     await client.post(f"/wallets/{wallet_id}/operation", params=op_data)
@@ -64,3 +64,147 @@ async def test_withdrawal_operation(client: AsyncClient, db_conn: AsyncConnectio
         balance = await WalletService.get_balance(session=session, wallet_id=wallet_id)
 
     assert balance == 300
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_balance(client: AsyncClient):
+    response = await client.post("/wallets", params={"balance": 700})
+    wallet_id = response.json()["id"]
+
+    response = await client.get(f"/wallets/{wallet_id}")
+    assert response.status_code == 200
+    assert response.json() == {"id": wallet_id, "balance": 700}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_add_operation_returns_operation(client: AsyncClient):
+    response = await client.post("/wallets", params={"balance": 0})
+    wallet_id = response.json()["id"]
+
+    op_data = {"op_type": "DEPOSIT", "amount": 42}
+    response = await client.post(f"/wallets/{wallet_id}/operation", params=op_data)
+    body = response.json()
+
+    assert body["wallet_id"] == wallet_id
+    assert body["op_type"] == "DEPOSIT"
+    assert body["amount"] == 42
+    assert "created_at" in body
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_history(client: AsyncClient):
+    response = await client.post("/wallets", params={"balance": 0})
+    wallet_id = response.json()["id"]
+
+    for amount in (10, 20, 30):
+        op_data = {"op_type": "DEPOSIT", "amount": amount}
+        await client.post(f"/wallets/{wallet_id}/operation", params=op_data)
+
+    response = await client.get(f"/wallets/{wallet_id}/operations", params={"limit": 2})
+    assert response.status_code == 200
+    operations = response.json()["operations"]
+
+    assert len(operations) == 2
+    assert all(op["wallet_id"] == wallet_id for op in operations)
+    assert all(op["op_type"] == "DEPOSIT" for op in operations)
+    assert operations[0]["created_at"] >= operations[1]["created_at"]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_transfer(client: AsyncClient, db_conn: AsyncConnection):
+    source = UUID((await client.post("/wallets", params={"balance": 100})).json()["id"])
+    target = UUID((await client.post("/wallets", params={"balance": 0})).json()["id"])
+
+    response = await client.post(
+        f"/wallets/{source}/transfer",
+        params={"to_wallet_id": str(target), "amount": 40},
+    )
+    assert response.status_code == 200
+    assert response.json()["debit"]["op_type"] == "WITHDRAW"
+    assert response.json()["credit"]["wallet_id"] == str(target)
+
+    async with open_session(db_conn) as session:
+        assert await WalletService.get_balance(session=session, wallet_id=source) == 60
+        assert await WalletService.get_balance(session=session, wallet_id=target) == 40
+
+    # last: the failed transaction rolls back the test connection too
+    response = await client.post(
+        f"/wallets/{source}/transfer",
+        params={"to_wallet_id": str(target), "amount": 61},
+    )
+    assert response.status_code == 409
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_totals(client: AsyncClient):
+    response = await client.post("/wallets", params={"balance": 0})
+    wallet_id = response.json()["id"]
+
+    for op_type, amount in (("DEPOSIT", 200), ("DEPOSIT", 50), ("WITHDRAW", 30)):
+        op_data = {"op_type": op_type, "amount": amount}
+        await client.post(f"/wallets/{wallet_id}/operation", params=op_data)
+
+    # nothing folded yet: the totals come from the operations past the watermark
+    response = await client.get(
+        f"/wallets/{wallet_id}/totals", params={"period": "month"}
+    )
+    assert response.status_code == 200
+    body = response.json()
+
+    assert body["period"] == "month"
+    assert len(body["totals"]) == 1
+    totals = body["totals"][0]
+    assert totals["period"].endswith("-01")
+    assert (totals["deposits"], totals["withdrawals"]) == (250, 30)
+    assert (totals["deposit_count"], totals["withdraw_count"]) == (2, 1)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_balances_per_currency(client: AsyncClient):
+    response = await client.post("/wallets", params={"balance": 100})
+    wallet_id = response.json()["id"]
+
+    for op_type, amount, currency in (
+        ("DEPOSIT", 40, "USD"),
+        ("WITHDRAW", 15, "USD"),
+        ("DEPOSIT", 5, "EUR"),
+    ):
+        response = await client.post(
+            f"/wallets/{wallet_id}/operation",
+            params={"op_type": op_type, "amount": amount, "currency": currency},
+        )
+        assert response.json()["currency"] == currency
+
+    response = await client.get(f"/wallets/{wallet_id}/balances")
+    assert response.status_code == 200
+    assert list(response.json()["balances"].items()) == [
+        ("RUB", 100),
+        ("EUR", 5),
+        ("USD", 25),
+    ]
+    # the single balance stays the default currency one
+    response = await client.get(f"/wallets/{wallet_id}")
+    assert response.json()["balance"] == 100
+
+    response = await client.post(
+        f"/wallets/{wallet_id}/operation",
+        params={"op_type": "DEPOSIT", "amount": 1, "currency": "usd"},
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_close_wallet(client: AsyncClient):
+    response = await client.post("/wallets", params={"balance": 100})
+    wallet_id = response.json()["id"]
+
+    response = await client.delete(f"/wallets/{wallet_id}")
+    assert response.status_code == 204
+
+    assert (await client.get(f"/wallets/{wallet_id}")).status_code == 404
+    assert (await client.get(f"/wallets/{wallet_id}/balances")).status_code == 404
+    response = await client.post(
+        f"/wallets/{wallet_id}/operation", params={"op_type": "DEPOSIT", "amount": 1}
+    )
+    assert response.status_code == 404
+    assert (await client.delete(f"/wallets/{wallet_id}")).status_code == 404
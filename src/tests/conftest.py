@@ -1,4 +1,4 @@
-import asyncio
+import json
 from collections.abc import AsyncIterator
 
 import pytest
@@ -10,39 +10,102 @@ from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 from testcontainers.postgres import PostgresContainer
 
-from src.api._context import RequestContext
-from src.api.wallets import router
+from src.api._context import ReadContext, RequestContext
+from src.api.wallets import router, wallet_not_found
+from src.config import config as app_config
 from src.config import secrets
+from src.db import memory
 from src.db.session import session_manager
-
+from src.exceptions.wallets import WalletNotFoundError
+
+from .database import (
+    PASSWORD,
+    USER,
+    PostgresServer,
+    clone_template,
+    prepare_template,
+    start_postgres,
+)
 from .utils import open_connection, open_session
 
+POSTGRES = pytest.StashKey[tuple[PostgresServer, PostgresContainer | None]]()
+
 
-@pytest_asyncio.fixture(scope="session")
-async def postgres():
-    loop = asyncio.get_event_loop()
-    container = await loop.run_in_executor(
-        None, lambda: PostgresContainer("postgres:15").start()
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--reuse-container",
+        action="store_true",
+        help="keep the Postgres test container running and reuse it next run",
+    )
+    parser.addoption(
+        "--without-postgres",
+        action="store_true",
+        help="start no database and run only the tests marked memory",
     )
-    yield container
-    await loop.run_in_executor(None, container.stop)
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    if config.option.help or config.getoption("--without-postgres"):
+        return
+    if hasattr(config, "workerinput"):
+        # pytest-xdist worker: the main process has set up the server
+        server = PostgresServer(**json.loads(config.workerinput["postgres"]))
+        config.stash[POSTGRES] = (server, None)
+        return
+
+    server, container = start_postgres(reuse=config.getoption("--reuse-container"))
+    prepare_template(server)
+    config.stash[POSTGRES] = (server, container)
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: list[pytest.Item]
+) -> None:
+    if not config.getoption("--without-postgres"):
+        return
+    deselected = [item for item in items if item.get_closest_marker("memory") is None]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = [item for item in items if item.get_closest_marker("memory")]
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node) -> None:
+    if POSTGRES not in node.config.stash:
+        return
+    server, _ = node.config.stash[POSTGRES]
+    node.workerinput["postgres"] = json.dumps(server.to_dict())
+
+
+def pytest_unconfigure(config: pytest.Config) -> None:
+    _, container = config.stash.get(POSTGRES, (None, None))
+    if container is not None:
+        container.stop()
 
 
 @pytest_asyncio.fixture(scope="session", autouse=True)
-async def init_db(postgres) -> AsyncIterator[PostgresContainer]:
-    print("Fixture started")
+async def init_db(pytestconfig: pytest.Config) -> AsyncIterator[None]:
+    if POSTGRES not in pytestconfig.stash:
+        # --without-postgres: only the in-memory backend runs
+        yield
+        return
+
+    server, _ = pytestconfig.stash[POSTGRES]
+    dbname = await clone_template(server)
 
-    secrets.postgres_user = SecretStr(postgres.username)
-    secrets.postgres_password = SecretStr(postgres.password)
-    secrets.postgres_db = SecretStr(postgres.dbname)
-    secrets.postgres_port = SecretStr(postgres.get_exposed_port(postgres.port))
+    secrets.postgres_user = SecretStr(USER)
+    secrets.postgres_password = SecretStr(PASSWORD)
+    secrets.postgres_db = SecretStr(dbname)
+    secrets.postgres_port = SecretStr(str(server.port))
 
     print(f"Connecting to test DB: {secrets.sqlalchemy_url}")
 
-    await session_manager.init_db(run_migrations=True)
+    await session_manager.init_db()
 
     yield
 
+    await session_manager.close()
+
 
 async def is_db_empty(conn: AsyncConnection) -> bool:
     def sync_inspect(connection):
@@ -66,11 +129,20 @@ async def isolated_session() -> AsyncIterator[AsyncSession]:
             yield session
 
 
+@pytest.fixture
+def memory_store(monkeypatch: pytest.MonkeyPatch) -> memory.MemoryStore:
+    """Switch to the in-memory DAO backend, on an empty store."""
+    monkeypatch.setattr(app_config.database, "dao", "memory")
+    memory.memory_store.reset()
+    return memory.memory_store
+
+
 @pytest.fixture
 def app() -> FastAPI:
     """Create a FastAPI app instance for testing with the wallets router."""
     app = FastAPI()
     app.include_router(router)
+    app.add_exception_handler(WalletNotFoundError, wallet_not_found)
     return app
 
 
@@ -89,6 +161,7 @@ async def client(app: FastAPI, db_conn: AsyncConnection) -> AsyncIterator[AsyncC
             yield RequestContext(session=session)
 
     app.dependency_overrides[RequestContext] = override_ctx
+    app.dependency_overrides[ReadContext] = override_ctx
 
     async with AsyncClient(
         transport=ASGITransport(app=app), base_url="http://test"
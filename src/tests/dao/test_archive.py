@@ -0,0 +1,122 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from src.config import config
+from src.db.archive import archive_operations, read_segment, write_segment
+from src.db.ids import uuid7
+from src.db.models import OperationType
+from src.db.partitions import create_partitions
+from src.db.session import session_manager
+from src.models.dto import OperationRow
+from src.services.wallets import WalletService
+
+BACKENDS = ["orm", "compiled", "asyncpg"]
+
+OLD = datetime(2020, 1, 1, tzinfo=UTC)
+
+
+def _rows(wallet_ids, count):
+    return [
+        OperationRow(
+            uuid7(),
+            wallet_ids[i % len(wallet_ids)],
+            OperationType.deposit.name if i % 2 else OperationType.withdraw.name,
+            i,
+            OLD + timedelta(minutes=i),
+        )
+        for i in range(count)
+    ]
+
+
+def test_segment_round_trip(tmp_path):
+    wallets = [uuid7(), uuid7()]
+    rows = _rows(wallets, 10)
+
+    path, index = write_segment(tmp_path, uuid7(), rows)
+
+    assert path.startswith("2020/01/")
+    assert {entry["wallet_id"]: entry["operations"] for entry in index} == {
+        wallets[0]: 5,
+        wallets[1]: 5,
+    }
+    assert {entry["wallet_id"]: entry["total"] for entry in index} == {
+        wallets[0]: -(0 + 2 + 4 + 6 + 8),
+        wallets[1]: 1 + 3 + 5 + 7 + 9,
+    }
+
+    archived = read_segment(
+        tmp_path / path,
+        wallets[1],
+        since=OLD + timedelta(minutes=3),
+        before=OLD + timedelta(minutes=9),
+    )
+    assert [row.amount for row in archived] == [7, 5, 3]
+    assert all(row.op_type == OperationType.deposit for row in archived)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_history_merges_archived_operations(backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(config.archive, "directory", str(tmp_path))
+
+    async with session_manager.session(backend="orm") as session:
+        wallet_id = await WalletService.create_wallet(session=session)
+        conn = await session.connection()
+        await create_partitions(conn, months_ahead=0, today=OLD.date())
+        for row in _rows([wallet_id], 5):
+            await session.execute(
+                text(
+                    "INSERT INTO operations (id, wallet_id, op_type, amount, created_at)"
+                    " VALUES (:id, :wallet_id, :op_type, :amount, :created_at)"
+                ),
+                row._asdict(),
+            )
+        await session.commit()
+        await WalletService.process_operation(
+            session=session,
+            wallet_id=wallet_id,
+            op_type=OperationType.deposit,
+            amount=100,
+        )
+
+    try:
+        archived = await archive_operations(
+            session_manager.engine,
+            older_than=OLD + timedelta(days=1),
+            batch_size=2,
+            directory=tmp_path,
+        )
+        assert archived == 5
+
+        async with session_manager.session(backend="orm") as session:
+            segments = await session.execute(
+                text(
+                    "SELECT count(*), sum(operations), sum(total) FROM ledger_segments "
+                    "WHERE wallet_id = :wallet_id"
+                ),
+                {"wallet_id": wallet_id},
+            )
+            assert tuple(segments.one()) == (3, 5, -2)
+
+        monkeypatch.setattr(config.database, "dao", backend)
+        await session_manager.init_pool()
+        async with session_manager.session() as session:
+            history = await WalletService.get_history(
+                session=session, wallet_id=wallet_id, limit=4
+            )
+
+        # the hot deposit first, then the newest archived ones
+        assert [row.amount for row in history] == [100, 4, 3, 2]
+    finally:
+        async with session_manager.engine.begin() as conn:
+            for table in ("ledger_segments", "operations"):
+                await conn.execute(
+                    text(f"DELETE FROM {table} WHERE wallet_id = :wallet_id"),
+                    {"wallet_id": wallet_id},
+                )
+            await conn.execute(
+                text("DELETE FROM wallets WHERE id = :wallet_id"),
+                {"wallet_id": wallet_id},
+            )
@@ -0,0 +1,387 @@
+"""Contract tests every DAO backend has to pass."""
+
+import asyncio
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from src.db.models import OperationType
+from src.db.repository import Repository, get_repository
+from src.db.session import session_manager
+from src.exceptions.wallets import InsufficientFundsError, WalletNotFoundError
+from src.models.dto import TransferOrder
+from src.services.transfers import net_transfers
+from src.tests.utils import open_raw_connection
+
+SQL_BACKENDS = ["orm", "compiled", "asyncpg"]
+BACKENDS = [*SQL_BACKENDS, pytest.param("memory", marks=pytest.mark.memory)]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request) -> str:
+    return request.param
+
+
+@pytest.fixture
+def repo(backend: str) -> Repository:
+    return get_repository(backend)
+
+
+@pytest_asyncio.fixture
+async def session(backend: str, request):
+    if backend == "memory":
+        yield request.getfixturevalue("memory_store")
+    elif backend == "asyncpg":
+        async with open_raw_connection() as conn:
+            yield conn
+    else:
+        yield request.getfixturevalue("isolated_session")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_create_and_get_wallet(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=100)
+    fetched = await repo.wallets.get_wallet(session=session, wallet_id=wallet.id)
+
+    assert fetched is not None
+    assert fetched.id == wallet.id
+    assert fetched.balance == 100
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_get_wallet_nonexistent(repo: Repository, session):
+    fetched = await repo.wallets.get_wallet(session=session, wallet_id=uuid4())
+    assert fetched is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_add_to_balance(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=500)
+
+    updated = await repo.wallets.add_to_balance(
+        session=session, wallet_id=wallet.id, amount=-150
+    )
+    assert updated.balance == 350
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_add_to_balance_nonexistent_wallet(repo: Repository, session):
+    updated = await repo.wallets.add_to_balance(
+        session=session, wallet_id=uuid4(), amount=100
+    )
+    assert updated is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_apply_operation(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=500)
+
+    updated, op = await repo.wallets.apply_operation(
+        session=session, wallet_id=wallet.id, op_type=OperationType.withdraw, amount=150
+    )
+    _, usd = await repo.wallets.apply_operation(
+        session=session,
+        wallet_id=wallet.id,
+        op_type=OperationType.deposit,
+        amount=20,
+        currency="USD",
+    )
+
+    assert (updated.balance, updated.version) == (350, 1)
+    assert (op.op_type, op.amount, op.currency) == (OperationType.withdraw, 150, "RUB")
+    page = await repo.operations.list_operations(
+        session=session, wallet_id=wallet.id, limit=10
+    )
+    assert [row.id for row in page] == [usd.id, op.id]
+    balances = await repo.wallets.get_balances(session=session, wallet_id=wallet.id)
+    assert sorted(balances) == [("RUB", 350), ("USD", 20)]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_apply_operation_closed_wallet(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=500)
+    await repo.wallets.close_wallet(session=session, wallet_id=wallet.id)
+
+    for wallet_id in (wallet.id, uuid4()):
+        with pytest.raises(WalletNotFoundError):
+            await repo.wallets.apply_operation(
+                session=session,
+                wallet_id=wallet_id,
+                op_type=OperationType.deposit,
+                amount=10,
+            )
+    page = await repo.operations.list_operations(
+        session=session, wallet_id=wallet.id, limit=10
+    )
+    assert page == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_add_and_get_operation(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=0)
+
+    op = await repo.operations.add_operation(
+        session=session,
+        wallet_id=wallet.id,
+        op_type=OperationType.withdraw,
+        amount=30,
+    )
+    fetched = await repo.operations.get_operation(session=session, op_id=op.id)
+
+    assert fetched is not None
+    assert fetched.wallet_id == wallet.id
+    assert fetched.op_type == OperationType.withdraw
+    assert fetched.amount == 30
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_list_operations(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=0)
+    for amount in (10, 20, 30):
+        await repo.operations.add_operation(
+            session=session,
+            wallet_id=wallet.id,
+            op_type=OperationType.deposit,
+            amount=amount,
+        )
+
+    page = await repo.operations.list_operations(
+        session=session, wallet_id=wallet.id, limit=2
+    )
+    assert len(page) == 2
+    assert page[0].created_at >= page[1].created_at
+
+    rest = await repo.operations.list_operations(
+        session=session, wallet_id=wallet.id, limit=10, before=page[-1].created_at
+    )
+    assert all(op.created_at < page[-1].created_at for op in rest)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_add_operation_unknown_wallet(repo: Repository, session):
+    with pytest.raises(WalletNotFoundError):
+        await repo.operations.add_operation(
+            session=session,
+            wallet_id=uuid4(),
+            op_type=OperationType.deposit,
+            amount=10,
+        )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_add_operation_closed_wallet(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=0)
+    await repo.wallets.close_wallet(session=session, wallet_id=wallet.id)
+
+    with pytest.raises(WalletNotFoundError):
+        await repo.operations.add_operation(
+            session=session,
+            wallet_id=wallet.id,
+            op_type=OperationType.deposit,
+            amount=10,
+        )
+    page = await repo.operations.list_operations(
+        session=session, wallet_id=wallet.id, limit=10
+    )
+    assert page == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_balances_per_currency(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=100)
+
+    created = await repo.wallets.add_to_balance(
+        session=session, wallet_id=wallet.id, amount=30, currency="USD"
+    )
+    updated = await repo.wallets.add_to_balance(
+        session=session, wallet_id=wallet.id, amount=-10, currency="USD"
+    )
+    await repo.wallets.add_to_balance(session=session, wallet_id=wallet.id, amount=5)
+
+    assert (created.balance, created.version) == (30, 0)
+    assert (updated.balance, updated.version) == (20, 1)
+    balances = await repo.wallets.get_balances(session=session, wallet_id=wallet.id)
+    assert sorted(balances) == [("RUB", 105), ("USD", 20)]
+
+    op = await repo.operations.add_operation(
+        session=session,
+        wallet_id=wallet.id,
+        op_type=OperationType.deposit,
+        amount=30,
+        currency="USD",
+    )
+    fetched = await repo.operations.get_operation(session=session, op_id=op.id)
+    assert (op.currency, fetched.currency) == ("USD", "USD")
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_currency_balance_unknown_wallet(repo: Repository, session):
+    wallet_id = uuid4()
+    updated = await repo.wallets.add_to_balance(
+        session=session, wallet_id=wallet_id, amount=100, currency="USD"
+    )
+
+    assert updated is None
+    assert await repo.wallets.get_balances(session=session, wallet_id=wallet_id) == []
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_closed_wallet_looks_missing(repo: Repository, session):
+    wallet = await repo.wallets.create_wallet(session=session, balance=100)
+    other = await repo.wallets.create_wallet(session=session, balance=100)
+    await repo.wallets.add_to_balance(
+        session=session, wallet_id=wallet.id, amount=5, currency="EUR"
+    )
+
+    closed = await repo.wallets.close_wallet(session=session, wallet_id=wallet.id)
+
+    assert closed == wallet.id
+    assert await repo.wallets.close_wallet(session=session, wallet_id=wallet.id) is None
+    assert await repo.wallets.get_wallet(session=session, wallet_id=wallet.id) is None
+    for currency in ("RUB", "EUR", "USD"):
+        updated = await repo.wallets.add_to_balance(
+            session=session, wallet_id=wallet.id, amount=1, currency=currency
+        )
+        assert updated is None
+    # what is left is the currency rows, waiting for the purge
+    balances = await repo.wallets.get_balances(session=session, wallet_id=wallet.id)
+    assert balances == [("EUR", 5)]
+    with pytest.raises(WalletNotFoundError):
+        await repo.wallets.transfer(
+            session=session,
+            deltas=[(wallet.id, 10), (other.id, -10)],
+            legs=[
+                (other.id, OperationType.withdraw, 10),
+                (wallet.id, OperationType.deposit, 10),
+            ],
+        )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_transfer_nets_balances(repo: Repository, session):
+    a, b, c = [
+        (await repo.wallets.create_wallet(session=session, balance=100)).id
+        for _ in range(3)
+    ]
+    deltas, legs = net_transfers(
+        [TransferOrder(a, b, 30), TransferOrder(b, c, 50), TransferOrder(c, a, 10)]
+    )
+
+    wallets, operations = await repo.wallets.transfer(
+        session=session, deltas=deltas, legs=legs
+    )
+
+    assert {wallet.id: wallet.balance for wallet in wallets} == {
+        a: 80,
+        b: 80,
+        c: 140,
+    }
+    assert all(wallet.version == 1 for wallet in wallets)
+    assert [(op.wallet_id, op.op_type, op.amount) for op in operations] == legs
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_transfer_insufficient_funds(repo: Repository, session):
+    a = (await repo.wallets.create_wallet(session=session, balance=10)).id
+    b = (await repo.wallets.create_wallet(session=session, balance=0)).id
+    deltas, legs = net_transfers([TransferOrder(a, b, 11)])
+
+    with pytest.raises(InsufficientFundsError):
+        await repo.wallets.transfer(session=session, deltas=deltas, legs=legs)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_transfer_unknown_wallet(repo: Repository, session):
+    a = (await repo.wallets.create_wallet(session=session, balance=10)).id
+    deltas, legs = net_transfers([TransferOrder(a, uuid4(), 5)])
+
+    with pytest.raises(WalletNotFoundError):
+        await repo.wallets.transfer(session=session, deltas=deltas, legs=legs)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_add_to_balance(backend: str, repo: Repository, request):
+    """Concurrent updates from separate connections must not lose writes."""
+    if backend == "memory":
+        request.getfixturevalue("memory_store")
+    else:
+        await session_manager.init_pool()
+
+    async with session_manager.session(backend) as session:
+        wallet = await repo.wallets.create_wallet(session=session, balance=0)
+
+    async def increment():
+        async with session_manager.session(backend) as session:
+            await repo.wallets.add_to_balance(
+                session=session, wallet_id=wallet.id, amount=10
+            )
+
+    try:
+        await asyncio.gather(*[increment() for _ in range(10)])
+
+        async with session_manager.session(backend) as session:
+            fetched = await repo.wallets.get_wallet(
+                session=session, wallet_id=wallet.id
+            )
+        assert fetched.balance == 100
+        assert fetched.version == 10
+    finally:
+        if backend != "memory":
+            async with session_manager.engine.begin() as conn:
+                await conn.execute(
+                    text("DELETE FROM wallets WHERE id = :id"), {"id": wallet.id}
+                )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+async def test_currencies_do_not_contend(backend: str, repo: Repository):
+    """An operation in another currency goes through while the wallet row is
+    locked by an update of the default balance."""
+    await session_manager.init_pool()
+
+    async with session_manager.session(backend) as session:
+        wallet = await repo.wallets.create_wallet(session=session, balance=0)
+
+    try:
+        async with session_manager.engine.connect() as holder:
+            await holder.execute(
+                text("UPDATE wallets SET balance = balance + 1 WHERE id = :id"),
+                {"id": wallet.id},
+            )
+
+            async with session_manager.session(backend) as session:
+                await asyncio.wait_for(
+                    repo.operations.add_operation(
+                        session=session,
+                        wallet_id=wallet.id,
+                        op_type=OperationType.deposit,
+                        amount=10,
+                        currency="EUR",
+                    ),
+                    timeout=5,
+                )
+                updated = await asyncio.wait_for(
+                    repo.wallets.add_to_balance(
+                        session=session,
+                        wallet_id=wallet.id,
+                        amount=10,
+                        currency="EUR",
+                    ),
+                    timeout=5,
+                )
+            await holder.rollback()
+
+        assert updated.balance == 10
+    finally:
+        async with session_manager.engine.begin() as conn:
+            for table in ("wallet_balances", "operations"):
+                await conn.execute(
+                    text(f"DELETE FROM {table} WHERE wallet_id = :id"),
+                    {"id": wallet.id},
+                )
+            await conn.execute(
+                text("DELETE FROM wallets WHERE id = :id"), {"id": wallet.id}
+            )
@@ -0,0 +1,27 @@
+import time
+from uuid import UUID
+
+from src.db.ids import uuid7, uuid7_time_ms
+
+
+def test_uuid7_version_and_variant():
+    value = uuid7()
+
+    assert isinstance(value, UUID)
+    assert value.version == 7
+    assert value.variant == "specified in RFC 4122"
+
+
+def test_uuid7_encodes_current_time():
+    before = time.time_ns() // 1_000_000
+    value = uuid7()
+    after = time.time_ns() // 1_000_000
+
+    assert before <= uuid7_time_ms(value) <= after + 1
+
+
+def test_uuid7_is_monotonic_within_a_millisecond():
+    values = [uuid7() for _ in range(10_000)]
+
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
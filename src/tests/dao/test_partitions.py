@@ -0,0 +1,187 @@
+from datetime import UTC, date, datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import event, text
+
+from src.db.partitions import (
+    check_partitions,
+    create_partitions,
+    detach_partitions,
+    list_partitions,
+    month_start,
+    next_month,
+    partition_name,
+)
+from src.db.repository import get_repository
+from src.db.session import session_manager
+from src.tests.utils import open_connection, open_raw_connection, open_session
+
+SQL_BACKENDS = ["orm", "compiled", "asyncpg"]
+
+
+def _current_month() -> date:
+    return month_start(datetime.now(UTC).date())
+
+
+def test_next_month_wraps_year():
+    assert next_month(date(2026, 11, 1)) == date(2026, 12, 1)
+    assert next_month(date(2026, 12, 1)) == date(2027, 1, 1)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_partitions_exist_ahead():
+    async with open_connection() as conn:
+        assert await create_partitions(conn, months_ahead=2) == []
+
+        partitions = await list_partitions(conn)
+
+    month = _current_month()
+    for _ in range(3):
+        assert partition_name(month) in partitions
+        month = next_month(month)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_check_partitions():
+    async with open_connection() as conn:
+        await check_partitions(conn)
+
+        far = date(2099, 1, 1)
+        with pytest.raises(RuntimeError, match="operations_p2099_01"):
+            await check_partitions(conn, today=far)
+        await create_partitions(conn, months_ahead=0, today=far)
+        with pytest.raises(RuntimeError, match="operations_p2099_02"):
+            await check_partitions(conn, today=far)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_create_partitions_far_ahead():
+    async with open_connection() as conn:
+        created = await create_partitions(conn, months_ahead=12)
+        assert partition_name(next_month(_current_month())) not in created
+
+        again = await create_partitions(conn, months_ahead=12)
+        assert again == []
+
+
+class _Recorder:
+    """Stands in for the asyncpg connection, keeping the queries run on it."""
+
+    def __init__(self) -> None:
+        self.queries: list[tuple[str, tuple]] = []
+
+    async def fetch(self, query: str, *args):
+        self.queries.append((query, args))
+        return []
+
+
+async def _history_plan(backend: str, **bounds) -> str:
+    """Plan of the history read of ``backend``, as it sends it."""
+    repo = get_repository(backend)
+    read = {"wallet_id": uuid4(), "limit": 100, **bounds}
+
+    if backend == "asyncpg":
+        recorder = _Recorder()
+        await repo.operations.list_operations(session=recorder, **read)
+        [(query, args)] = recorder.queries
+        async with open_raw_connection() as conn:
+            rows = await conn.fetch(f"EXPLAIN {query}", *args)
+        return "\n".join(row[0] for row in rows)
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    async with open_connection() as conn:
+        event.listen(conn.sync_connection, "before_cursor_execute", record)
+        try:
+            async with open_session(conn) as session:
+                await repo.operations.list_operations(session=session, **read)
+        finally:
+            event.remove(conn.sync_connection, "before_cursor_execute", record)
+        # the session may wrap the read in a savepoint, keep the read only
+        [(statement, parameters)] = [
+            (statement, parameters)
+            for statement, parameters in statements
+            if "FROM operations" in statement
+        ]
+        result = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return "\n".join(result.scalars())
+
+
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+@pytest.mark.asyncio(loop_scope="session")
+async def test_history_read_prunes_partitions(backend: str):
+    month = _current_month()
+    since = datetime.combine(month, datetime.min.time(), UTC)
+    before = datetime.combine(next_month(month), datetime.min.time(), UTC)
+
+    plan = await _history_plan(backend, since=since, before=before)
+
+    assert partition_name(month) in plan
+    assert partition_name(next_month(month)) not in plan
+
+
+@pytest.mark.parametrize("backend", SQL_BACKENDS)
+@pytest.mark.asyncio(loop_scope="session")
+async def test_history_read_since_prunes_partitions(backend: str):
+    month = next_month(_current_month())
+    since = datetime.combine(month, datetime.min.time(), UTC)
+
+    plan = await _history_plan(backend, since=since)
+
+    assert partition_name(month) in plan
+    assert partition_name(_current_month()) not in plan
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_insert_routes_to_current_partition():
+    async with open_connection() as conn:
+        wallet_id = (
+            await conn.execute(
+                text("INSERT INTO wallets VALUES (gen_random_uuid(), 0) RETURNING id")
+            )
+        ).scalar_one()
+        await conn.execute(
+            text(
+                "INSERT INTO operations (id, op_type, amount, wallet_id) "
+                "VALUES (gen_random_uuid(), 'deposit', 1, :wallet_id)"
+            ),
+            {"wallet_id": wallet_id},
+        )
+
+        result = await conn.execute(
+            text(
+                "SELECT tableoid::regclass::text FROM operations "
+                "WHERE wallet_id = :wallet_id"
+            ),
+            {"wallet_id": wallet_id},
+        )
+
+    assert result.scalar_one() == partition_name(_current_month())
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_detach_old_partitions():
+    old_month = date(2000, 1, 1)
+    name = partition_name(old_month)
+
+    async with session_manager.engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(
+            text(
+                f"CREATE TABLE {name} PARTITION OF operations "
+                "FOR VALUES FROM ('2000-01-01 00:00:00+00') "
+                "TO ('2000-02-01 00:00:00+00')"
+            )
+        )
+        try:
+            detached = await detach_partitions(conn, older_than=date(2000, 2, 1))
+
+            assert detached == [name]
+            assert name not in await list_partitions(conn)
+        finally:
+            await conn.execute(text(f"DROP TABLE IF EXISTS archive.{name}"))
+            await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
@@ -0,0 +1,104 @@
+import contextlib
+from datetime import date
+
+import pytest
+from sqlalchemy import event, text
+
+from src.db.models import OperationType
+from src.db.partitions import create_partitions, partition_name
+from src.db.purge import purge_closed_wallets
+from src.db.rollups import fold_operations
+from src.db.session import session_manager
+from src.exceptions.wallets import WalletNotFoundError
+from src.services.wallets import WalletService
+
+LEDGER = 200_000
+BATCH = 30_000
+LEDGER_MONTH = date(2020, 3, 1)
+
+
+async def _count(table: str, wallet_id) -> int:
+    column = "id" if table == "wallets" else "wallet_id"
+    async with session_manager.engine.connect() as conn:
+        return await conn.scalar(
+            text(f"SELECT count(*) FROM {table} WHERE {column} = :id"),
+            {"id": wallet_id},
+        )
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_purge_deletes_a_large_ledger_in_batches():
+    engine = session_manager.engine
+    async with session_manager.session(backend="orm") as session:
+        conn = await session.connection()
+        await create_partitions(conn, months_ahead=0, today=LEDGER_MONTH)
+        closed = await WalletService.create_wallet(session=session)
+        kept = await WalletService.create_wallet(session=session)
+        await session.execute(
+            text(
+                "INSERT INTO operations (id, wallet_id, op_type, amount, created_at) "
+                "SELECT gen_random_uuid(), :wallet_id, 'deposit', 1, "
+                "TIMESTAMPTZ '2020-03-01 00:00:00+00' + n * INTERVAL '10 seconds' "
+                "FROM generate_series(1, :count) AS n"
+            ),
+            {"wallet_id": closed, "count": LEDGER},
+        )
+        await session.commit()
+        for wallet_id in (closed, kept):
+            await WalletService.process_operation(
+                session=session,
+                wallet_id=wallet_id,
+                op_type=OperationType.deposit,
+                amount=5,
+                currency="EUR",
+            )
+
+    statements = []
+
+    def count_deletes(conn, cursor, statement, parameters, context, executemany):
+        if "DELETE FROM operations" in statement:
+            statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_deletes)
+    try:
+        # the ledger dates from 2020: fold it in one transaction
+        await fold_operations(engine, lag=0, window=10**9)
+
+        async with session_manager.session(backend="orm") as session:
+            await WalletService.close_wallet(session=session, wallet_id=closed)
+            with pytest.raises(WalletNotFoundError):
+                await WalletService.get_balance(session=session, wallet_id=closed)
+            with pytest.raises(WalletNotFoundError):
+                await WalletService.close_wallet(session=session, wallet_id=closed)
+
+        assert await purge_closed_wallets(engine, batch_size=BATCH) == 1
+
+        # bounded transactions: the last, partial batch ends the wallet
+        assert len(statements) == LEDGER // BATCH + 1
+        for table in (
+            "wallets",
+            "operations",
+            "wallet_balances",
+            "wallet_daily_totals",
+            "wallet_monthly_totals",
+        ):
+            assert await _count(table, closed) == 0, table
+        assert await _count("operations", kept) == 1
+        assert await _count("wallet_daily_totals", kept) == 1
+        assert await purge_closed_wallets(engine, batch_size=BATCH) == 0
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count_deletes)
+        async with session_manager.session(backend="orm") as session:
+            for wallet_id in (closed, kept):
+                with contextlib.suppress(WalletNotFoundError):
+                    await WalletService.close_wallet(
+                        session=session, wallet_id=wallet_id
+                    )
+        await purge_closed_wallets(engine)
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM rollup_watermark"))
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(
+                text(f"DROP TABLE IF EXISTS {partition_name(LEDGER_MONTH)}")
+            )
@@ -0,0 +1,53 @@
+import pytest
+import pytest_asyncio
+
+from src.config import secrets
+from src.db.session import DatabaseSessionManager
+
+# far ahead of anything the test database has written
+FUTURE_LSN = "FFFFFFFF/0"
+
+
+@pytest_asyncio.fixture
+async def manager():
+    """Session manager with the test database standing in as its replica."""
+    manager = DatabaseSessionManager()
+    await manager.init_db()
+    manager.init_replicas([str(secrets.sqlalchemy_url)])
+    yield manager
+    await manager.close()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_reads_go_to_replica(manager: DatabaseSessionManager):
+    async with manager.read_session() as session:
+        assert session.bind is not manager.engine
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_primary_pin(manager: DatabaseSessionManager):
+    async with manager.read_session(primary=True) as session:
+        assert session.bind is manager.engine
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_caught_up_replica_serves_own_writes(manager: DatabaseSessionManager):
+    async with manager.session(backend="orm") as session:
+        lsn = await manager.current_lsn(session)
+
+    async with manager.read_session(min_lsn=lsn) as session:
+        assert session.bind is not manager.engine
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_lagging_replica_falls_back_to_primary(manager: DatabaseSessionManager):
+    async with manager.read_session(min_lsn=FUTURE_LSN) as session:
+        assert session.bind is manager.engine
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_asyncpg_backend_reads_primary(manager: DatabaseSessionManager):
+    await manager.init_pool()
+
+    async with manager.read_session(backend="asyncpg") as conn:
+        assert await conn.fetchval("SELECT pg_is_in_recovery()") is False
@@ -0,0 +1,69 @@
+import asyncpg
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from src.config import RetryConfig
+from src.db import retry
+from src.db.retry import RetryPolicy, retrying, sqlstate
+
+
+@pytest.fixture
+def policy(monkeypatch) -> RetryPolicy:
+    policy = RetryPolicy(RetryConfig(max_attempts=3, base_delay=0.001))
+    monkeypatch.setattr(retry, "retry_policy", policy)
+    return policy
+
+
+def flaky(errors: list[Exception]):
+    calls = []
+
+    @retrying
+    async def func():
+        calls.append(None)
+        if errors:
+            raise errors.pop(0)
+        return len(calls)
+
+    return func
+
+
+def test_sqlstate_of_asyncpg_and_sqlalchemy_errors():
+    error = asyncpg.DeadlockDetectedError("deadlock")
+
+    assert sqlstate(error) == "40P01"
+    assert sqlstate(DBAPIError("UPDATE", None, error)) == "40P01"
+    assert sqlstate(ValueError()) is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_retries_retryable_errors(policy: RetryPolicy):
+    func = flaky(
+        [asyncpg.LockNotAvailableError("lock"), asyncpg.SerializationError("ser")]
+    )
+
+    assert await func() == 3
+    stats = policy.stats()
+    assert (stats.calls, stats.retries, stats.recovered, stats.exhausted) == (
+        1,
+        2,
+        1,
+        0,
+    )
+    assert stats.by_sqlstate == {"55P03": 1, "40001": 1}
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_gives_up(policy: RetryPolicy):
+    with pytest.raises(ValueError):
+        await flaky([ValueError()])()
+
+    with pytest.raises(asyncpg.DeadlockDetectedError):
+        await flaky([asyncpg.DeadlockDetectedError("deadlock")] * 3)()
+
+    policy.settings.budget = 0
+    with pytest.raises(asyncpg.DeadlockDetectedError):
+        await flaky([asyncpg.DeadlockDetectedError("deadlock")])()
+
+    stats = policy.stats()
+    assert stats.retries == 2
+    assert stats.exhausted == 2
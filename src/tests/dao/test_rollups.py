@@ -0,0 +1,161 @@
+from datetime import UTC, date, datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from src.config import config
+from src.db.ids import uuid7
+from src.db.models import OperationType, TotalsPeriod
+from src.db.partitions import create_partitions, detach_partitions, partition_name
+from src.db.rollups import fold_operations, rebuild_rollups
+from src.db.session import session_manager
+from src.services.wallets import WalletService
+
+BACKENDS = ["orm", "compiled", "asyncpg"]
+
+# 23:30 in UTC is 02:30 on the next day in Moscow
+OLD = datetime(2020, 1, 30, 23, 30, tzinfo=UTC)
+# fold the years since OLD in one transaction, not one per hour
+WINDOW = 10**9
+
+
+async def _cleanup(wallet_ids) -> None:
+    async with session_manager.engine.begin() as conn:
+        await conn.execute(text("DELETE FROM rollup_watermark"))
+        for table in ("wallet_daily_totals", "wallet_monthly_totals", "operations"):
+            await conn.execute(
+                text(f"DELETE FROM {table} WHERE wallet_id = ANY(:ids)"),
+                {"ids": wallet_ids},
+            )
+        await conn.execute(
+            text("DELETE FROM wallets WHERE id = ANY(:ids)"), {"ids": wallet_ids}
+        )
+
+
+async def _wallets_with_history(count: int) -> list:
+    """Wallets with a deposit and a withdraw on each of 2020-01-31 and
+    2020-02-01 in Moscow time."""
+    wallet_ids = []
+    async with session_manager.session(backend="orm") as session:
+        conn = await session.connection()
+        for month in (date(2020, 1, 1), date(2020, 2, 1)):
+            await create_partitions(conn, months_ahead=0, today=month)
+        for _ in range(count):
+            wallet_id = await WalletService.create_wallet(session=session)
+            wallet_ids.append(wallet_id)
+            for day in range(2):
+                for op_type, amount in (("deposit", 100), ("withdraw", 40)):
+                    await session.execute(
+                        text(
+                            "INSERT INTO operations "
+                            "(id, wallet_id, op_type, amount, created_at) "
+                            "VALUES (:id, :wallet_id, :op_type, :amount, :created_at)"
+                        ),
+                        {
+                            "id": uuid7(),
+                            "wallet_id": wallet_id,
+                            "op_type": op_type,
+                            "amount": amount + day,
+                            "created_at": OLD + timedelta(days=day),
+                        },
+                    )
+        await session.commit()
+    return wallet_ids
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_totals_merge_rollups_with_new_operations(backend, monkeypatch):
+    wallet_ids = await _wallets_with_history(1)
+    wallet_id = wallet_ids[0]
+    try:
+        assert await fold_operations(session_manager.engine, lag=0, window=WINDOW) == 4
+
+        async with session_manager.session(backend="orm") as session:
+            await WalletService.process_operation(
+                session=session,
+                wallet_id=wallet_id,
+                op_type=OperationType.deposit,
+                amount=7,
+            )
+
+        monkeypatch.setattr(config.database, "dao", backend)
+        await session_manager.init_pool()
+        async with session_manager.session() as session:
+            daily = await WalletService.get_totals(
+                session=session,
+                wallet_id=wallet_id,
+                period=TotalsPeriod.day,
+                until=date(2021, 1, 1),
+            )
+            monthly = await WalletService.get_totals(
+                session=session, wallet_id=wallet_id, period=TotalsPeriod.month
+            )
+
+        assert [(row.period, row.deposits, row.withdrawals) for row in daily] == [
+            (date(2020, 1, 31), 100, 40),
+            (date(2020, 2, 1), 101, 41),
+        ]
+        # the new deposit is past the watermark
+        assert [(row.period, row.deposit_count) for row in monthly[:2]] == [
+            (date(2020, 1, 1), 1),
+            (date(2020, 2, 1), 1),
+        ]
+        assert (monthly[-1].deposits, monthly[-1].withdraw_count) == (7, 0)
+    finally:
+        await _cleanup(wallet_ids)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_rebuild_fixes_drifted_rollups():
+    wallet_ids = await _wallets_with_history(3)
+    try:
+        await fold_operations(session_manager.engine, lag=0, window=WINDOW)
+        async with session_manager.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "UPDATE wallet_daily_totals SET deposits = deposits + 1 "
+                    "WHERE wallet_id = :id"
+                ),
+                {"id": wallet_ids[0]},
+            )
+            await conn.execute(
+                text("DELETE FROM wallet_monthly_totals WHERE wallet_id = :id"),
+                {"id": wallet_ids[2]},
+            )
+
+        engine = session_manager.engine
+        assert await rebuild_rollups(engine, chunks=2, parallel=2, check=True) == 4
+        assert await rebuild_rollups(engine, chunks=2, parallel=2, check=True) == 4
+        assert await rebuild_rollups(engine, chunks=5, parallel=2) == 4
+        assert await rebuild_rollups(engine, chunks=5, parallel=2, check=True) == 0
+    finally:
+        await _cleanup(wallet_ids)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_rebuild_keeps_detached_months():
+    wallet_ids = await _wallets_with_history(2)
+    name = partition_name(date(2020, 1, 1))
+    engine = session_manager.engine
+    try:
+        await fold_operations(engine, lag=0, window=WINDOW)
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            assert await detach_partitions(conn, older_than=date(2020, 2, 1)) == [name]
+
+        # every operation left with January, the rollups are all that remain
+        assert await rebuild_rollups(engine, chunks=2, check=True) == 0
+        assert await rebuild_rollups(engine, chunks=2) == 0
+        async with session_manager.session(backend="orm") as session:
+            daily = await WalletService.get_totals(
+                session=session, wallet_id=wallet_ids[0], period=TotalsPeriod.day
+            )
+        assert [(row.period, row.deposits) for row in daily] == [
+            (date(2020, 1, 31), 100),
+            (date(2020, 2, 1), 101),
+        ]
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS archive.{name}"))
+        await _cleanup(wallet_ids)
@@ -0,0 +1,198 @@
+import asyncio
+from collections import Counter
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, event, text
+
+from src.config import secrets
+from src.db import shards
+from src.db.dao import DaoOperation, DaoWallet
+from src.db.ids import uuid7
+from src.db.models import DBWalletShard, OperationType
+from src.db.session import MAIN_SHARD, DatabaseSessionManager, session_manager
+from src.db.shards import HashRing, ShardRouter
+from src.tests.database import TEMPLATE_DB
+
+SHARD = "s1"
+
+
+async def _execute_autocommit(sql: str) -> None:
+    async with session_manager.engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(sql))
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="session")
+async def router():
+    """Router over the test database and a second database in the same
+    container, standing in for a second shard."""
+    shard_db = f"{secrets.postgres_db.get_secret_value()}_{SHARD}"
+    await _execute_autocommit(f"DROP DATABASE IF EXISTS {shard_db}")
+    await _execute_autocommit(f"CREATE DATABASE {shard_db} TEMPLATE {TEMPLATE_DB}")
+    url = session_manager.engine.url.set(database=shard_db)
+
+    manager = DatabaseSessionManager()
+    await manager.init_db()
+    manager.init_shards({SHARD: url.render_as_string(hide_password=False)})
+
+    router = ShardRouter(manager)
+    yield router
+
+    await router.close()
+    await manager.close()
+    await _execute_autocommit(f"DROP DATABASE IF EXISTS {shard_db}")
+
+
+def test_ring_spreads_wallets():
+    ring = HashRing(["a", "b"])
+
+    counts = Counter(ring.shard_for(uuid7()) for _ in range(10_000))
+
+    assert 3_500 < counts["a"] < 6_500
+
+
+def test_ring_moves_only_to_new_shard():
+    ids = [uuid7() for _ in range(10_000)]
+    before = HashRing(["a", "b"])
+    after = HashRing(["a", "b", "c"])
+
+    moved = [i for i in ids if before.shard_for(i) != after.shard_for(i)]
+
+    assert all(after.shard_for(i) == "c" for i in moved)
+    assert 2_000 < len(moved) < 4_700
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_routes_by_ring(router: ShardRouter):
+    assert router.sharded
+    wallet_id = uuid7()
+
+    assert await router.shard_for(wallet_id) == router.ring.shard_for(wallet_id)
+
+
+async def _drop_wallet(manager: DatabaseSessionManager, wallet_id) -> None:
+    for shard in manager.shard_names:
+        async with manager.session(backend="orm", shard=shard) as session:
+            await session.execute(
+                text("DELETE FROM operations WHERE wallet_id = :id"),
+                {"id": wallet_id},
+            )
+            await session.execute(
+                text("DELETE FROM wallets WHERE id = :id"), {"id": wallet_id}
+            )
+            await session.execute(
+                delete(DBWalletShard).where(DBWalletShard.wallet_id == wallet_id)
+            )
+            await session.commit()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_move_wallet(router: ShardRouter, monkeypatch):
+    # the ledger is copied over several batches
+    monkeypatch.setattr(shards, "MOVE_BATCH", 2)
+    manager = router.manager
+    wallet_id = uuid7()
+    source = router.ring.shard_for(wallet_id)
+    target = SHARD if source == MAIN_SHARD else MAIN_SHARD
+
+    async with manager.session(backend="orm", shard=source) as session:
+        await DaoWallet.create_wallet(session=session, balance=7, wallet_id=wallet_id)
+        await DaoOperation.add_operation(
+            session=session,
+            wallet_id=wallet_id,
+            op_type=OperationType.deposit,
+            amount=7,
+        )
+        for _ in range(4):
+            await DaoOperation.add_operation(
+                session=session,
+                wallet_id=wallet_id,
+                op_type=OperationType.deposit,
+                amount=0,
+            )
+
+    try:
+        assert await router.move_wallet(wallet_id, target) is True
+        assert await router.shard_for(wallet_id) == target
+
+        async with manager.session(backend="orm", shard=target) as session:
+            wallet = await DaoWallet.get_wallet(session=session, wallet_id=wallet_id)
+            assert wallet.balance == 7
+            assert sorted(op.amount for op in wallet.operations) == [0, 0, 0, 0, 7]
+
+        async with manager.session(backend="orm", shard=source) as session:
+            assert (
+                await DaoWallet.get_wallet(session=session, wallet_id=wallet_id)
+            ) is None
+
+        # back to its ring shard, which also drops it from the directory
+        assert await router.rebalance() == 1
+        assert await router.shard_for(wallet_id) == source
+    finally:
+        await _drop_wallet(manager, wallet_id)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_interrupted_move(router: ShardRouter):
+    manager = router.manager
+    wallet_id = uuid7()
+    ring_shard = router.ring.shard_for(wallet_id)
+    other = SHARD if ring_shard == MAIN_SHARD else MAIN_SHARD
+
+    # moved back to its ring shard, interrupted before the copy it had
+    # been moved to was deleted
+    for shard in (ring_shard, other):
+        async with manager.session(backend="orm", shard=shard) as session:
+            await DaoWallet.create_wallet(
+                session=session, balance=7, wallet_id=wallet_id
+            )
+
+    try:
+        await router.pin()
+        assert await router.shard_for(wallet_id) == ring_shard
+
+        assert await router.move_wallet(wallet_id, ring_shard) is False
+        async with manager.session(backend="orm", shard=other) as session:
+            assert (
+                await DaoWallet.get_wallet(session=session, wallet_id=wallet_id)
+            ) is None
+        async with manager.session(backend="orm", shard=ring_shard) as session:
+            wallet = await DaoWallet.get_wallet(session=session, wallet_id=wallet_id)
+            assert wallet.balance == 7
+    finally:
+        await _drop_wallet(manager, wallet_id)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_directory_cache(router: ShardRouter):
+    manager = router.manager
+    wallet_id = uuid7()
+    other = SHARD if router.ring.shard_for(wallet_id) == MAIN_SHARD else MAIN_SHARD
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = manager.engine.sync_engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for _ in range(3):
+            await router.shard_for(wallet_id)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert len(statements) == 1
+
+    # another process moves it
+    worker = ShardRouter(manager)
+    try:
+        await worker._set_directory(wallet_id, other)
+        for _ in range(100):
+            if await router.shard_for(wallet_id) == other:
+                break
+            await asyncio.sleep(0.01)
+        assert await router.shard_for(wallet_id) == other
+    finally:
+        await worker.close()
+        await _drop_wallet(manager, wallet_id)
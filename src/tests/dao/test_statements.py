@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.dao import DaoWallet
+from src.db.session import session_manager
+from src.db.statements import (
+    UNTAGGED,
+    StatementStats,
+    diff,
+    ensure_extension,
+    method_of,
+    report,
+    take_snapshot,
+)
+
+
+async def _snapshot():
+    async with session_manager.engine.begin() as conn:
+        await ensure_extension(conn)
+        return await take_snapshot(conn)
+
+
+def test_method_of():
+    assert (
+        method_of("/* dao:DaoWallet.get_wallet */ SELECT 1") == "DaoWallet.get_wallet"
+    )
+    assert method_of("SELECT 1") == UNTAGGED
+
+
+def test_diff_and_report():
+    before = {1: StatementStats("/* dao:A.x */ SELECT 1", 2, 2.0, 2)}
+    after = {
+        1: StatementStats("/* dao:A.x */ SELECT 1", 5, 8.0, 5),
+        2: StatementStats("/* dao:A.x */ SELECT 2", 1, 1.0, 0),
+        3: StatementStats("SELECT 3", 1, 0.5, 1),
+    }
+
+    methods = {stats.method: stats for stats in report(diff(before, after))}
+
+    assert methods["A.x"].calls == 4
+    assert methods["A.x"].total_ms == 7.0
+    assert methods["A.x"].mean_ms == 1.75
+    assert methods["A.x"].rows == 3
+    assert methods[UNTAGGED].calls == 1
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_statements_attributed_to_dao_methods(isolated_session: AsyncSession):
+    before = await _snapshot()
+
+    wallet = await DaoWallet.create_wallet(session=isolated_session, balance=0)
+    for _ in range(3):
+        await DaoWallet.get_wallet(session=isolated_session, wallet_id=wallet.id)
+
+    methods = {stats.method: stats for stats in report(diff(before, await _snapshot()))}
+
+    assert methods["DaoWallet.get_wallet"].calls >= 3
+    assert methods["DaoWallet.create_wallet"].calls >= 1
@@ -0,0 +1,123 @@
+"""Test database setup: one Postgres container, one migrated template
+database, and a clone of it per pytest-xdist worker.
+
+The container is started once by the main pytest process and shared with
+the workers. Cloning (``CREATE DATABASE ... TEMPLATE``) copies files and
+takes a fraction of a second, unlike running the migrations per worker.
+With ``--reuse-container`` the container is left running after the run
+and picked up again by the next one.
+"""
+
+import asyncio
+import os
+from dataclasses import asdict, dataclass
+
+import asyncpg
+from docker.errors import NotFound
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from testcontainers.core.config import testcontainers_config
+from testcontainers.postgres import PostgresContainer
+
+import docker
+from src.db.partitions import create_partitions
+from src.db.session import session_manager
+
+IMAGE = "postgres:15"
+CONTAINER_NAME = "itk-test-applicant-postgres"
+USER = PASSWORD = "test"
+TEMPLATE_DB = "wallets_template"
+
+# durability is of no use to throwaway test databases
+SERVER_OPTIONS = (
+    "-c fsync=off -c synchronous_commit=off -c full_page_writes=off "
+    "-c max_connections=500 -c shared_preload_libraries=pg_stat_statements "
+    "-c pg_stat_statements.track=all"
+)
+
+
+@dataclass
+class PostgresServer:
+    host: str
+    port: int
+
+    def url(self, dbname: str) -> str:
+        return (
+            f"postgresql+asyncpg://{USER}:{PASSWORD}@{self.host}:{self.port}/{dbname}"
+        )
+
+    def dsn(self, dbname: str) -> str:
+        return f"postgresql://{USER}:{PASSWORD}@{self.host}:{self.port}/{dbname}"
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _running_container() -> PostgresServer | None:
+    try:
+        container = docker.from_env().containers.get(CONTAINER_NAME)
+    except NotFound:
+        return None
+
+    if container.status != "running":
+        container.start()
+        container.reload()
+    port = container.ports["5432/tcp"][0]["HostPort"]
+    return PostgresServer(host="localhost", port=int(port))
+
+
+def start_postgres(reuse: bool) -> tuple[PostgresServer, PostgresContainer | None]:
+    """Start the test container, or find the one left by a previous run.
+    The container is returned when the caller has to stop it."""
+    if reuse:
+        server = _running_container()
+        if server is not None:
+            return server, None
+        # Ryuk would remove the container when this process exits
+        testcontainers_config.ryuk_disabled = True
+
+    container = PostgresContainer(
+        IMAGE, username=USER, password=PASSWORD, dbname="postgres"
+    ).with_command(f"postgres {SERVER_OPTIONS}")
+    if reuse:
+        container = container.with_name(CONTAINER_NAME)
+    container.start()
+
+    server = PostgresServer(
+        host=container.get_container_host_ip(),
+        port=int(container.get_exposed_port(5432)),
+    )
+    return server, None if reuse else container
+
+
+async def _create_database(server: PostgresServer, name: str, template: str | None):
+    conn = await asyncpg.connect(server.dsn("postgres"))
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        if template is None:
+            await conn.execute(f'CREATE DATABASE "{name}"')
+        else:
+            await conn.execute(f'CREATE DATABASE "{name}" TEMPLATE "{template}"')
+    finally:
+        await conn.close()
+
+
+async def _create_partitions(server: PostgresServer, name: str) -> None:
+    engine = create_async_engine(server.url(name), poolclass=NullPool)
+    async with engine.begin() as conn:
+        await create_partitions(conn)
+    await engine.dispose()
+
+
+def prepare_template(server: PostgresServer) -> None:
+    """Create the template database from scratch and migrate it."""
+    asyncio.run(_create_database(server, TEMPLATE_DB, template=None))
+    session_manager._run_migrations(server.url(TEMPLATE_DB))
+    asyncio.run(_create_partitions(server, TEMPLATE_DB))
+
+
+async def clone_template(server: PostgresServer) -> str:
+    """Fresh database for this worker, cloned from the template."""
+    name = f"test_{os.environ.get('PYTEST_XDIST_WORKER', 'main')}"
+    await _create_database(server, name, template=TEMPLATE_DB)
+    return name
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from src.config import JobsConfig
+from src.db.session import session_manager
+from src.jobs import LeaderLock, Scheduler
+
+SETTINGS = JobsConfig(election_interval=0.01, shutdown_timeout=1.0, jitter=0.5)
+
+
+class HeldLock:
+    """Leadership without a database."""
+
+    held = True
+
+    async def try_acquire(self) -> bool:
+        return True
+
+    async def check(self) -> bool:
+        return True
+
+    async def release(self) -> None:
+        self.held = False
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_runs_jobs_and_records_timings():
+    scheduler = Scheduler(SETTINGS, HeldLock())
+    done = asyncio.Event()
+
+    async def ok():
+        done.set()
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    scheduler.add("ok", ok, interval=0.01)
+    scheduler.add("broken", broken, interval=0.01)
+    scheduler.add("slow", slow, interval=0.01, timeout=0.01)
+    scheduler.add("disabled", ok, interval=None)
+
+    await scheduler.start()
+    await asyncio.wait_for(done.wait(), timeout=1)
+    await asyncio.sleep(0.1)
+    await scheduler.stop()
+
+    stats = {job.name: job for job in scheduler.stats()}
+    assert set(stats) == {"ok", "broken", "slow"}
+    assert stats["ok"].runs >= 1 and stats["ok"].failures == 0
+    assert stats["broken"].failures == stats["broken"].runs >= 1
+    assert stats["broken"].last_error == "RuntimeError('boom')"
+    assert stats["slow"].timeouts >= 1
+    assert not scheduler.leader
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stop_waits_for_running_job():
+    scheduler = Scheduler(SETTINGS, HeldLock())
+    started = asyncio.Event()
+    finished = asyncio.Event()
+
+    async def job():
+        started.set()
+        await asyncio.sleep(0.05)
+        finished.set()
+
+    scheduler.add("job", job, interval=0.01)
+    await scheduler.start()
+    await asyncio.wait_for(started.wait(), timeout=1)
+    await scheduler.stop()
+
+    assert finished.is_set()
+    assert scheduler.stats()[0].running is False
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_single_leader():
+    first = LeaderLock(lambda: session_manager.engine, key=42)
+    second = LeaderLock(lambda: session_manager.engine, key=42)
+    try:
+        assert await first.try_acquire()
+        assert not await second.try_acquire()
+        assert await first.check()
+
+        await first.release()
+        assert await second.try_acquire()
+    finally:
+        await first.release()
+        await second.release()
@@ -0,0 +1,54 @@
+from datetime import UTC, date, datetime
+
+import pytest
+from sqlalchemy import text
+
+from src.db.ids import uuid7
+from src.db.partitions import create_partitions, detach_partitions, partition_name
+from src.db.session import session_manager
+from src.jobs.tasks import reconcile_balances
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_reconcile_counts_detached_operations():
+    engine = session_manager.engine
+    name = partition_name(date(2020, 1, 1))
+    wallet_id = uuid7()
+    async with engine.begin() as conn:
+        await create_partitions(conn, months_ahead=0, today=date(2020, 1, 1))
+        await conn.execute(
+            text("INSERT INTO wallets (id, balance) VALUES (:id, 70)"),
+            {"id": wallet_id},
+        )
+        for op_type, amount in (("deposit", 100), ("withdraw", 30)):
+            await conn.execute(
+                text(
+                    "INSERT INTO operations "
+                    "(id, wallet_id, op_type, amount, created_at) "
+                    "VALUES (:id, :wallet_id, :op_type, :amount, :created_at)"
+                ),
+                {
+                    "id": uuid7(),
+                    "wallet_id": wallet_id,
+                    "op_type": op_type,
+                    "amount": amount,
+                    "created_at": datetime(2020, 1, 15, tzinfo=UTC),
+                },
+            )
+
+    try:
+        assert await reconcile_balances() == 0
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            assert await detach_partitions(conn, older_than=date(2020, 2, 1)) == [name]
+
+        assert await reconcile_balances() == 0
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS archive.{name}"))
+            await conn.execute(
+                text("DELETE FROM operations WHERE wallet_id = :id"), {"id": wallet_id}
+            )
+            await conn.execute(
+                text("DELETE FROM wallets WHERE id = :id"), {"id": wallet_id}
+            )
@@ -0,0 +1,85 @@
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import Config, config
+from src.db.dao import DaoWallet
+from src.db.ids import uuid7
+from src.services.hot_wallets import HotWalletCache, hot_wallets
+from src.services.wallets import WalletService
+
+
+def test_evicts_least_recently_used():
+    cache = HotWalletCache(capacity=2)
+    a, b, c = uuid7(), uuid7(), uuid7()
+
+    cache.store(a, 1, 0)
+    cache.store(b, 2, 0)
+    assert cache.get(a) == 1
+    cache.store(c, 3, 0)
+
+    assert b not in cache
+    assert cache.get(a) == 1
+    assert cache.get(c) == 3
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_versions():
+    cache = HotWalletCache(capacity=10)
+    wallet_id = uuid7()
+    cache.store(wallet_id, 100, 5)
+
+    # a read older than the cached write is ignored
+    cache.store(wallet_id, 90, 4)
+    assert cache.get(wallet_id) == 100
+
+    cache.applied(wallet_id, 110, 6)
+    assert cache.stale == 0
+
+    # version 7 was written elsewhere
+    cache.applied(wallet_id, 130, 8)
+    assert cache.stale == 1
+    assert (cache.get(wallet_id), cache.version(wallet_id)) == (130, 8)
+
+
+def test_invalidate_frees_slot():
+    cache = HotWalletCache(capacity=1)
+    a, b = uuid7(), uuid7()
+    cache.store(a, 1, 0)
+
+    cache.invalidate(a)
+    cache.store(b, 2, 0)
+
+    assert cache.get(a) is None
+    assert cache.get(b) == 2
+    assert cache.evictions == 0
+
+
+def test_needs_single_worker():
+    raw = config.model_dump()
+    raw["hot_wallets"]["enabled"] = True
+    assert Config(**raw).hot_wallets.enabled
+
+    raw["uvicorn"]["workers"] = 4
+    with pytest.raises(ValidationError, match="uvicorn.workers: 1"):
+        Config(**raw)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_balance_served_from_cache(isolated_session: AsyncSession, monkeypatch):
+    monkeypatch.setattr(config.hot_wallets, "enabled", True)
+    wallet = await DaoWallet.create_wallet(session=isolated_session, balance=50)
+
+    await WalletService.add_to_balance(
+        session=isolated_session, wallet_id=wallet.id, amount=25
+    )
+    assert hot_wallets.version(wallet.id) == 1
+
+    hits = hot_wallets.hits
+    balance = await WalletService.get_balance(
+        session=isolated_session, wallet_id=wallet.id
+    )
+    assert balance == 75
+    assert hot_wallets.hits == hits + 1
+    hot_wallets.invalidate(wallet.id)
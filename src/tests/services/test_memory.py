@@ -0,0 +1,108 @@
+"""The services on the in-memory DAO backend, runnable with --without-postgres."""
+
+import asyncio
+from datetime import date
+from uuid import uuid4
+
+import pytest
+
+from src.db.memory import MemoryStore
+from src.db.models import OperationType, TotalsPeriod
+from src.exceptions.wallets import InsufficientFundsError, WalletNotFoundError
+from src.services.transfers import TransferService
+from src.services.wallets import WalletService
+
+pytestmark = pytest.mark.memory
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_process_operation(memory_store: MemoryStore):
+    wallet_id = await WalletService.create_wallet(session=memory_store, balance=100)
+
+    await WalletService.process_operation(
+        memory_store, wallet_id, OperationType.deposit, 50
+    )
+    await WalletService.process_operation(
+        memory_store, wallet_id, OperationType.withdraw, 30
+    )
+    await WalletService.process_operation(
+        memory_store, wallet_id, OperationType.deposit, 7, currency="USD"
+    )
+
+    assert await WalletService.get_balances(
+        session=memory_store, wallet_id=wallet_id
+    ) == {"RUB": 120, "USD": 7}
+    history = await WalletService.get_history(
+        session=memory_store, wallet_id=wallet_id, limit=2
+    )
+    assert [(op.op_type, op.amount) for op in history] == [
+        (OperationType.deposit, 7),
+        (OperationType.withdraw, 30),
+    ]
+    totals = await WalletService.get_totals(
+        session=memory_store, wallet_id=wallet_id, period=TotalsPeriod.month
+    )
+    assert [(t.currency, t.deposits, t.withdrawals) for t in totals] == [
+        ("RUB", 50, 30),
+        ("USD", 7, 0),
+    ]
+    assert totals[0].period == date.today().replace(day=1)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_unknown_wallet(memory_store: MemoryStore):
+    # the foreign key violation surfaces as a missing wallet
+    with pytest.raises(WalletNotFoundError):
+        await WalletService.process_operation(
+            memory_store, uuid4(), OperationType.deposit, 10
+        )
+    with pytest.raises(WalletNotFoundError):
+        await WalletService.get_history(session=memory_store, wallet_id=uuid4())
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_operations(memory_store: MemoryStore):
+    wallet_id = await WalletService.create_wallet(session=memory_store)
+
+    await asyncio.gather(
+        *[
+            WalletService.process_operation(
+                memory_store, wallet_id, OperationType.deposit, 10
+            )
+            for _ in range(100)
+        ]
+    )
+
+    wallet = memory_store.wallets[wallet_id]
+    assert (wallet.balance, wallet.version) == (1000, 100)
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_transfer_all_or_nothing(memory_store: MemoryStore):
+    a = await WalletService.create_wallet(session=memory_store, balance=100)
+    b = await WalletService.create_wallet(session=memory_store)
+
+    transfer = await TransferService.transfer(
+        session=memory_store, from_wallet_id=a, to_wallet_id=b, amount=60
+    )
+    with pytest.raises(InsufficientFundsError):
+        await TransferService.transfer(
+            session=memory_store, from_wallet_id=a, to_wallet_id=b, amount=60
+        )
+
+    assert (transfer.debit.wallet_id, transfer.credit.wallet_id) == (a, b)
+    assert await WalletService.get_balance(session=memory_store, wallet_id=a) == 40
+    assert await WalletService.get_balance(session=memory_store, wallet_id=b) == 60
+    assert len(memory_store.operations) == 2
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_close_wallet(memory_store: MemoryStore):
+    wallet_id = await WalletService.create_wallet(session=memory_store, balance=5)
+
+    await WalletService.close_wallet(session=memory_store, wallet_id=wallet_id)
+
+    with pytest.raises(WalletNotFoundError):
+        await WalletService.get_balances(session=memory_store, wallet_id=wallet_id)
+    with pytest.raises(WalletNotFoundError):
+        await WalletService.close_wallet(session=memory_store, wallet_id=wallet_id)
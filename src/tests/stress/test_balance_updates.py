@@ -0,0 +1,211 @@
+"""Concurrent deposits and withdrawals against the real database.
+
+Fires ``STRESS_OPERATIONS`` operations, at most ``STRESS_CONCURRENCY`` at a
+time, over ``STRESS_WALLETS`` wallets picked with a Zipf-like skew of
+``STRESS_SKEW`` (0 is uniform, 1 and above piles most of the load onto a few
+hot wallets). Every final balance has to equal its initial balance plus the
+ledger sum, with one ledger row per operation sent.
+
+Throughput and lock waits sampled from ``pg_stat_activity``/``pg_locks`` are
+printed and recorded as test properties (``--junitxml``), so contention
+regressions show up as numbers:
+
+    STRESS_OPERATIONS=20000 STRESS_SKEW=1.2 uv run -m pytest src/tests/stress -s
+"""
+
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from uuid import UUID
+
+import asyncpg
+import pytest
+from sqlalchemy import text
+
+from src.config import config, secrets
+from src.db.models import OperationType
+from src.db.session import session_manager
+from src.services.wallets import WalletService
+
+BACKENDS = ["orm", "compiled", "asyncpg"]
+
+OPERATIONS = int(os.environ.get("STRESS_OPERATIONS", 2000))
+WALLETS = int(os.environ.get("STRESS_WALLETS", 20))
+CONCURRENCY = int(os.environ.get("STRESS_CONCURRENCY", 50))
+SKEW = float(os.environ.get("STRESS_SKEW", 1.0))
+INITIAL_BALANCE = 1_000_000
+
+pytestmark = pytest.mark.stress
+
+
+@dataclass
+class LockStats:
+    samples: int = 0
+    max_lock_waiters: int = 0
+    lock_waiter_samples: int = 0
+    max_ungranted_locks: int = 0
+    deadlocks: int = 0
+    waiters: list[int] = field(default_factory=list)
+
+    @property
+    def mean_lock_waiters(self) -> float:
+        return sum(self.waiters) / len(self.waiters) if self.waiters else 0.0
+
+
+async def _sample_locks(stats: LockStats, stop: asyncio.Event) -> None:
+    conn = await asyncpg.connect(secrets.asyncpg_dsn)
+    try:
+        deadlocks = await conn.fetchval(
+            "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()"
+        )
+        while not stop.is_set():
+            waiters = await conn.fetchval(
+                "SELECT count(*) FROM pg_stat_activity "
+                "WHERE datname = current_database() AND wait_event_type = 'Lock'"
+            )
+            ungranted = await conn.fetchval(
+                "SELECT count(*) FROM pg_locks WHERE NOT granted"
+            )
+            stats.samples += 1
+            stats.waiters.append(waiters)
+            stats.lock_waiter_samples += waiters > 0
+            stats.max_lock_waiters = max(stats.max_lock_waiters, waiters)
+            stats.max_ungranted_locks = max(stats.max_ungranted_locks, ungranted)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=0.02)
+            except TimeoutError:
+                pass
+
+        stats.deadlocks = (
+            await conn.fetchval(
+                "SELECT deadlocks FROM pg_stat_database "
+                "WHERE datname = current_database()"
+            )
+            - deadlocks
+        )
+    finally:
+        await conn.close()
+
+
+def _plan(wallet_ids: list[UUID], seed: int) -> list[tuple[UUID, OperationType, int]]:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** SKEW for rank in range(len(wallet_ids))]
+    targets = rng.choices(wallet_ids, weights=weights, k=OPERATIONS)
+    return [
+        (wallet_id, rng.choice(list(OperationType)), rng.randint(1, 100))
+        for wallet_id in targets
+    ]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch) -> str:
+    monkeypatch.setattr(config.database, "dao", request.param)
+    return request.param
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_concurrent_operations_keep_ledger_and_balance_in_sync(
+    backend: str, record_property
+):
+    await session_manager.init_pool()
+
+    wallet_ids = []
+    async with session_manager.session() as session:
+        for _ in range(WALLETS):
+            wallet_ids.append(
+                await WalletService.create_wallet(
+                    session=session, balance=INITIAL_BALANCE
+                )
+            )
+
+    plan = _plan(wallet_ids, seed=len(wallet_ids))
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    failures: list[BaseException] = []
+
+    async def send(wallet_id: UUID, op_type: OperationType, amount: int) -> None:
+        async with semaphore:
+            try:
+                async with session_manager.session() as session:
+                    await WalletService.process_operation(
+                        session=session,
+                        wallet_id=wallet_id,
+                        op_type=op_type,
+                        amount=amount,
+                    )
+            except Exception as e:
+                failures.append(e)
+
+    stats = LockStats()
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_locks(stats, stop))
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(send(*operation) for operation in plan))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await sampler
+
+        throughput = OPERATIONS / elapsed
+        report = {
+            "backend": backend,
+            "operations": OPERATIONS,
+            "wallets": WALLETS,
+            "concurrency": CONCURRENCY,
+            "skew": SKEW,
+            "ops_per_second": round(throughput, 1),
+            "lock_wait_sample_ratio": round(
+                stats.lock_waiter_samples / max(stats.samples, 1), 3
+            ),
+            "mean_lock_waiters": round(stats.mean_lock_waiters, 2),
+            "max_lock_waiters": stats.max_lock_waiters,
+            "max_ungranted_locks": stats.max_ungranted_locks,
+            "deadlocks": stats.deadlocks,
+        }
+        for name, value in report.items():
+            record_property(name, value)
+        print(f"\nstress {report}")
+
+        assert failures == []
+
+        expected_sums = dict.fromkeys(wallet_ids, 0)
+        expected_counts = dict.fromkeys(wallet_ids, 0)
+        for wallet_id, op_type, amount in plan:
+            signed = -amount if op_type == OperationType.withdraw else amount
+            expected_sums[wallet_id] += signed
+            expected_counts[wallet_id] += 1
+
+        async with session_manager.engine.connect() as conn:
+            rows = await conn.execute(
+                text(
+                    "SELECT w.id, w.balance, count(o.id), "
+                    "coalesce(sum(CASE WHEN o.op_type = 'withdraw' "
+                    "THEN -o.amount ELSE o.amount END), 0) "
+                    "FROM wallets w LEFT JOIN operations o ON o.wallet_id = w.id "
+                    "WHERE w.id = ANY(:ids) GROUP BY w.id, w.balance"
+                ),
+                {"ids": wallet_ids},
+            )
+            ledger = {row[0]: row[1:] for row in rows}
+
+        for wallet_id in wallet_ids:
+            balance, count, total = ledger[wallet_id]
+            # no lost updates: every operation is in the ledger...
+            assert count == expected_counts[wallet_id]
+            assert total == expected_sums[wallet_id]
+            # ...and in the balance
+            assert balance == INITIAL_BALANCE + total
+        assert stats.deadlocks == 0
+    finally:
+        stop.set()
+        if not sampler.done():
+            await sampler
+        async with session_manager.engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM operations WHERE wallet_id = ANY(:ids)"),
+                {"ids": wallet_ids},
+            )
+            await conn.execute(
+                text("DELETE FROM wallets WHERE id = ANY(:ids)"), {"ids": wallet_ids}
+            )
@@ -0,0 +1,160 @@
+"""Balance updates against a wallet row that keeps being locked.
+
+A holder takes the row lock of one wallet for ``STRESS_HOLD_MS`` at a time
+while ``STRESS_OPERATIONS`` balance updates run with a short
+``lock_timeout``, once without and once with retries. Retries have to turn
+lock timeouts into fewer client-visible failures without applying any update
+twice:
+
+    STRESS_OPERATIONS=2000 uv run -m pytest src/tests/stress/test_retries.py -s
+"""
+
+import asyncio
+import contextlib
+import os
+from collections.abc import AsyncIterator, Callable
+
+import asyncpg
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.config import config, secrets
+from src.db.retry import retry_policy, sqlstate
+from src.db.session import session_manager
+from src.services.wallets import WalletService
+
+BACKENDS = ["orm", "compiled", "asyncpg"]
+
+OPERATIONS = int(os.environ.get("STRESS_OPERATIONS", 200))
+CONCURRENCY = int(os.environ.get("STRESS_CONCURRENCY", 20))
+HOLD_MS = int(os.environ.get("STRESS_HOLD_MS", 50))
+LOCK_TIMEOUT = {"lock_timeout": "20ms"}
+
+pytestmark = pytest.mark.stress
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch) -> str:
+    monkeypatch.setattr(config.database, "dao", request.param)
+    return request.param
+
+
+@contextlib.asynccontextmanager
+async def _sessions(backend: str) -> AsyncIterator[Callable]:
+    """Session factory of the backend, on connections with a short
+    ``lock_timeout``."""
+    if backend == "asyncpg":
+        pool = await asyncpg.create_pool(
+            secrets.asyncpg_dsn, max_size=CONCURRENCY, server_settings=LOCK_TIMEOUT
+        )
+        try:
+            yield pool.acquire
+        finally:
+            await pool.close()
+        return
+
+    engine = create_async_engine(
+        str(secrets.sqlalchemy_url),
+        pool_size=CONCURRENCY,
+        connect_args={"server_settings": LOCK_TIMEOUT},
+    )
+    sessionmaker = async_sessionmaker(
+        bind=engine, expire_on_commit=False, class_=AsyncSession
+    )
+    try:
+        yield sessionmaker
+    finally:
+        await engine.dispose()
+
+
+async def _hold_lock(wallet_id, stop: asyncio.Event) -> None:
+    conn = await asyncpg.connect(secrets.asyncpg_dsn)
+    try:
+        while not stop.is_set():
+            async with conn.transaction():
+                await conn.execute(
+                    "SELECT 1 FROM wallets WHERE id = $1 FOR UPDATE", wallet_id
+                )
+                await asyncio.sleep(HOLD_MS / 1000)
+            await asyncio.sleep(0.005)
+    finally:
+        await conn.close()
+
+
+async def _run(backend: str, wallet_id) -> tuple[int, list[BaseException]]:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    applied = 0
+    failures: list[BaseException] = []
+
+    async def send() -> None:
+        nonlocal applied
+        async with semaphore, sessions() as session:
+            try:
+                await WalletService.add_to_balance(
+                    session=session, wallet_id=wallet_id, amount=1
+                )
+                applied += 1
+            except Exception as e:
+                failures.append(e)
+
+    stop = asyncio.Event()
+    async with _sessions(backend) as sessions:
+        holder = asyncio.create_task(_hold_lock(wallet_id, stop))
+        try:
+            await asyncio.gather(*(send() for _ in range(OPERATIONS)))
+        finally:
+            stop.set()
+            await holder
+    return applied, failures
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_retries_reduce_lock_timeout_failures(
+    backend: str, monkeypatch, record_property
+):
+    async with session_manager.session(backend="orm") as session:
+        wallet_id = await WalletService.create_wallet(session=session)
+
+    try:
+        retry_policy.reset()
+        monkeypatch.setattr(retry_policy.settings, "enabled", False)
+        applied_without, failures_without = await _run(backend, wallet_id)
+
+        monkeypatch.setattr(retry_policy.settings, "enabled", True)
+        applied_with, failures_with = await _run(backend, wallet_id)
+        stats = retry_policy.stats()
+
+        report = {
+            "backend": backend,
+            "operations": OPERATIONS,
+            "failures_without_retries": len(failures_without),
+            "failures_with_retries": len(failures_with),
+            "retries": stats.retries,
+            "recovered": stats.recovered,
+            "exhausted": stats.exhausted,
+        }
+        for name, value in report.items():
+            record_property(name, value)
+        print(f"\nstress {report}")
+
+        # lock timeouts are the only failures
+        assert {sqlstate(e) for e in failures_without + failures_with} <= {"55P03"}
+        assert failures_without
+        assert len(failures_with) < len(failures_without)
+        assert stats.retries > 0 and stats.recovered > 0
+        assert stats.exhausted == len(failures_with)
+
+        async with session_manager.session(backend="orm") as session:
+            balance = await WalletService.get_balance(
+                session=session, wallet_id=wallet_id
+            )
+        assert balance == applied_without + applied_with
+    finally:
+        async with session_manager.engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM operations WHERE wallet_id = :id"), {"id": wallet_id}
+            )
+            await conn.execute(
+                text("DELETE FROM wallets WHERE id = :id"), {"id": wallet_id}
+            )
@@ -0,0 +1,150 @@
+"""Concurrent transfers back and forth between a few wallets.
+
+Fires ``STRESS_TRANSFERS`` transfers between random pairs of
+``STRESS_WALLETS`` wallets, at most ``STRESS_CONCURRENCY`` at a time, so
+A -> B and B -> A constantly run into each other. ``single`` runs every
+transfer in its own transaction, ``batched`` nets ``STRESS_BATCH`` of them
+per transaction. Money is conserved, every transfer is in the ledger and
+the sorted lock order keeps deadlocks at zero. Throughput is printed and
+recorded as test properties:
+
+    STRESS_TRANSFERS=20000 uv run -m pytest src/tests/stress/test_transfers.py -s
+"""
+
+import asyncio
+import os
+import random
+import time
+
+import asyncpg
+import pytest
+from sqlalchemy import text
+
+from src.config import config, secrets
+from src.db.session import session_manager
+from src.models.dto import TransferOrder
+from src.services.transfers import TransferService
+from src.services.wallets import WalletService
+
+BACKENDS = ["orm", "compiled", "asyncpg"]
+
+TRANSFERS = int(os.environ.get("STRESS_TRANSFERS", 2000))
+WALLETS = int(os.environ.get("STRESS_WALLETS", 10))
+CONCURRENCY = int(os.environ.get("STRESS_CONCURRENCY", 50))
+BATCH = int(os.environ.get("STRESS_BATCH", 50))
+INITIAL_BALANCE = 1_000_000
+
+pytestmark = pytest.mark.stress
+
+
+async def _deadlocks() -> int:
+    conn = await asyncpg.connect(secrets.asyncpg_dsn)
+    try:
+        return await conn.fetchval(
+            "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()"
+        )
+    finally:
+        await conn.close()
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch) -> str:
+    monkeypatch.setattr(config.database, "dao", request.param)
+    return request.param
+
+
+@pytest.mark.asyncio(loop_scope="session")
+@pytest.mark.parametrize("mode", ["single", "batched"])
+async def test_cross_transfers(backend: str, mode: str, record_property):
+    await session_manager.init_pool()
+
+    wallet_ids = []
+    async with session_manager.session() as session:
+        for _ in range(WALLETS):
+            wallet_ids.append(
+                await WalletService.create_wallet(
+                    session=session, balance=INITIAL_BALANCE
+                )
+            )
+
+    rng = random.Random(WALLETS)
+    plan = [
+        TransferOrder(*rng.sample(wallet_ids, 2), rng.randint(1, 100))
+        for _ in range(TRANSFERS)
+    ]
+    if mode == "single":
+        units = [[transfer] for transfer in plan]
+    else:
+        units = [plan[i : i + BATCH] for i in range(0, len(plan), BATCH)]
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    failures: list[BaseException] = []
+
+    async def send(transfers: list[TransferOrder]) -> None:
+        async with semaphore:
+            try:
+                async with session_manager.session() as session:
+                    await TransferService.transfer_batch(
+                        session=session, transfers=transfers
+                    )
+            except Exception as e:
+                failures.append(e)
+
+    try:
+        deadlocks = await _deadlocks()
+        start = time.perf_counter()
+        await asyncio.gather(*(send(unit) for unit in units))
+        elapsed = time.perf_counter() - start
+        deadlocks = await _deadlocks() - deadlocks
+
+        report = {
+            "backend": backend,
+            "mode": mode,
+            "transfers": TRANSFERS,
+            "wallets": WALLETS,
+            "concurrency": CONCURRENCY,
+            "transactions": len(units),
+            "transfers_per_second": round(TRANSFERS / elapsed, 1),
+            "deadlocks": deadlocks,
+        }
+        for name, value in report.items():
+            record_property(name, value)
+        print(f"\nstress {report}")
+
+        assert failures == []
+        assert deadlocks == 0
+
+        expected = dict.fromkeys(wallet_ids, INITIAL_BALANCE)
+        for from_wallet_id, to_wallet_id, amount in plan:
+            expected[from_wallet_id] -= amount
+            expected[to_wallet_id] += amount
+
+        async with session_manager.engine.connect() as conn:
+            rows = await conn.execute(
+                text(
+                    "SELECT w.id, w.balance, count(o.id), "
+                    "coalesce(sum(CASE WHEN o.op_type = 'withdraw' "
+                    "THEN -o.amount ELSE o.amount END), 0) "
+                    "FROM wallets w LEFT JOIN operations o ON o.wallet_id = w.id "
+                    "WHERE w.id = ANY(:ids) GROUP BY w.id, w.balance"
+                ),
+                {"ids": wallet_ids},
+            )
+            ledger = {row[0]: row[1:] for row in rows}
+
+        assert sum(balance for balance, _, _ in ledger.values()) == (
+            INITIAL_BALANCE * WALLETS
+        )
+        assert sum(count for _, count, _ in ledger.values()) == 2 * TRANSFERS
+        for wallet_id in wallet_ids:
+            balance, _, total = ledger[wallet_id]
+            assert balance == expected[wallet_id] == INITIAL_BALANCE + total
+    finally:
+        async with session_manager.engine.begin() as conn:
+            await conn.execute(
+                text("DELETE FROM operations WHERE wallet_id = ANY(:ids)"),
+                {"ids": wallet_ids},
+            )
+            await conn.execute(
+                text("DELETE FROM wallets WHERE id = ANY(:ids)"), {"ids": wallet_ids}
+            )
@@ -1,8 +1,10 @@
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
+import asyncpg
 from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 
+from src.config import secrets
 from src.db.session import session_manager
 
 
@@ -23,3 +25,16 @@ async def open_session(conn: AsyncConnection) -> AsyncIterator[AsyncSession]:
             yield session
         finally:
             await session.close()
+
+
+@asynccontextmanager
+async def open_raw_connection() -> AsyncIterator[asyncpg.Connection]:
+    """asyncpg counterpart of ``open_connection`` for the fast path DAOs."""
+    conn = await asyncpg.connect(secrets.asyncpg_dsn)
+    outer_trans = conn.transaction()
+    await outer_trans.start()
+    try:
+        yield conn
+    finally:
+        await outer_trans.rollback()
+        await conn.close()